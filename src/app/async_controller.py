@@ -0,0 +1,266 @@
+# asyncio controller, every request is a session coroutine and the disk work done in worker threads
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import cast
+
+from src.app.config import config
+from src.app.controller import create_handler, decode_request, finish_upload, send_acks, sessions
+from src.app.handlers import DownloadRequestHandler, UploadRequestHandler
+from src.app.rudp import (
+    dispatch,
+    get_forward_socket,
+    is_multi_worker,
+    recv_forwarded,
+    send_close,
+    send_error,
+    sendto,
+    sendto_many,
+    set_socket,
+)
+from src.app.scheduler import append_segments, get_congestion_control
+from src.lib.ftp import Pocket, PocketType, PocketView, SegmentEncoder
+from src.lib.network import Datagram, DatagramTransportConnection, UDPConnection
+from src.lib.profiler import ProfilerScope
+from src.lib.rudp import Sender
+
+
+class AppProtocol(asyncio.DatagramProtocol):
+    """Dispatch the datagrams to the sessions, never blocks"""
+
+    def __init__(self) -> None:
+        self.sessions: dict[int, asyncio.Queue[PocketView]] = {}
+        self.closed: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        # keep references to the running sessions
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        # the selector datagram transport not inherits from DatagramTransport
+        set_socket(DatagramTransportConnection(cast(asyncio.DatagramTransport, transport), asyncio.get_running_loop()))
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+    def error_received(self, exc: Exception) -> None:
+        logging.error("socket error: {}".format(exc))
+
+    def datagram_received(self, data: bytes, clientAddress: tuple[str, int]) -> None:
+        if not dispatch(data, clientAddress):
+            return None
+
+        # the transport gives new bytes per datagram, so the queued views stay valid
+        pocket = PocketView(data)
+        requestID = pocket.requestID
+
+        if pocket.pocketType == PocketType.Request:
+            request = decode_request(pocket, clientAddress)
+            if request is None:
+                return None
+            task = asyncio.create_task(self.run_session(request, clientAddress))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        elif requestID in self.sessions:
+            self.sessions[requestID].put_nowait(pocket)
+        else:
+            send_close(clientAddress)
+
+    def on_forwarded(self, data: memoryview, clientAddress: tuple[str, int]) -> None:
+        # the sessions queue the pockets, so they can not keep views of the receive buffers
+        self.datagram_received(bytes(data), clientAddress)
+
+    async def run_session(self, request: Pocket, clientAddress: tuple[str, int]) -> None:
+        loop = asyncio.get_running_loop()
+
+        # the handler reads the storage and can build archive
+        result = await loop.run_in_executor(None, create_handler, request, clientAddress)
+        if not result:
+            return None
+
+        handler, res = result
+        if not sessions.add(handler, time.perf_counter()):
+            send_error("The server is busy, try again later", clientAddress)
+            handler.close()
+            return None
+
+        pockets: asyncio.Queue[PocketView] = asyncio.Queue()
+        self.sessions[handler.get_requestID()] = pockets
+        sendto(res, clientAddress)
+
+        try:
+            if isinstance(handler, UploadRequestHandler):
+                await asyncio.wait_for(uploading_session(handler, pockets), config.APP_SESSION_MAX_AGE)
+            elif isinstance(handler, DownloadRequestHandler):
+                await asyncio.wait_for(downloading_session(handler, res, pockets), config.APP_SESSION_MAX_AGE)
+        except asyncio.TimeoutError:
+            logging.info("Session {} expired".format(handler.get_requestID()))
+        except Exception:
+            logging.exception("session {} failed".format(handler.get_requestID()))
+        finally:
+            self.sessions.pop(handler.get_requestID())
+            sessions.remove(handler.get_requestID())
+            # release the resources of the uncomplited sessions
+            try:
+                handler.close()
+            except Exception:
+                logging.exception("session {} close failed".format(handler.get_requestID()))
+
+
+async def get_pocket(pockets: asyncio.Queue[PocketView], timeout: float) -> PocketView | None:
+    """Return the next pocket of session
+
+    Args:
+        pockets (asyncio.Queue[PocketView]): the pockets of the session
+        timeout (float): max time to wait [sec]
+
+    Returns:
+        PocketView | None: the pocket or None if the timeout expired
+    """
+    if not pockets.empty():
+        return pockets.get_nowait()
+    if timeout <= 0:
+        return None
+
+    try:
+        return await asyncio.wait_for(pockets.get(), timeout)
+    except asyncio.TimeoutError:
+        return None
+
+
+def write_segments(handler: UploadRequestHandler, pockets: list[PocketView]) -> None:
+    for pocket in pockets:
+        if not pocket.pocketType == PocketType.Segment:
+            logging.error("Get pocket that is not upload segment")
+        else:
+            segmentID, segment = pocket.get_segment()
+            amount = handler.sink.write(segmentID, segment)
+
+            # the duplicates acked again
+            handler.pendingAcks.append((segmentID, segmentID + amount))
+
+
+async def uploading_session(handler: UploadRequestHandler, pockets: asyncio.Queue[PocketView]) -> None:
+    loop = asyncio.get_running_loop()
+
+    while not handler.sink.is_complited():
+        pocket = await get_pocket(pockets, config.APP_SESSION_IDLE_TIMEOUT)
+        if not pocket:
+            logging.info("Session {} expired".format(handler.get_requestID()))
+            return None
+
+        # write the pockets that arrived meanwhile as a single batch
+        batch = [pocket]
+        while len(batch) < config.SACK_SEGMENTS_AMOUNT and not pockets.empty():
+            batch.append(pockets.get_nowait())
+
+        try:
+            await loop.run_in_executor(None, write_segments, handler, batch)
+        except ValueError as e:
+            # the compressed chunks are not valid
+            handler.abort(str(e))
+            return None
+        send_acks(handler)
+
+    # the next requests of the client can see the uploaded file only after the close
+    if await loop.run_in_executor(None, finish_upload, handler):
+        send_close(handler.get_client_address())
+
+
+async def downloading_session(handler: DownloadRequestHandler, res: Pocket, pockets: asyncio.Queue[PocketView]) -> None:
+    profilerScope = ProfilerScope(
+        "downloading " + str(handler.requestID) + " type " + str(handler.request.basicLayer.pocketSubType.name)
+    )
+
+    # send the response again with backoff until the client is ready
+    delay = config.RTO_INITIAL
+    retries = config.APP_RESPONSE_RETRIES
+    while not await get_pocket(pockets, delay):
+        if retries <= 0:
+            # the client is gone
+            logging.info("Request ID {} not confirmed, dropped".format(handler.get_requestID()))
+            profilerScope.close()
+            return None
+
+        sendto(res, handler.get_client_address())
+        delay = min(delay * 2, config.RTO_MAX)
+        retries -= 1
+
+    # the source is closed by the session from now
+    handler.ready = True
+    assert res.responseLayer
+    responseLayer = res.responseLayer
+
+    # the segments of a poll sended together
+    batch: list[Datagram] = []
+    encoder = SegmentEncoder(handler.get_requestID())
+    sender = Sender(
+        responseLayer.segmentsAmount,
+        responseLayer.singleSegmentSize,
+        responseLayer.maxSegmentSize,
+        lambda segmentID, amount: append_segments(
+            batch, encoder, handler, segmentID, amount, responseLayer.singleSegmentSize
+        ),
+        get_congestion_control(handler.request),
+        lambda segmentID: handler.source.release(segmentID),
+    )
+
+    lastActivity = time.perf_counter()
+    downloading = True
+    while downloading:
+        deadline = sender.poll(time.perf_counter())
+        sendto_many(batch, handler.get_client_address())
+        batch.clear()
+        encoder.reset()
+        pocket = await get_pocket(pockets, deadline - time.perf_counter())
+        if not pocket:
+            if time.perf_counter() - lastActivity > config.APP_SESSION_IDLE_TIMEOUT:
+                logging.info("Session {} expired".format(handler.get_requestID()))
+                handler.source.close()
+                profilerScope.close()
+                return None
+            continue
+
+        lastActivity = time.perf_counter()
+
+        sackLayer = pocket.get_sack_layer()
+        if pocket.pocketType == PocketType.DownloadComplited:
+            # complit the downloading
+            downloading = False
+        elif sackLayer:
+            sender.on_sack(sackLayer, time.perf_counter())
+
+    send_close(handler.get_client_address())
+    handler.source.close()
+
+    if handler.request.downloadRequestLayer:
+        logging.info(
+            'Download ID {} of "{}" complited'.format(handler.requestID, handler.request.downloadRequestLayer.path)
+        )
+    elif handler.request.listRequestLayer:
+        logging.info('List ID {} of "{}" complited'.format(handler.requestID, handler.request.listRequestLayer.path))
+
+    profilerScope.close()
+
+
+async def async_main_loop() -> None:
+    loop = asyncio.get_running_loop()
+
+    udpConnection = UDPConnection()
+    # the transport reads the socket by recvfrom, so it can not split GRO buffers
+    udpConnection.init((config.APP_HOST, config.APP_PORT), is_multi_worker(), False)
+    udpConnection.interfceSocket.setblocking(False)
+
+    transport, protocol = await loop.create_datagram_endpoint(AppProtocol, sock=udpConnection.interfceSocket)
+    if is_multi_worker():
+        # the pockets that other workers got for the requests of this worker
+        get_forward_socket().setblocking(False)
+        loop.add_reader(get_forward_socket(), lambda: protocol.on_forwarded(*recv_forwarded()))
+    logging.info("The app async socket initialized on " + config.APP_HOST + ":" + str(config.APP_PORT))
+
+    try:
+        await protocol.closed
+    finally:
+        transport.close()
@@ -0,0 +1,310 @@
+# content addressed storage, every file content stored once and its chunks are found by their hash
+
+import hashlib
+import logging
+import os
+import os.path
+import struct
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO
+
+from src.app.config import config
+from src.app.storage import get_staging_path
+from src.lib.delta import get_strong_hash
+
+# the chunks of stored content by their order, hash and length
+MANIFEST_STRUCT = struct.Struct("<16sI")
+# where the chunk is stored - the stored content, offset and length
+LOCATION_STRUCT = struct.Struct("<16sQI")
+
+# the files are indexed on a worker thread, so the uploads not wait for the hashing
+_indexer: ThreadPoolExecutor | None = None
+_indexerLock = threading.Lock()
+
+
+def get_owner(storagePath: str) -> str:
+    """Return the owner of the chunks of a storage, every owner finds only the chunks of its files
+
+    Args:
+        storagePath (str): the storage of the files - the public or private storage of a user
+
+    Returns:
+        str: name of the owner
+    """
+    return os.path.relpath(storagePath, config.APP_STORAGE_PATH).replace(os.sep, "-")
+
+
+def get_object_path(fileHash: bytes) -> str:
+    return config.APP_STORAGE_PATH + config.STORAGE_CHUNKS + "/objects/" + fileHash.hex()
+
+
+def get_manifest_path(fileHash: bytes) -> str:
+    return get_object_path(fileHash) + ".manifest"
+
+
+def get_owners_path(fileHash: bytes) -> str:
+    return get_object_path(fileHash) + ".owners"
+
+
+def get_location_path(chunkHash: bytes, owner: str) -> str:
+    name = chunkHash.hex()
+    return config.APP_STORAGE_PATH + config.STORAGE_CHUNKS + "/index/" + owner + "/" + name[:2] + "/" + name
+
+
+def init_chunk_store() -> None:
+    os.makedirs(config.APP_STORAGE_PATH + config.STORAGE_CHUNKS + "/objects", exist_ok=True)
+    os.makedirs(config.APP_STORAGE_PATH + config.STORAGE_CHUNKS + "/index", exist_ok=True)
+    collect_garbage()
+
+
+def load_location(chunkHash: bytes, owner: str) -> tuple[bytes, int, int] | None:
+    try:
+        with open(get_location_path(chunkHash, owner), "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    if len(data) != LOCATION_STRUCT.size:
+        return None
+    return LOCATION_STRUCT.unpack(data)
+
+
+def has_chunk(chunkHash: bytes, owner: str) -> bool:
+    """Return if the chunk is stored, its content is checked only when it used
+
+    Args:
+        chunkHash (bytes): hash of the chunk
+        owner (str): the owner of the chunk
+
+    Returns:
+        bool: true if the chunk is stored
+    """
+    location = load_location(chunkHash, owner)
+    return location is not None and os.path.isfile(get_object_path(location[0]))
+
+
+def find_chunk(chunkHash: bytes, length: int, owner: str) -> bytes | None:
+    """Return the stored chunk
+
+    Args:
+        chunkHash (bytes): hash of the chunk
+        length (int): size of the chunk
+        owner (str): the owner of the chunk
+
+    Returns:
+        bytes | None: the chunk, None if it is not stored
+    """
+    location = load_location(chunkHash, owner)
+    if not location or location[2] != length:
+        return None
+
+    fileHash, offset, length = location
+    try:
+        with open(get_object_path(fileHash), "rb") as f:
+            chunk = os.pread(f.fileno(), length, offset)
+    except OSError:
+        return None
+
+    # the stored content can be changed outside the app
+    if len(chunk) != length or get_strong_hash(chunk) != chunkHash:
+        return None
+    return chunk
+
+
+def get_file_chunks(f: BinaryIO, chunkSize: int) -> tuple[bytes, list[bytes]]:
+    fileHash = hashlib.blake2b(digest_size=16)
+    chunkHashes: list[bytes] = []
+    while True:
+        chunk = f.read(chunkSize)
+        if not chunk:
+            break
+        fileHash.update(chunk)
+        chunkHashes.append(get_strong_hash(chunk))
+    return (fileHash.digest(), chunkHashes)
+
+
+def add_file(path: str, chunkSize: int, owner: str, hashes: tuple[bytes, list[bytes]] | None = None) -> None:
+    """Store the content of file once, the file is replaced by hard link to the content that already stored.
+    The files of the storage are never changed in place, so the linked files not affect each other
+
+    Args:
+        path (str): path of the file in the storage
+        chunkSize (int): size of the chunks, the last chunk can be shorter
+        owner (str): the owner of the file, its chunks are indexed for it only
+        hashes (tuple[bytes, list[bytes]] | None, optional): the hash of the file and the hashes of its chunks.
+            Defaults to None - read from the file.
+    """
+    if not config.APP_CHUNK_STORE:
+        return None
+
+    try:
+        with open(path, "rb") as f:
+            fileStat = os.fstat(f.fileno())
+            if fileStat.st_size == 0:
+                return None
+            if not hashes:
+                hashes = get_file_chunks(f, chunkSize)
+
+        fileHash, chunkHashes = hashes
+        objectPath = get_object_path(fileHash)
+        # the file can be replaced by another upload meanwhile
+        if not is_same_inode(path, fileStat):
+            return None
+
+        if os.path.isfile(objectPath):
+            # the same content already stored
+            if not os.path.samefile(objectPath, path):
+                linkPath = get_staging_path(uuid.uuid4().hex + ".link")
+                os.link(objectPath, linkPath)
+                if is_same_inode(path, fileStat):
+                    os.replace(linkPath, path)
+                else:
+                    os.remove(linkPath)
+        else:
+            os.link(path, objectPath)
+            if not is_same_inode(objectPath, fileStat):
+                os.remove(objectPath)
+                return None
+
+            locations: list[tuple[bytes, int, int]] = []
+            offset = 0
+            for chunkHash in chunkHashes:
+                length = min(chunkSize, fileStat.st_size - offset)
+                locations.append((chunkHash, offset, length))
+                offset += length
+
+            with open(get_manifest_path(fileHash), "wb") as f:
+                f.write(b"".join(MANIFEST_STRUCT.pack(chunkHash, length) for chunkHash, _, length in locations))
+
+        if owner not in load_owners(fileHash):
+            with open(get_owners_path(fileHash), "a") as f:
+                f.write(owner + "\n")
+            index_chunks(fileHash, load_manifest(fileHash), owner)
+    except OSError as e:
+        # the file is kept as is
+        logging.warning('The file "{}" is not deduplicated: {}'.format(path, e))
+
+
+def index_file(path: str, chunkSize: int, owner: str, hashes: tuple[bytes, list[bytes]] | None = None) -> None:
+    """Store the content of file once on the worker thread of the chunk store, see add_file
+
+    Args:
+        path (str): path of the file in the storage
+        chunkSize (int): size of the chunks, the last chunk can be shorter
+        owner (str): the owner of the file, its chunks are indexed for it only
+        hashes (tuple[bytes, list[bytes]] | None, optional): the hash of the file and the hashes of its chunks.
+            Defaults to None - read from the file.
+    """
+    if not config.APP_CHUNK_STORE:
+        return None
+
+    def run() -> None:
+        try:
+            add_file(path, chunkSize, owner, hashes)
+        except Exception:
+            logging.exception('Indexing the file "{}" failed'.format(path))
+
+    get_indexer().submit(run)
+
+
+def get_indexer() -> ThreadPoolExecutor:
+    global _indexer
+    with _indexerLock:
+        if _indexer is None:
+            _indexer = ThreadPoolExecutor(1, thread_name_prefix="chunk-store")
+        return _indexer
+
+
+def _reset_indexer() -> None:
+    global _indexer, _indexerLock
+    # the worker thread of the parent not exists in the forked child
+    _indexer = None
+    _indexerLock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_indexer)
+
+
+def is_same_inode(path: str, fileStat: os.stat_result) -> bool:
+    try:
+        pathStat = os.stat(path)
+    except OSError:
+        return False
+    return (pathStat.st_dev, pathStat.st_ino) == (fileStat.st_dev, fileStat.st_ino)
+
+
+def load_owners(fileHash: bytes) -> set[str]:
+    try:
+        with open(get_owners_path(fileHash), "r") as f:
+            return set(f.read().split())
+    except FileNotFoundError:
+        return set()
+
+
+def load_manifest(fileHash: bytes) -> list[tuple[bytes, int, int]]:
+    with open(get_manifest_path(fileHash), "rb") as f:
+        data = f.read()
+
+    locations: list[tuple[bytes, int, int]] = []
+    offset = 0
+    for chunkHash, length in MANIFEST_STRUCT.iter_unpack(data):
+        locations.append((chunkHash, offset, length))
+        offset += length
+    return locations
+
+
+def index_chunks(fileHash: bytes, locations: list[tuple[bytes, int, int]], owner: str) -> None:
+    # the chunks that already stored keep their location
+    for chunkHash, offset, length in locations:
+        locationPath = get_location_path(chunkHash, owner)
+        os.makedirs(os.path.dirname(locationPath), exist_ok=True)
+        try:
+            with open(locationPath, "xb") as f:
+                f.write(LOCATION_STRUCT.pack(fileHash, offset, length))
+        except FileExistsError:
+            if not has_chunk(chunkHash, owner):
+                # the location of content that not exists
+                with open(locationPath, "wb") as f:
+                    f.write(LOCATION_STRUCT.pack(fileHash, offset, length))
+
+
+def collect_garbage() -> None:
+    """Delete the stored content that no file of the storage links to, with the locations of its chunks"""
+    objectsPath = config.APP_STORAGE_PATH + config.STORAGE_CHUNKS + "/objects"
+    deletedAmount = 0
+    for name in os.listdir(objectsPath):
+        if name.endswith(".manifest") or name.endswith(".owners"):
+            continue
+
+        fileHash = bytes.fromhex(name)
+        objectPath = get_object_path(fileHash)
+        if os.stat(objectPath).st_nlink > 1:
+            continue
+
+        if os.path.isfile(get_manifest_path(fileHash)):
+            for owner in load_owners(fileHash):
+                for chunkHash, _, _ in load_manifest(fileHash):
+                    location = load_location(chunkHash, owner)
+                    if location and location[0] == fileHash:
+                        os.remove(get_location_path(chunkHash, owner))
+            os.remove(get_manifest_path(fileHash))
+        if os.path.isfile(get_owners_path(fileHash)):
+            os.remove(get_owners_path(fileHash))
+
+        os.remove(objectPath)
+        deletedAmount += 1
+
+    if deletedAmount == 0:
+        return None
+
+    # the chunks of the deleted content that other content has
+    for name in os.listdir(objectsPath):
+        if name.endswith(".manifest") or name.endswith(".owners"):
+            continue
+        fileHash = bytes.fromhex(name)
+        if os.path.isfile(get_manifest_path(fileHash)):
+            for owner in load_owners(fileHash):
+                index_chunks(fileHash, load_manifest(fileHash), owner)
+    logging.info("The chunk store deleted {} contents that not used".format(deletedAmount))
@@ -4,8 +4,11 @@ import os
 
 from dotenv import load_dotenv
 
+from src.lib.compression import parse_compression
 from src.lib.config import Config
 from src.lib.config import init_logging as base_init_logging
+from src.lib.congestion import parse_congestion_control
+from src.lib.ftp import CompressionType, CongestionControlType, PocketSubType
 
 
 class AppConfig(Config):
@@ -13,12 +16,38 @@ class AppConfig(Config):
     APP_PORT: int = 8000
     APP_STORAGE_PATH: str = "storage"
 
+    APP_CONGESTION_CONTROL: CongestionControlType = CongestionControlType.Cubic
+    APP_COMPRESSION: CompressionType = CompressionType.Zlib  # of the requests that not choose it
+    APP_ASYNC_MODE: bool = False
+    APP_CHUNK_STORE: bool = True  # the content of the uploaded files stored once
+    APP_WORKERS: int = 1
+    APP_TIMER_TICK: float = 0.01  # [sec]
+    APP_TIMER_SLOTS: int = 512
+    APP_RESPONSE_RETRIES: int = 8  # the response resent with backoff, then the request dropped
+    APP_SESSION_IDLE_TIMEOUT: float = 30  # [sec]
+    APP_SESSION_MAX_AGE: float = 24 * 60 * 60  # [sec]
+    APP_SESSIONS_MAX: int = 4096
+    APP_SESSIONS_MAX_MEMORY: int = 256 * 1024 * 1024  # [byte]
+    APP_UPLOAD_CHECKPOINT_INTERVAL: float = 5  # [sec] the received segments of resumable upload saved
+    APP_UPLOAD_RESUME_MAX_AGE: float = 7 * 24 * 60 * 60  # [sec] the partial uploads deleted after it
+    APP_UPLOAD_STATUS_RANGES_MAX: int = 2048  # the missing ranges in single response
+    APP_TRANSFER_THREADS: int = 1  # sender loops that serve the downloads
+    APP_TRANSFER_QUANTUM: int = 64  # [segment] sended by each download in a round
+    # the quantum multiplier of each request type, the short listings are not waiting behind big files
+    APP_TRANSFER_WEIGHTS: dict[PocketSubType, int] = {
+        PocketSubType.Download: 1,
+        PocketSubType.List: 2,
+        PocketSubType.Signature: 2,
+    }
+
     STORAGE_PUBLIC = "/public"
     STORAGE_PRIVATE = "/private"
+    STORAGE_STAGING = "/staging"
+    STORAGE_CHUNKS = "/chunks"
     STORAGE_DATA = "/data.json"
 
-    SINGLE_SEGMENT_SIZE_MIN = 1500  # [byte] (not more then 60000)
-    SINGLE_SEGMENT_SIZE_MAX = 1500  # [byte] (not more then 60000)
+    SINGLE_SEGMENT_SIZE_MIN = 1500  # [byte] size of single segment (not more then 60000)
+    SINGLE_SEGMENT_SIZE_MAX = 60000  # [byte] max size of segments in a single pocket (not more then 60000)
 
 
 config = AppConfig()
@@ -40,6 +69,46 @@ def init_config() -> None:
     if APP_STORAGE_PATH:
         config.APP_STORAGE_PATH = APP_STORAGE_PATH
 
+    APP_CONGESTION_CONTROL = os.getenv("APP_CONGESTION_CONTROL")
+    if APP_CONGESTION_CONTROL:
+        config.APP_CONGESTION_CONTROL = parse_congestion_control(APP_CONGESTION_CONTROL)
+
+    APP_COMPRESSION = os.getenv("APP_COMPRESSION")
+    if APP_COMPRESSION:
+        config.APP_COMPRESSION = parse_compression(APP_COMPRESSION)
+
+    APP_ASYNC_MODE = os.getenv("APP_ASYNC_MODE")
+    if APP_ASYNC_MODE:
+        config.APP_ASYNC_MODE = APP_ASYNC_MODE.lower() in ["1", "true", "yes"]
+
+    APP_CHUNK_STORE = os.getenv("APP_CHUNK_STORE")
+    if APP_CHUNK_STORE:
+        config.APP_CHUNK_STORE = APP_CHUNK_STORE.lower() in ["1", "true", "yes"]
+
+    APP_WORKERS = os.getenv("APP_WORKERS")
+    if APP_WORKERS:
+        config.APP_WORKERS = max(int(APP_WORKERS), 1)
+
+    APP_SESSION_IDLE_TIMEOUT = os.getenv("APP_SESSION_IDLE_TIMEOUT")
+    if APP_SESSION_IDLE_TIMEOUT:
+        config.APP_SESSION_IDLE_TIMEOUT = float(APP_SESSION_IDLE_TIMEOUT)
+
+    APP_SESSION_MAX_AGE = os.getenv("APP_SESSION_MAX_AGE")
+    if APP_SESSION_MAX_AGE:
+        config.APP_SESSION_MAX_AGE = float(APP_SESSION_MAX_AGE)
+
+    APP_SESSIONS_MAX_MEMORY = os.getenv("APP_SESSIONS_MAX_MEMORY")
+    if APP_SESSIONS_MAX_MEMORY:
+        config.APP_SESSIONS_MAX_MEMORY = int(APP_SESSIONS_MAX_MEMORY)
+
+    APP_UPLOAD_RESUME_MAX_AGE = os.getenv("APP_UPLOAD_RESUME_MAX_AGE")
+    if APP_UPLOAD_RESUME_MAX_AGE:
+        config.APP_UPLOAD_RESUME_MAX_AGE = float(APP_UPLOAD_RESUME_MAX_AGE)
+
+    APP_TRANSFER_THREADS = os.getenv("APP_TRANSFER_THREADS")
+    if APP_TRANSFER_THREADS:
+        config.APP_TRANSFER_THREADS = max(int(APP_TRANSFER_THREADS), 1)
+
 
 def init_logging() -> None:
     base_init_logging()
@@ -1,10 +1,10 @@
 # main controller
 
+import fcntl
 import json
 import logging
 import os
 import os.path
-import threading
 import time
 import uuid
 from concurrent.futures import ThreadPoolExecutor
@@ -13,189 +13,197 @@ import jsbeautifier  # type: ignore
 
 from src.app.config import config
 from src.app.handlers import (
+    ChunkStatusRequestHandler,
+    ChunkUploadRequestHandler,
     DeleteRequestHandler,
+    DeltaUploadRequestHandler,
     DownloadFileRequestHandler,
     DownloadRequestHandler,
     ListRequestHandler,
     RequestHandler,
+    SignatureRequestHandler,
     UploadFileRequestHandler,
     UploadRequestHandler,
+    UploadStatusRequestHandler,
+    get_segment_sizes,
 )
-from src.app.rudp import recvfrom, send_close, send_error, sendto
+from src.app.rudp import has_data, recvfrom, send_close, send_error, sendto
+from src.app.scheduler import TransferPool
+from src.app.sessions import SessionTable
 from src.app.storage import StorageData, UserData
-from src.lib.ftp import AKCLayer, BasicLayer, Pocket, PocketSubType, PocketType, ResponseLayer, SegmentLayer
-from src.lib.profiler import ProfilerScope, profiler_scope
+from src.lib.ftp import (
+    BasicLayer,
+    CompressionType,
+    Pocket,
+    PocketSubType,
+    PocketType,
+    PocketView,
+    ResponseLayer,
+    SACKLayer,
+)
+from src.lib.profiler import profiler_scope
+from src.lib.segments import CompressedSegmentSource
+from src.lib.timers import Timer, TimerWheel
 
-# globals
-executor = ThreadPoolExecutor(2)
+# the handlers of the active requests
+sessions = SessionTable()
 
-# dict of handlers for the requests
-handlers: dict[int, RequestHandler] = {}
-handlersLock = threading.Lock()
+# dict of upload handlers that wait to send SACK
+waitingAcks: dict[int, UploadRequestHandler] = {}
 
 
 @profiler_scope("main loop")
 def main_loop() -> None:
-    global handlers, handlersLock
+    transfers = TransferPool(config.APP_TRANSFER_THREADS, finish_download)
+    # the uploads are built and committed out of the loop, like in the async mode
+    finishers = ThreadPoolExecutor(thread_name_prefix="upload")
+    # the response resends and the session expiries, the senders RTO and pacing need finer time than the ticks,
+    # so they are by the poll deadlines of the sender loops
+    timers = TimerWheel(config.APP_TIMER_TICK, config.APP_TIMER_SLOTS, time.perf_counter())
+    # response retransmission timers of the unready downloads
+    responseTimers: dict[int, Timer] = {}
 
-    # dict of responses for unready requests
-    notReady: dict[int, Pocket] = {}
     while True:
         try:
             data, clientAddress = recvfrom()
         except OSError:
             data = None
+            send_waiting_acks()
 
-        if data:
-            pocket = Pocket.from_bytes(data)
-
-        for key in notReady:
-            if data and not key == pocket.basicLayer.requestID:
-                sendto(notReady[key], handlers[key].get_client_address())
+        now = time.perf_counter()
+        timers.advance(now)
 
         if data:
-            if pocket.basicLayer.pocketType == PocketType.Request:
-                result = create_handler(pocket, clientAddress)
+            # the request is decoded fully, the transfer pockets only as much as needed
+            pocket = PocketView(data)
+            requestID = pocket.requestID
+
+            if pocket.pocketType == PocketType.Request:
+                request = decode_request(pocket, clientAddress)
+                result = create_handler(request, clientAddress) if request else None
                 if result:
                     handler, res = result
-                    if isinstance(handler, DownloadRequestHandler):
-                        notReady[handler.get_requestID()] = res
-
-                    handlersLock.acquire()
-                    handlers[handler.get_requestID()] = handler
-                    handlersLock.release()
-            elif pocket.basicLayer.requestID in handlers:
-                handler = handlers[pocket.basicLayer.requestID]
+
+                    if not sessions.add(handler, now):
+                        send_error("The server is busy, try again later", clientAddress)
+                        handler.close()
+                    else:
+                        sendto(res, clientAddress)
+                        schedule_expiry(timers, responseTimers, handler.get_requestID(), now)
+                        if isinstance(handler, DownloadRequestHandler):
+                            schedule_response(
+                                timers,
+                                responseTimers,
+                                handler,
+                                res,
+                                config.RTO_INITIAL,
+                                now,
+                                config.APP_RESPONSE_RETRIES,
+                            )
+            elif requestID in sessions:
+                sessions.touch(requestID, now)
+                handler = sessions.get(requestID)
                 if isinstance(handler, UploadRequestHandler):
-                    if not handle_upload_pocket(handler, pocket):
-                        handlersLock.acquire()
-                        handlers.pop(handler.get_requestID())
-                        handlersLock.release()
+                    # the segments that arrive while the upload finishing are ignored
+                    if not handler.finishing and not handle_upload_pocket(handler, pocket, finishers):
+                        sessions.remove(handler.get_requestID())
                 elif isinstance(handler, DownloadRequestHandler):
                     if not handler.ready:
                         handler.ready = True
-                        notReady.pop(handler.get_requestID())
-
-                        def downloading_task(handler: DownloadRequestHandler) -> None:
-                            global handlers, handlersLock
-
-                            profilerScope = ProfilerScope(
-                                "downloading "
-                                + str(handler.requestID)
-                                + " type "
-                                + str(handler.request.basicLayer.pocketSubType.name)
-                            )
+                        timers.cancel(responseTimers.pop(handler.get_requestID()))
 
-                            handler.locker.acquire()
-                            assert handler.response.responseLayer
-                            singleSegmentSize = handler.response.responseLayer.singleSegmentSize
-                            segmentsAmount = handler.response.responseLayer.segmentsAmount
-                            dataSize = len(handler.data)
-                            handler.locker.release()
-
-                            rtt = config.SOCKET_TIMEOUT
-                            cwnd = cwndMax = config.CWND_START_VALUE
-                            C, B = 0.4, 0.7
-
-                            last = time.time()
-                            downloading = True
-
-                            while downloading:
-                                now = time.time()
-                                if (
-                                    last + rtt > now
-                                    and len(handler.windowToSend) > 0
-                                    and len(handler.windowSending) < cwnd
-                                ):
-                                    # send a segment
-                                    segmentID = handler.windowToSend.pop(0)
-                                    if segmentID * singleSegmentSize <= dataSize - singleSegmentSize:
-                                        # is not the last segment
-                                        segment = handler.data[
-                                            segmentID * singleSegmentSize : (segmentID + 1) * singleSegmentSize
-                                        ]
-                                    else:
-                                        # is the last segment
-                                        segment = handler.data[segmentID * singleSegmentSize :]
-
-                                    segmentPocket = Pocket(BasicLayer(handler.get_requestID(), PocketType.Segment))
-                                    segmentPocket.segmentLayer = SegmentLayer(segmentID, segment)
-
-                                    handler.windowSending.append(segmentID)
-                                    sendto(segmentPocket, clientAddress)
-                                else:
-                                    # refresh window
-                                    logging.debug(
-                                        "refresh window {}/{}".format(
-                                            segmentsAmount - len(handler.windowToSend) - len(handler.windowSending),
-                                            segmentsAmount,
-                                        )
-                                    )
-                                    timeout = False
-                                    while not timeout:
-                                        if len(handler.pockets) > 0:
-                                            handler.locker.acquire()
-                                            pocket = handler.pockets.pop(0)
-                                            handler.locker.release()
-                                        else:
-                                            pocket = None
-                                            now = time.time()
-                                            timeout = last + rtt < now
-
-                                        if pocket:
-                                            if pocket.basicLayer.pocketType == PocketType.DownloadComplited:
-                                                # complit the downloading
-                                                handler.pockets = []
-                                                downloading = False
-                                            elif pocket.akcLayer:
-                                                if pocket.akcLayer.segmentID in handler.windowToSend:
-                                                    handler.windowToSend.remove(pocket.akcLayer.segmentID)
-                                                if pocket.akcLayer.segmentID in handler.windowSending:
-                                                    handler.windowSending.remove(pocket.akcLayer.segmentID)
-
-                                    if len(handler.windowSending) > 0:
-                                        handler.windowToSend = handler.windowSending + handler.windowToSend
-                                        handler.windowSending = []
-                                        cwndMax = cwnd
-                                        cwnd = int(max(cwnd / 2, 1))
-                                    else:
-                                        cwnd = int(
-                                            max(C * ((rtt - (cwndMax * (1 - B) / C) ** (1 / 3)) ** 3) + cwndMax, 1)
-                                        )
-
-                                    rtt = time.time() - last
-                                    last = time.time()
-
-                            send_close(handler.get_client_address())
-
-                            if handler.request.downloadRequestLayer:
-                                logging.info(
-                                    'Download ID {} of "{}" complited'.format(
-                                        handler.requestID, handler.request.downloadRequestLayer.path
-                                    )
-                                )
-                            elif handler.request.listRequestLayer:
-                                logging.info(
-                                    'List ID {} of "{}" complited'.format(
-                                        handler.requestID, handler.request.listRequestLayer.path
-                                    )
-                                )
-
-                            handlersLock.acquire()
-                            handlers.pop(handler.get_requestID())
-                            handlersLock.release()
-
-                            profilerScope.close()
-
-                        executor.submit(downloading_task, handler)
+                        transfers.add(handler)
                     else:
-                        handler.locker.acquire()
-                        handler.pockets += [pocket]
-                        handler.locker.release()
+                        # the view is not valid after the receive buffer reused
+                        transfers.put(handler, pocket.to_pocket())
 
             else:
                 send_close(clientAddress)
 
+            if not has_data():
+                send_waiting_acks()
+
+
+def finish_download(handler: DownloadRequestHandler) -> None:
+    if handler.closed:
+        logging.info("Download ID {} stopped".format(handler.requestID))
+    elif handler.request.downloadRequestLayer:
+        logging.info(
+            'Download ID {} of "{}" complited'.format(handler.requestID, handler.request.downloadRequestLayer.path)
+        )
+    elif handler.request.listRequestLayer:
+        logging.info('List ID {} of "{}" complited'.format(handler.requestID, handler.request.listRequestLayer.path))
+
+    sessions.remove(handler.get_requestID())
+
+
+def schedule_expiry(timers: TimerWheel, responseTimers: dict[int, Timer], requestID: int, now: float) -> None:
+    def on_expiry(now: float) -> None:
+        handler = sessions.get(requestID)
+        if handler is None:
+            # the session finished
+            return None
+        if isinstance(handler, UploadRequestHandler) and handler.finishing:
+            # the finishing upload closes itself
+            timers.schedule(now + config.APP_SESSION_IDLE_TIMEOUT, on_expiry)
+            return None
+
+        handler = sessions.expire(requestID, now)
+        if not handler:
+            # the session was active meanwhile
+            expiry = sessions.get_expiry(requestID)
+            if expiry is not None:
+                timers.schedule(expiry, on_expiry)
+            return None
+
+        logging.info("Session {} expired".format(requestID))
+        waitingAcks.pop(requestID, None)
+        responseTimer = responseTimers.pop(requestID, None)
+        if responseTimer:
+            timers.cancel(responseTimer)
+        try:
+            handler.close()
+        except Exception:
+            logging.exception("session {} close failed".format(requestID))
+
+    # single timer of the session, the activity only moves the expiry and the fired timer follows it
+    expiry = sessions.get_expiry(requestID)
+    if expiry is not None:
+        timers.schedule(max(expiry, now), on_expiry)
+
+
+def schedule_response(
+    timers: TimerWheel,
+    responseTimers: dict[int, Timer],
+    handler: DownloadRequestHandler,
+    res: Pocket,
+    delay: float,
+    now: float,
+    retries: int,
+) -> None:
+    def on_timeout(now: float) -> None:
+        responseTimers.pop(handler.get_requestID())
+        if retries <= 0:
+            # the client is gone
+            logging.info("Request ID {} not confirmed, dropped".format(handler.get_requestID()))
+            sessions.remove(handler.get_requestID())
+            handler.close()
+            return None
+
+        sendto(res, handler.get_client_address())
+        schedule_response(timers, responseTimers, handler, res, min(delay * 2, config.RTO_MAX), now, retries - 1)
+
+    # resend the response with backoff until the client is ready
+    responseTimers[handler.get_requestID()] = timers.schedule(now + delay, on_timeout)
+
+
+def decode_request(pocket: PocketView, clientAddress: tuple[str, int]) -> Pocket | None:
+    try:
+        return pocket.to_pocket()
+    except ValueError as e:
+        send_error("Invalid request: {}".format(e), clientAddress)
+        return None
+
 
 @profiler_scope()
 def create_handler(request: Pocket, clientAddress: tuple[str, int]) -> tuple[RequestHandler, Pocket] | None:
@@ -209,27 +217,30 @@ def create_handler(request: Pocket, clientAddress: tuple[str, int]) -> tuple[Req
             send_error("The user name cannot be empty", clientAddress)
             return None
 
-        with open(config.APP_STORAGE_PATH + config.STORAGE_DATA, "r") as f:
+        with open(config.APP_STORAGE_PATH + config.STORAGE_DATA, "r+") as f:
+            # the users are read and created by a single request at a time, also across the workers
+            fcntl.flock(f, fcntl.LOCK_EX)
             storageData = StorageData(**json.load(f))
 
-        # check if the user not exists
-        userData = storageData.users.get(request.requestLayer.userName)
+            # check if the user not exists
+            userData = storageData.users.get(request.requestLayer.userName)
 
-        if userData:
-            if not userData.password == request.requestLayer.password:
-                send_error("the password is incorrect", clientAddress)
-                return None
-        else:
-            userData = UserData(id=str(uuid.uuid4()), password=request.requestLayer.password)
-            while os.path.isdir(config.APP_STORAGE_PATH + config.STORAGE_PRIVATE + "/" + userData.id):
-                userData.id = str(uuid.uuid4())
+            if userData:
+                if not userData.password == request.requestLayer.password:
+                    send_error("the password is incorrect", clientAddress)
+                    return None
+            else:
+                userData = UserData(id=str(uuid.uuid4()), password=request.requestLayer.password)
+                while os.path.isdir(config.APP_STORAGE_PATH + config.STORAGE_PRIVATE + "/" + userData.id):
+                    userData.id = str(uuid.uuid4())
 
-            os.mkdir(config.APP_STORAGE_PATH + config.STORAGE_PRIVATE + "/" + userData.id)
-            storageData.users[request.requestLayer.userName] = userData
+                os.mkdir(config.APP_STORAGE_PATH + config.STORAGE_PRIVATE + "/" + userData.id)
+                storageData.users[request.requestLayer.userName] = userData
 
-            with open(config.APP_STORAGE_PATH + config.STORAGE_DATA, "w") as f:
                 opts = jsbeautifier.default_options()
                 opts.indent_size = 2
+                f.seek(0)
+                f.truncate()
                 f.write(jsbeautifier.beautify(storageData.json(), opts))
 
         storagePath = config.APP_STORAGE_PATH + config.STORAGE_PRIVATE + "/" + userData.id + "/"
@@ -244,73 +255,139 @@ def create_handler(request: Pocket, clientAddress: tuple[str, int]) -> tuple[Req
         handler = ListRequestHandler(request, clientAddress, storagePath)
     elif request.basicLayer.pocketSubType == PocketSubType.Delete:
         handler = DeleteRequestHandler(request, clientAddress, storagePath)
+    elif request.basicLayer.pocketSubType == PocketSubType.UploadStatus:
+        handler = UploadStatusRequestHandler(request, clientAddress, storagePath)
+    elif request.basicLayer.pocketSubType == PocketSubType.Signature:
+        handler = SignatureRequestHandler(request, clientAddress, storagePath)
+    elif request.basicLayer.pocketSubType == PocketSubType.DeltaUpload:
+        handler = DeltaUploadRequestHandler(request, clientAddress, storagePath)
+    elif request.basicLayer.pocketSubType == PocketSubType.ChunkStatus:
+        handler = ChunkStatusRequestHandler(request, clientAddress, storagePath)
+    elif request.basicLayer.pocketSubType == PocketSubType.ChunkUpload:
+        handler = ChunkUploadRequestHandler(request, clientAddress, storagePath)
 
     result = handler.route()
     if not result:
         return None
 
-    res, data = result
+    res, source = result
 
     dataSize = 0
     if isinstance(handler, UploadRequestHandler):
         dataSize = request.requestLayer.pocketFullSize
-    elif data:
-        dataSize = len(data)
+    elif source is not None:
+        dataSize = len(source)
+
+    singleSegmentSize, maxSegmentSize = get_segment_sizes(request, handler.compression)
+
+    if isinstance(handler, UploadRequestHandler):
+        try:
+            handler.open_sink(dataSize, singleSegmentSize)
+        except BlockingIOError:
+            send_error("The upload is already in progress, try again later", clientAddress)
+            return None
 
     if dataSize == 0:
         res.responseLayer = ResponseLayer(True, "", 0, 0, 0)
         sendto(res, clientAddress)
 
         if isinstance(handler, UploadRequestHandler):
-            handler.post_upload(b"")
+            finish_upload(handler)
+        elif source is not None:
+            source.close()
 
         return None
 
-    singleSegmentSize = max(config.SINGLE_SEGMENT_SIZE_MIN, request.requestLayer.maxSingleSegmentSize)
-    singleSegmentSize = min(config.SINGLE_SEGMENT_SIZE_MAX, singleSegmentSize)
-
     segmentsAmount = int(dataSize / singleSegmentSize)
     if segmentsAmount * singleSegmentSize < dataSize:
         segmentsAmount += 1
 
-    res.responseLayer = ResponseLayer(True, "", dataSize, segmentsAmount, singleSegmentSize)
+    res.responseLayer = ResponseLayer(
+        True, "", dataSize, segmentsAmount, singleSegmentSize, maxSegmentSize, handler.compression
+    )
 
-    if isinstance(handler, UploadRequestHandler):
-        handler.segmentsAmount = segmentsAmount
-    elif isinstance(handler, DownloadRequestHandler):
-        assert data is not None
-        handler.data = data
-        handler.windowToSend = list(range(segmentsAmount))
-        handler.windowSending = []
+    if isinstance(handler, DownloadRequestHandler):
+        assert source is not None
+        handler.source = source
+        if handler.compression != CompressionType.Nothing:
+            # the chunks are compressed on the worker threads, ahead of the sender loop
+            handler.source = CompressedSegmentSource(source, handler.compression, singleSegmentSize)
         handler.response = res
 
-    sendto(res, clientAddress)
+    # the caller sends the response after the handler registered
     return (handler, res)
 
 
 @profiler_scope()
-def handle_upload_pocket(handler: UploadRequestHandler, pocket: Pocket) -> bool:
-    if (not pocket.segmentLayer) or (not pocket.basicLayer.pocketType == PocketType.Segment):
+def handle_upload_pocket(handler: UploadRequestHandler, pocket: PocketView, finishers: ThreadPoolExecutor) -> bool:
+    if not pocket.pocketType == PocketType.Segment:
         logging.error("Get pocket that is not upload segment")
     else:
-        segmentID = pocket.segmentLayer.segmentID
-        if segmentID not in handler.segments:
-            # add new segment
-            handler.segments[segmentID] = pocket.segmentLayer.data
+        segmentID, segment = pocket.get_segment()
+        try:
+            # write the segments at their offset, duplicates are ignored
+            amount = handler.sink.write(segmentID, segment)
+
+            # the duplicates acked again
+            handler.pendingAcks.append((segmentID, segmentID + amount))
+            waitingAcks[handler.get_requestID()] = handler
+            if len(handler.pendingAcks) >= config.SACK_SEGMENTS_AMOUNT:
+                send_acks(handler)
+
+            if handler.sink.is_complited():
+                # upload all, the session is removed after the upload finished
+                waitingAcks.pop(handler.get_requestID(), None)
+                handler.finishing = True
+                finishers.submit(finish_upload_session, handler)
+        except ValueError as e:
+            # the compressed chunks are not valid
+            waitingAcks.pop(handler.get_requestID(), None)
+            handler.abort(str(e))
+            return False
+
+    return True
 
-        akcPocket = Pocket(BasicLayer(handler.get_requestID(), PocketType.ACK))
-        akcPocket.akcLayer = AKCLayer(segmentID)
-        sendto(akcPocket, handler.get_client_address())
 
-        if len(handler.segments) == handler.segmentsAmount:
-            # upload all
-            data = b""
-            for key in sorted(handler.segments):
-                data += handler.segments[key]
+def finish_upload(handler: UploadRequestHandler) -> bool:
+    """Build and commit the uploaded file, the failed upload is aborted
+
+    Args:
+        handler (UploadRequestHandler): the handler of the upload
+
+    Returns:
+        bool: true if the upload committed
+    """
+    try:
+        handler.post_upload()
+    except ValueError as e:
+        handler.abort(str(e))
+        return False
+    except OSError:
+        logging.exception("Upload {} failed".format(handler.get_requestID()))
+        handler.abort("The upload failed on the server")
+        return False
+    return True
 
+
+def finish_upload_session(handler: UploadRequestHandler) -> None:
+    # called in the worker thread
+    try:
+        if finish_upload(handler):
             send_close(handler.get_client_address())
+    except Exception:
+        logging.exception("Upload {} failed".format(handler.get_requestID()))
+    finally:
+        sessions.remove(handler.get_requestID())
 
-            handler.post_upload(data)
-            return False
 
-    return True
+def send_acks(handler: UploadRequestHandler) -> None:
+    sackPocket = Pocket(BasicLayer(handler.get_requestID(), PocketType.SACK))
+    sackPocket.sackLayer = SACKLayer.from_ranges(handler.sink.segments.firstMissing, handler.pendingAcks)
+    handler.pendingAcks = []
+    waitingAcks.pop(handler.get_requestID(), None)
+    sendto(sackPocket, handler.get_client_address())
+
+
+def send_waiting_acks() -> None:
+    for handler in list(waitingAcks.values()):
+        send_acks(handler)
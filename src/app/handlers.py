@@ -1,28 +1,81 @@
 # FTP handlers
 
+import hashlib
 import logging
 import os
 import os.path
 import shutil
 import struct
-import threading
+import tempfile
 import zipfile
 from abc import ABC, abstractmethod
-from io import BytesIO
 
+from src.app.chunk_store import find_chunk, get_owner, has_chunk, index_file
 from src.app.config import config
 from src.app.rudp import create_new_requestID, send_error
-from src.app.storage import get_path, in_storage
+from src.app.storage import get_path, get_staging_path, in_storage
+from src.lib.chunks import CHUNK_STRUCT, apply_chunk_upload
+from src.lib.compression import is_compressible
+from src.lib.delta import apply_delta, create_signature, get_block_size
 from src.lib.ftp import (
     BasicLayer,
+    ChunkStatusResponseLayer,
+    CompressionType,
     DeleteResponseLayer,
+    DownloadResponseLayer,
     Pocket,
     PocketSubType,
     PocketType,
+    SignatureResponseLayer,
+    UploadStatusResponseLayer,
     pack_directory_block,
     pack_file_block,
 )
 from src.lib.profiler import ProfilerScope, profiler_scope
+from src.lib.segments import (
+    BytesSegmentSource,
+    CompressedSegmentSource,
+    FileSegmentSink,
+    FileSegmentSource,
+    ResumableFileSegmentSink,
+    SegmentsBitmap,
+    SegmentSource,
+    load_segments_state,
+)
+
+
+def get_upload_staging_path(storagePath: str, path: str, token: str, dataSize: int, singleSegmentSize: int) -> str:
+    # the partial upload of the same user, destination, token, size and segments
+    key = hashlib.sha256(
+        "{}\0{}\0{}\0{}\0{}".format(storagePath, path, token, dataSize, singleSegmentSize).encode()
+    ).hexdigest()
+    return get_staging_path("upload-" + key + ".part")
+
+
+def get_compression(request: Pocket, path: str) -> CompressionType:
+    assert request.requestLayer
+
+    # the content that already compressed is sended as is
+    if request.requestLayer.compression == CompressionType.Nothing or not is_compressible(path):
+        return CompressionType.Nothing
+    # the client can choose the compression of its request
+    if request.requestLayer.compression != CompressionType.Default:
+        return request.requestLayer.compression
+    return config.APP_COMPRESSION
+
+
+def get_segment_sizes(request: Pocket, compression: CompressionType) -> tuple[int, int]:
+    assert request.requestLayer
+
+    # consecutive segments can be sended in a single pocket, up to the max size that both sides support
+    maxSegmentSize = max(config.SINGLE_SEGMENT_SIZE_MIN, request.requestLayer.maxSingleSegmentSize)
+    maxSegmentSize = min(config.SINGLE_SEGMENT_SIZE_MAX, maxSegmentSize)
+    if compression == CompressionType.Nothing:
+        return (config.SINGLE_SEGMENT_SIZE_MIN, maxSegmentSize)
+
+    # every pocket carries single chunk that compressed apart, with its compression type
+    singleSegmentSize = min(config.COMPRESSION_CHUNK_SIZE, maxSegmentSize - 1)
+    return (singleSegmentSize, singleSegmentSize + 1)
 
 
 # interfaces
@@ -32,9 +85,11 @@ class RequestHandler(ABC):
         self._clientAddress = clientAddress
         self.requestID = 0
         self._storagePath = storagePath
+        # compression of the transfered data, chosen by the route
+        self.compression = CompressionType.Nothing
 
     @abstractmethod
-    def route(self) -> tuple[Pocket, bytes | None] | None:
+    def route(self) -> tuple[Pocket, SegmentSource | None] | None:
         ...
 
     def get_client_address(self) -> tuple[str, int]:
@@ -49,28 +104,104 @@ class RequestHandler(ABC):
     def send_error(self, errorMessage: str) -> None:
         send_error(errorMessage, self._clientAddress)
 
+    def get_memory_size(self) -> int:
+        return 0
+
+    def close(self) -> None:
+        ...
+
 
 class UploadRequestHandler(RequestHandler):
     def __init__(self, request: Pocket, clientAddress: tuple[str, int], storagePath: str):
         RequestHandler.__init__(self, request, clientAddress, storagePath)
-        self.segments: dict[int, bytes] = {}
-        self.segmentsAmount = 0
+        self.sink: FileSegmentSink = ...  # type: ignore[assignment]
+        self.pendingAcks: list[tuple[int, int]] = []
+        # all the segments received, the upload is finishing on a worker thread
+        self.finishing = False
+
+    def get_memory_size(self) -> int:
+        # the segments are written to the staging file, only the bitmap is in the memory
+        return (len(self.sink.segments) + 7) // 8 if isinstance(self.sink, FileSegmentSink) else 0
+
+    def open_sink(self, dataSize: int, singleSegmentSize: int) -> None:
+        """Open the staging file of the upload, the resumable upload continues its partial staging file
+
+        Args:
+            dataSize (int): size in bytes of the data
+            singleSegmentSize (int): size of each segment
+
+        Raises:
+            BlockingIOError: other session uploads into the staging file
+        """
+        assert self.request.uploadRequestLayer
+        if self.request.uploadRequestLayer.token:
+            self.sink = ResumableFileSegmentSink(
+                get_upload_staging_path(
+                    self._storagePath,
+                    self.request.uploadRequestLayer.path,
+                    self.request.uploadRequestLayer.token,
+                    dataSize,
+                    singleSegmentSize,
+                ),
+                dataSize,
+                singleSegmentSize,
+                struct.calcsize("?"),
+                config.APP_UPLOAD_CHECKPOINT_INTERVAL,
+            )
+        else:
+            self.sink = FileSegmentSink(
+                get_staging_path(str(self.get_requestID()) + ".part"), dataSize, singleSegmentSize, struct.calcsize("?")
+            )
+        self.sink.compression = self.compression
+
+    def abort(self, errorMessage: str) -> None:
+        """Stop the upload that received invalid data, the partial upload is not kept
+
+        Args:
+            errorMessage (str): the error that sended to the client
+        """
+        logging.error("Upload {} failed: {}".format(self.get_requestID(), errorMessage))
+        self.send_error(errorMessage)
+        self.close_sink(False)
+
+    def close(self) -> None:
+        self.close_sink(True)
+
+    def close_sink(self, keepPartial: bool) -> None:
+        try:
+            if keepPartial and isinstance(self.sink, ResumableFileSegmentSink):
+                # the partial upload kept for resuming
+                self.sink.checkpoint()
+                self.sink.close()
+            elif isinstance(self.sink, FileSegmentSink):
+                # the staging file of uncomplited upload is deleted, after the commit it not exists
+                self.sink.discard()
+        except OSError:
+            logging.exception("Closing the upload {} failed".format(self.get_requestID()))
 
     @abstractmethod
-    def post_upload(self, data: bytes) -> None:
+    def post_upload(self) -> None:
         ...
 
 
 class DownloadRequestHandler(RequestHandler):
     def __init__(self, request: Pocket, clientAddress: tuple[str, int], storagePath: str):
         RequestHandler.__init__(self, request, clientAddress, storagePath)
-        self.data = b""
-        self.windowToSend: list[int] = []
-        self.windowSending: list[int] = []
+        self.source: SegmentSource = BytesSegmentSource(b"")
         self.ready = False
         self.response: Pocket = ...  # type: ignore[assignment]
-        self.pockets: list[Pocket] = []
-        self.locker = threading.Lock()
+        # the downloading stops when the session closed
+        self.closed = False
+
+    def get_memory_size(self) -> int:
+        # the files are mapped, only the generated data is in the memory
+        source = self.source.source if isinstance(self.source, CompressedSegmentSource) else self.source
+        return len(source) if isinstance(source, BytesSegmentSource) else 0
+
+    def close(self) -> None:
+        self.closed = True
+        if not self.ready:
+            self.source.close()
 
 
 # handlers
@@ -78,7 +209,7 @@ class UploadFileRequestHandler(UploadRequestHandler):
     profilerScope: ProfilerScope = ...  # type: ignore[assignment]
 
     @profiler_scope()
-    def route(self) -> tuple[Pocket, bytes | None] | None:
+    def route(self) -> tuple[Pocket, SegmentSource | None] | None:
         self.profilerScope = ProfilerScope("downloading - type Upload")
 
         # validation
@@ -94,6 +225,7 @@ class UploadFileRequestHandler(UploadRequestHandler):
             self.send_error("The path {} is not legal".format(self.request.uploadRequestLayer.path))
             return None
 
+        self.compression = get_compression(self.request, self.request.uploadRequestLayer.path)
         self.requestID = create_new_requestID()
         res = Pocket(BasicLayer(self.requestID, PocketType.Response, PocketSubType.Upload))
 
@@ -102,15 +234,40 @@ class UploadFileRequestHandler(UploadRequestHandler):
         return (res, None)
 
     @profiler_scope()
-    def post_upload(self, data: bytes) -> None:
+    def post_upload(self) -> None:
         # create the file
+        assert self.request.uploadRequestLayer
+        targetPath = self.prepare_target()
+        isFile = len(self.sink.header) == 0 or struct.unpack_from("?", self.sink.header)[0]
+
+        if isFile:
+            # move the staging file into its place
+            self.sink.commit(targetPath)
+            index_file(targetPath, config.CHUNK_SIZE, get_owner(self._storagePath))
+            logging.info('The file "{}" uploaded'.format(self.request.uploadRequestLayer.path))
+        else:
+            # save the directoy
+            if os.path.isfile(targetPath):
+                os.remove(targetPath)
+
+            self.sink.close()
+            with zipfile.ZipFile(self.sink.path, "r") as zip_archive:
+                zip_archive.extractall(targetPath)
+            self.sink.discard()
+
+            for root, dirs, files in os.walk(targetPath):
+                for file in files:
+                    index_file(os.path.join(root, file), config.CHUNK_SIZE, get_owner(self._storagePath))
+            logging.info('The directoy "{}" uploaded'.format(self.request.uploadRequestLayer.path))
+
+        self.profilerScope.close()
+
+    def prepare_target(self) -> str:
         assert self.request.uploadRequestLayer
         targetPath = self.get_path(self.request.uploadRequestLayer.path)
         directoyPath = os.path.dirname(targetPath)
 
         # delete the file / directory if already exists
-        if os.path.isfile(targetPath):
-            os.remove(targetPath)
         if os.path.isdir(targetPath):
             shutil.rmtree(targetPath)
 
@@ -119,27 +276,156 @@ class UploadFileRequestHandler(UploadRequestHandler):
         elif not os.path.isdir(directoyPath):
             os.makedirs(directoyPath, exist_ok=True)
 
-        isFile = struct.unpack_from("?", data)[0]
-        data = data[struct.calcsize("?") :]
+        return targetPath
 
-        if isFile:
-            # save the file
-            with open(targetPath, "wb") as f:
-                f.write(data)
-            logging.info('The file "{}" uploaded'.format(self.request.uploadRequestLayer.path))
-        else:
-            # save the directoy
-            zipFile = BytesIO(data)
-            with zipfile.ZipFile(zipFile, "r") as zip_archive:
-                zip_archive.extractall(targetPath)
-            logging.info('The directoy "{}" uploaded'.format(self.request.uploadRequestLayer.path))
 
+class DeltaUploadRequestHandler(UploadFileRequestHandler):
+    """Upload of delta, the file is built from the blocks of its old copy on the server"""
+
+    @profiler_scope()
+    def route(self) -> tuple[Pocket, SegmentSource | None] | None:
+        if not self.request.deltaUploadRequestLayer or not self.request.deltaUploadRequestLayer.blockSize:
+            self.send_error("This is not delta upload request")
+            return None
+
+        result = UploadFileRequestHandler.route(self)
+        if not result:
+            return None
+
+        # the basis of the delta is the signed version of the file
+        assert self.request.uploadRequestLayer
+        if not self.is_basis_valid():
+            self.send_error('The file "{}" changed on the server'.format(self.request.uploadRequestLayer.path))
+            return None
+
+        result[0].basicLayer.pocketSubType = PocketSubType.DeltaUpload
+        return result
+
+    def is_basis_valid(self) -> bool:
+        assert self.request.uploadRequestLayer and self.request.deltaUploadRequestLayer
+        targetPath = self.get_path(self.request.uploadRequestLayer.path)
+        return (
+            os.path.isfile(targetPath)
+            and os.stat(targetPath).st_mtime_ns == self.request.deltaUploadRequestLayer.basisVersion
+        )
+
+    def open_sink(self, dataSize: int, singleSegmentSize: int) -> None:
+        # the delta has no header
+        self.sink = FileSegmentSink(get_staging_path(str(self.get_requestID()) + ".delta"), dataSize, singleSegmentSize)
+        self.sink.compression = self.compression
+
+    @profiler_scope()
+    def post_upload(self) -> None:
+        self.sink.close()
+
+        assert self.request.uploadRequestLayer and self.request.deltaUploadRequestLayer
+        deltaRequestLayer = self.request.deltaUploadRequestLayer
+        targetPath = self.get_path(self.request.uploadRequestLayer.path)
+        stagingPath = get_staging_path(str(self.get_requestID()) + ".part")
+
+        try:
+            if not self.is_basis_valid():
+                raise ValueError('The file "{}" changed on the server'.format(self.request.uploadRequestLayer.path))
+
+            # build the file from the old copy and the literals
+            try:
+                basis = open(targetPath, "rb")
+            except FileNotFoundError:
+                raise ValueError('The file "{}" changed on the server'.format(self.request.uploadRequestLayer.path))
+            with open(self.sink.path, "rb") as delta, basis, open(stagingPath, "wb") as f:
+                fileHash = apply_delta(delta, basis, f, deltaRequestLayer.blockSize, os.fstat(basis.fileno()).st_size)
+                fileSize = f.tell()
+
+            if fileSize != deltaRequestLayer.fileSize or fileHash != deltaRequestLayer.fileHash:
+                raise ValueError("The file that built by the delta is not valid")
+
+            os.replace(stagingPath, targetPath)
+        finally:
+            if os.path.isfile(stagingPath):
+                os.remove(stagingPath)
+            self.sink.discard()
+
+        index_file(targetPath, config.CHUNK_SIZE, get_owner(self._storagePath))
+        logging.info('The file "{}" uploaded by delta'.format(self.request.uploadRequestLayer.path))
+        self.profilerScope.close()
+
+
+class ChunkUploadRequestHandler(UploadFileRequestHandler):
+    """Upload of chunks, the chunks that the server stores are not sended"""
+
+    @profiler_scope()
+    def route(self) -> tuple[Pocket, SegmentSource | None] | None:
+        if not self.request.chunkUploadRequestLayer or not self.request.requestLayer:
+            self.send_error("This is not chunk upload request")
+            return None
+
+        # the stored chunks are indexed by the chunk size of the server
+        chunkRequestLayer = self.request.chunkUploadRequestLayer
+        if chunkRequestLayer.chunkSize != config.CHUNK_SIZE:
+            self.send_error("The chunk size must be {}".format(config.CHUNK_SIZE))
+            return None
+
+        # the stored chunks are sended by their hash only, so the built file can be much larger then the upload
+        chunksAmount = (chunkRequestLayer.fileSize + config.CHUNK_SIZE - 1) // config.CHUNK_SIZE
+        if self.request.requestLayer.pocketFullSize > chunksAmount * CHUNK_STRUCT.size + chunkRequestLayer.fileSize:
+            self.send_error("The chunks are longer than the file")
+            return None
+        if chunkRequestLayer.fileSize > shutil.disk_usage(config.APP_STORAGE_PATH).free:
+            self.send_error("There is not enough space for the file")
+            return None
+
+        result = UploadFileRequestHandler.route(self)
+        if not result:
+            return None
+
+        result[0].basicLayer.pocketSubType = PocketSubType.ChunkUpload
+        return result
+
+    def open_sink(self, dataSize: int, singleSegmentSize: int) -> None:
+        # the chunks have no header
+        self.sink = FileSegmentSink(
+            get_staging_path(str(self.get_requestID()) + ".chunks"), dataSize, singleSegmentSize
+        )
+        self.sink.compression = self.compression
+
+    @profiler_scope()
+    def post_upload(self) -> None:
+        self.sink.close()
+
+        assert self.request.uploadRequestLayer and self.request.chunkUploadRequestLayer
+        chunkRequestLayer = self.request.chunkUploadRequestLayer
+        stagingPath = get_staging_path(str(self.get_requestID()) + ".part")
+
+        try:
+            # build the file from the sended and the stored chunks
+            with open(self.sink.path, "rb") as chunks, open(stagingPath, "wb") as f:
+                owner = get_owner(self._storagePath)
+                hashes = apply_chunk_upload(
+                    chunks,
+                    f,
+                    chunkRequestLayer.chunkSize,
+                    chunkRequestLayer.fileSize,
+                    lambda chunkHash, length: find_chunk(chunkHash, length, owner),
+                )
+
+            if hashes[0] != chunkRequestLayer.fileHash:
+                raise ValueError("The file that built by the chunks is not valid")
+
+            targetPath = self.prepare_target()
+            os.replace(stagingPath, targetPath)
+        finally:
+            if os.path.isfile(stagingPath):
+                os.remove(stagingPath)
+            self.sink.discard()
+
+        index_file(targetPath, chunkRequestLayer.chunkSize, get_owner(self._storagePath), hashes)
+        logging.info('The file "{}" uploaded by chunks'.format(self.request.uploadRequestLayer.path))
         self.profilerScope.close()
 
 
 class DownloadFileRequestHandler(DownloadRequestHandler):
     @profiler_scope()
-    def route(self) -> tuple[Pocket, bytes | None] | None:
+    def route(self) -> tuple[Pocket, SegmentSource | None] | None:
         # validation
         if not self.request.downloadRequestLayer:
             self.send_error("This is not download request")
@@ -159,35 +445,52 @@ class DownloadFileRequestHandler(DownloadRequestHandler):
             self.send_error('The file / directory "{}" dos not exists!'.format(self.request.downloadRequestLayer.path))
             return None
 
-        data = struct.pack("?", isFile)
+        header = struct.pack("?", isFile)
+        source: SegmentSource
+        downloadResponseLayer: DownloadResponseLayer
 
         if isFile:
-            # read the file
-            with open(targetPath, "rb") as f:
-                data += f.read()
+            fileSize = os.path.getsize(targetPath)
+            offset = self.request.downloadRequestLayer.offset
+            if offset > fileSize:
+                self.send_error(
+                    'The offset {} is after the end of the file "{}"'.format(
+                        offset, self.request.downloadRequestLayer.path
+                    )
+                )
+                return None
+
+            # map the requested range of the file
+            length = self.request.downloadRequestLayer.length or None
+            source = FileSegmentSource(open(targetPath, "rb"), header, offset, length)
+            downloadResponseLayer = DownloadResponseLayer(True, offset, fileSize)
         else:
-            # read the directory
-            archive = BytesIO()
+            # archive the directory into temporary file
+            archive = tempfile.TemporaryFile()
             with zipfile.ZipFile(archive, "w") as zip_archive:
                 for root, dirs, files in os.walk(targetPath):
                     for file in files:
-                        fileInfo = zipfile.ZipInfo(
-                            os.path.relpath(os.path.join(root, file), os.path.join(targetPath, self.get_path(".")))
+                        # the file is copied into the archive by blocks, not read into the memory
+                        zip_archive.write(
+                            os.path.join(root, file),
+                            os.path.relpath(os.path.join(root, file), os.path.join(targetPath, self.get_path("."))),
                         )
-                        with open(os.path.join(root, file), "rb") as f:
-                            zip_archive.writestr(fileInfo, f.read())
 
-            archive.seek(0)
-            data += archive.read()
+            archive.flush()
+            source = FileSegmentSource(archive, header)
+            # the archive is built again by every request, so its ranges are not stable
+            downloadResponseLayer = DownloadResponseLayer(False, 0, len(source) - len(header))
 
+        self.compression = get_compression(self.request, targetPath)
         self.requestID = create_new_requestID()
         res = Pocket(BasicLayer(self.requestID, PocketType.Response, PocketSubType.Download))
-        return (res, data)
+        res.downloadResponseLayer = downloadResponseLayer
+        return (res, source)
 
 
 class ListRequestHandler(DownloadRequestHandler):
     @profiler_scope()
-    def route(self) -> tuple[Pocket, bytes | None] | None:
+    def route(self) -> tuple[Pocket, SegmentSource | None] | None:
         # validation
         if not self.request.listRequestLayer:
             self.send_error("This is not list request")
@@ -205,9 +508,10 @@ class ListRequestHandler(DownloadRequestHandler):
         # load the content
         data = self.load_directory(directoryPath, "", self.request.listRequestLayer.recursive)
 
+        self.compression = get_compression(self.request, "")
         self.requestID = create_new_requestID()
         res = Pocket(BasicLayer(self.requestID, PocketType.Response, PocketSubType.List))
-        return (res, data)
+        return (res, BytesSegmentSource(data))
 
     @profiler_scope()
     def load_directory(self, directoryPath: str, parent: str, recursive: bool) -> bytes:
@@ -241,7 +545,7 @@ class ListRequestHandler(DownloadRequestHandler):
 
 class DeleteRequestHandler(DownloadRequestHandler):
     @profiler_scope()
-    def route(self) -> tuple[Pocket, bytes | None] | None:
+    def route(self) -> tuple[Pocket, SegmentSource | None] | None:
         # validation
         if not self.request.deleteRequestLayer:
             self.send_error("This is not delete request")
@@ -281,4 +585,90 @@ class DeleteRequestHandler(DownloadRequestHandler):
         self.requestID = create_new_requestID()
         res = Pocket(BasicLayer(self.requestID, PocketType.Response, PocketSubType.Delete))
         res.deleteResponseLayer = DeleteResponseLayer(isFile)
-        return (res, b"")
+        return (res, None)
+
+
+class UploadStatusRequestHandler(RequestHandler):
+    @profiler_scope()
+    def route(self) -> tuple[Pocket, SegmentSource | None] | None:
+        # validation
+        if not self.request.uploadRequestLayer or not self.request.uploadRequestLayer.token:
+            self.send_error("This is not upload status request")
+            return None
+
+        if not in_storage(self.request.uploadRequestLayer.path, self._storagePath):
+            self.send_error("The path {} is not legal".format(self.request.uploadRequestLayer.path))
+            return None
+
+        assert self.request.requestLayer
+        dataSize = self.request.requestLayer.pocketFullSize
+        # the same segments as the upload request
+        compression = get_compression(self.request, self.request.uploadRequestLayer.path)
+        singleSegmentSize = get_segment_sizes(self.request, compression)[0]
+        segmentsAmount = (dataSize + singleSegmentSize - 1) // singleSegmentSize
+
+        # the saved state of the partial upload, all the segments are missing if not exists
+        stagingPath = get_upload_staging_path(
+            self._storagePath,
+            self.request.uploadRequestLayer.path,
+            self.request.uploadRequestLayer.token,
+            dataSize,
+            singleSegmentSize,
+        )
+        state = load_segments_state(stagingPath + ".state", segmentsAmount, struct.calcsize("?"))
+        segments = state[1] if state else SegmentsBitmap(segmentsAmount)
+
+        self.requestID = create_new_requestID()
+        res = Pocket(BasicLayer(self.requestID, PocketType.Response, PocketSubType.UploadStatus))
+        res.uploadStatusResponseLayer = UploadStatusResponseLayer(
+            singleSegmentSize, segments.get_missing_ranges(config.APP_UPLOAD_STATUS_RANGES_MAX)
+        )
+        return (res, None)
+
+
+class SignatureRequestHandler(DownloadRequestHandler):
+    @profiler_scope()
+    def route(self) -> tuple[Pocket, SegmentSource | None] | None:
+        # validation
+        if not self.request.uploadRequestLayer:
+            self.send_error("This is not signature request")
+            return None
+
+        targetPath = self.get_path(self.request.uploadRequestLayer.path)
+        if not os.path.isfile(targetPath) or not in_storage(self.request.uploadRequestLayer.path, self._storagePath):
+            self.send_error('The file "{}" dos not exists!'.format(self.request.uploadRequestLayer.path))
+            return None
+
+        # the checksums of the blocks of the current file
+        with open(targetPath, "rb") as f:
+            fileStat = os.fstat(f.fileno())
+            blockSize = get_block_size(fileStat.st_size)
+            signature = create_signature(f, blockSize)
+
+        self.requestID = create_new_requestID()
+        res = Pocket(BasicLayer(self.requestID, PocketType.Response, PocketSubType.Signature))
+        res.signatureResponseLayer = SignatureResponseLayer(blockSize, fileStat.st_size, fileStat.st_mtime_ns)
+        return (res, BytesSegmentSource(signature))
+
+
+class ChunkStatusRequestHandler(RequestHandler):
+    @profiler_scope()
+    def route(self) -> tuple[Pocket, SegmentSource | None] | None:
+        # validation
+        if not self.request.chunkStatusRequestLayer:
+            self.send_error("This is not chunk status request")
+            return None
+
+        hashes = self.request.chunkStatusRequestLayer.hashes
+        if len(hashes) > config.CHUNK_STATUS_HASHES_MAX:
+            self.send_error("The chunks cannot be more then {}".format(config.CHUNK_STATUS_HASHES_MAX))
+            return None
+
+        # without the chunk store all the chunks are uploaded
+        owner = get_owner(self._storagePath)
+        stored = [config.APP_CHUNK_STORE and has_chunk(chunkHash, owner) for chunkHash in hashes]
+
+        self.requestID = create_new_requestID()
+        res = Pocket(BasicLayer(self.requestID, PocketType.Response, PocketSubType.ChunkStatus))
+        res.chunkStatusResponseLayer = ChunkStatusResponseLayer(stored)
+        return (res, None)
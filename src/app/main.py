@@ -1,12 +1,16 @@
 # entry point to Application
 
+import asyncio
 import logging
 import sys
 
-from src.app.config import init_config, init_logging
+from src.app.async_controller import async_main_loop
+from src.app.chunk_store import init_chunk_store
+from src.app.config import config, init_config, init_logging
 from src.app.controller import main_loop
 from src.app.rudp import close_socket, create_socket
 from src.app.storage import init_strorage
+from src.app.workers import run_workers
 from src.lib.profiler import profiler_scope, use_profiler
 
 
@@ -15,22 +19,36 @@ def init_app() -> None:
     init_config()
     init_logging()
     init_strorage()
+    init_chunk_store()
 
     logging.info("The app is initialized")
 
 
+def run_app() -> None:
+    if config.APP_ASYNC_MODE:
+        asyncio.run(async_main_loop())
+        return None
+
+    create_socket()
+
+    try:
+        main_loop()
+    finally:
+        close_socket()
+
+
 # entry point
 def main() -> None:
     init_app()
-    create_socket()
 
     try:
-        main_loop()
+        if config.APP_WORKERS > 1:
+            run_workers(config.APP_WORKERS, run_app)
+        else:
+            run_app()
     except KeyboardInterrupt:
         logging.info("Closed by a User!")
 
-    close_socket()
-
 
 if __name__ == "__main__":
     if "--with-profiler" in sys.argv:
@@ -1,31 +1,70 @@
 # RUDP support
 
 import logging
+import secrets
+import select
+import socket
+import struct
+import threading
 
 from src.app.config import config
 from src.lib.ftp import BasicLayer, Pocket, PocketType, ResponseLayer
-from src.lib.network import NetworkConnection, create_network_connection
+from src.lib.network import Datagram, NetworkConnection, ReceiveRing, create_network_connection
 
 # globals
 appSocket: NetworkConnection = ...  # type: ignore[assignment]
-lastRequestID = 0
+# random start, so the clients of the previous runs can not reach the new requests by their old IDs
+lastRequestID = secrets.randbits(48)
+requestIDLock = threading.Lock()
+
+# the workers processes that share the app port
+workerID = 0
+workersAmount = 1
+# socket pair per worker, the worker receives from the second socket and the others send into the first
+forwardSockets: list[tuple[socket.socket, socket.socket]] = []
+forwardRing: ReceiveRing | None = None
+
+
+def init_worker(newWorkerID: int, newForwardSockets: list[tuple[socket.socket, socket.socket]]) -> None:
+    global workerID, workersAmount, forwardSockets
+
+    workerID = newWorkerID
+    workersAmount = len(newForwardSockets)
+    forwardSockets = newForwardSockets
+
+
+def is_multi_worker() -> bool:
+    return workersAmount > 1
 
 
 def create_new_requestID() -> int:
     global lastRequestID
-    lastRequestID += 1
 
-    return lastRequestID
+    # the handlers can be created in worker threads
+    with requestIDLock:
+        lastRequestID += 1
+        # the IDs are never reused in the run, and the owner worker is encoded in them
+        return lastRequestID * workersAmount + workerID
+
+
+def get_owner(requestID: int) -> int:
+    return requestID % workersAmount
 
 
 def create_socket() -> None:
     global appSocket
 
-    appSocket = create_network_connection((config.APP_HOST, config.APP_PORT))
+    appSocket = create_network_connection((config.APP_HOST, config.APP_PORT), is_multi_worker())
 
     logging.info("The app socket initialized on " + config.APP_HOST + ":" + str(config.APP_PORT))
 
 
+def set_socket(connection: NetworkConnection) -> None:
+    global appSocket
+
+    appSocket = connection
+
+
 def close_socket() -> None:
     global appSocket
 
@@ -36,8 +75,89 @@ def sendto(pocket: Pocket, clientAddress: tuple[str, int]) -> None:
     appSocket.sendto(bytes(pocket), clientAddress)
 
 
-def recvfrom() -> tuple[bytes, tuple[str, int]]:
-    return appSocket.recvfrom()
+def sendto_many(datagrams: list[Datagram], clientAddress: tuple[str, int]) -> None:
+    appSocket.sendto_many(datagrams, clientAddress)
+
+
+def recvfrom() -> tuple[memoryview, tuple[str, int]]:
+    """Receive the next datagram of this worker
+
+    Returns:
+        tuple[memoryview, tuple[str, int]]: view of the datagram, valid until the receive buffers reused,
+            and the client address
+    """
+    if not is_multi_worker():
+        return appSocket.recvfrom_view()
+
+    forwardSocket = get_forward_socket()
+    while True:
+        if appSocket.has_data():
+            # the connection can hold datagrams that already received
+            readable = [appSocket.fileno()]
+        else:
+            readable = select.select([appSocket.fileno(), forwardSocket.fileno()], [], [], config.SOCKET_TIMEOUT)[0]
+        if len(readable) == 0:
+            raise TimeoutError("timed out")
+
+        if forwardSocket.fileno() in readable:
+            return recv_forwarded()
+
+        data, clientAddress = appSocket.recvfrom_view()
+        if dispatch(data, clientAddress):
+            return (data, clientAddress)
+
+
+def has_data() -> bool:
+    if is_multi_worker() and len(select.select([get_forward_socket()], [], [], 0)[0]) > 0:
+        return True
+    return appSocket.has_data()
+
+
+def dispatch(data: bytes | memoryview, clientAddress: tuple[str, int]) -> bool:
+    """Forward datagram to the worker that owns its request
+
+    Args:
+        data (bytes | memoryview): the datagram
+        clientAddress (tuple[str, int]): the client address
+
+    Returns:
+        bool: true if the datagram belongs to this worker
+    """
+    if not is_multi_worker() or len(data) < struct.calcsize("BBQ"):
+        return True
+
+    pocketType, _, requestID = struct.unpack_from("BBQ", data)
+    # new requests are handled by the worker that got them
+    if pocketType == PocketType.Request or get_owner(requestID) == workerID:
+        return True
+
+    host = clientAddress[0].encode()
+    try:
+        forwardSockets[get_owner(requestID)][0].send(
+            struct.pack("HB", clientAddress[1], len(host)) + host + data, socket.MSG_DONTWAIT
+        )
+    except BlockingIOError:
+        # the owner is busy, lost like any other datagram
+        pass
+    return False
+
+
+def get_forward_socket() -> socket.socket:
+    return forwardSockets[workerID][1]
+
+
+def recv_forwarded() -> tuple[memoryview, tuple[str, int]]:
+    global forwardRing
+
+    if not forwardRing:
+        forwardRing = ReceiveRing(config.SOCKET_RECEIVE_BUFFERS, config.SOCKET_MAXSIZE + 512)
+    buffer = forwardRing.next()
+    size = get_forward_socket().recv_into(buffer)
+
+    port, hostLength = struct.unpack_from("HB", buffer)
+    offset = struct.calcsize("HB")
+    host = str(buffer[offset : offset + hostLength], "utf-8")
+    return (buffer[offset + hostLength : size], (host, port))
 
 
 def send_close(clientAddress: tuple[str, int]) -> None:
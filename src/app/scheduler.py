@@ -0,0 +1,208 @@
+# transfer scheduler, sender loops that serve all the downloads by deficit round robin
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from typing import Callable
+
+from src.app.config import config
+from src.app.handlers import DownloadRequestHandler
+from src.app.rudp import send_close, sendto_many
+from src.lib.ftp import CongestionControlType, Pocket, PocketType, SegmentEncoder
+from src.lib.network import Datagram
+from src.lib.profiler import ProfilerScope
+from src.lib.rudp import Sender
+
+
+def get_congestion_control(request: Pocket) -> CongestionControlType:
+    assert request.requestLayer
+
+    # the client can choose the congestion control of its request
+    if request.requestLayer.congestionControl != CongestionControlType.Default:
+        return request.requestLayer.congestionControl
+    return config.APP_CONGESTION_CONTROL
+
+
+def append_segments(
+    batch: list[Datagram],
+    encoder: SegmentEncoder,
+    handler: DownloadRequestHandler,
+    segmentID: int,
+    amount: int,
+    singleSegmentSize: int,
+) -> None:
+    batch.append(encoder.encode(segmentID, handler.source.get_segment(segmentID, singleSegmentSize, amount)))
+
+
+def get_weight(handler: DownloadRequestHandler) -> int:
+    return config.APP_TRANSFER_WEIGHTS.get(handler.request.basicLayer.pocketSubType, 1)
+
+
+class Transfer:
+    """Single download of the scheduler"""
+
+    def __init__(self, handler: DownloadRequestHandler) -> None:
+        self.handler = handler
+        self.weight = get_weight(handler)
+        # segments that the transfer can send in the current round
+        self.deficit = 0.0
+        self.deadline = 0.0
+        self.profilerScope = ProfilerScope(
+            "downloading " + str(handler.requestID) + " type " + str(handler.request.basicLayer.pocketSubType.name)
+        )
+
+        assert handler.response.responseLayer
+        responseLayer = handler.response.responseLayer
+
+        # the segments of a poll sended together
+        self.batch: list[Datagram] = []
+        self.encoder = SegmentEncoder(handler.get_requestID())
+        self.sender = Sender(
+            responseLayer.segmentsAmount,
+            responseLayer.singleSegmentSize,
+            responseLayer.maxSegmentSize,
+            lambda segmentID, amount: append_segments(
+                self.batch, self.encoder, handler, segmentID, amount, responseLayer.singleSegmentSize
+            ),
+            get_congestion_control(handler.request),
+            lambda segmentID: handler.source.release(segmentID),
+        )
+
+    def poll(self, now: float) -> int:
+        """Send the segments of the round
+
+        Args:
+            now (float): the current time
+
+        Returns:
+            int: amount of the sended segments
+        """
+        self.deficit += config.APP_TRANSFER_QUANTUM * self.weight
+        sendedAmount = self.sender.sendedAmount
+        self.deadline = self.sender.poll(now, self.deficit)
+        sendedAmount = self.sender.sendedAmount - sendedAmount
+
+        sendto_many(self.batch, self.handler.get_client_address())
+        self.batch.clear()
+        self.encoder.reset()
+
+        if self.deadline > now:
+            # the window or the pacer limits the transfer, it not saves the unused quantum
+            self.deficit = 0
+        else:
+            self.deficit -= sendedAmount
+        return sendedAmount
+
+
+class TransferScheduler:
+    """Sender loop of many downloads, every round each download sends up to its quantum times its weight"""
+
+    def __init__(self, onFinished: Callable[[DownloadRequestHandler], None]) -> None:
+        """
+
+        Args:
+            onFinished (Callable[[DownloadRequestHandler], None]): called in the loop thread after download finished
+        """
+        self._onFinished = onFinished
+        self._transfers: dict[int, Transfer] = {}
+        # new downloads and the pockets of the downloads, the pocket of new download is None
+        self._events: queue.Queue[tuple[DownloadRequestHandler, Pocket | None]] = queue.Queue()
+        self.transfersAmount = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def add(self, handler: DownloadRequestHandler) -> None:
+        with self._lock:
+            self.transfersAmount += 1
+        self._events.put((handler, None))
+
+    def put(self, handler: DownloadRequestHandler, pocket: Pocket) -> None:
+        self._events.put((handler, pocket))
+
+    def run(self) -> None:
+        while True:
+            now = time.perf_counter()
+            deadline = now + config.SOCKET_TIMEOUT
+            for transfer in list(self._transfers.values()):
+                if transfer.handler.closed:
+                    # the session expired
+                    self._finish(transfer)
+                elif transfer.deadline <= now:
+                    transfer.poll(now)
+                deadline = min(deadline, transfer.deadline)
+
+            try:
+                handler, pocket = self._events.get(timeout=max(deadline - time.perf_counter(), 0))
+            except queue.Empty:
+                continue
+
+            self._on_event(handler, pocket)
+            while not self._events.empty():
+                self._on_event(*self._events.get_nowait())
+
+    def _on_event(self, handler: DownloadRequestHandler, pocket: Pocket | None) -> None:
+        if pocket is None:
+            self._transfers[handler.get_requestID()] = Transfer(handler)
+            return None
+
+        transfer = self._transfers.get(handler.get_requestID())
+        if not transfer:
+            return None
+
+        if pocket.basicLayer.pocketType == PocketType.DownloadComplited:
+            # complit the downloading
+            self._finish(transfer)
+        elif pocket.sackLayer:
+            transfer.sender.on_sack(pocket.sackLayer, time.perf_counter())
+            # the window can be opened
+            transfer.deadline = 0
+
+    def _finish(self, transfer: Transfer) -> None:
+        self._transfers.pop(transfer.handler.get_requestID())
+        with self._lock:
+            self.transfersAmount -= 1
+
+        send_close(transfer.handler.get_client_address())
+        transfer.handler.source.close()
+        try:
+            self._onFinished(transfer.handler)
+        except Exception:
+            logging.exception("download {} finish failed".format(transfer.handler.get_requestID()))
+        transfer.profilerScope.close()
+
+
+class TransferPool:
+    """The sender loops of the app, every download served by the loop with the least downloads"""
+
+    def __init__(self, threadsAmount: int, onFinished: Callable[[DownloadRequestHandler], None]) -> None:
+        """
+
+        Args:
+            threadsAmount (int): amount of sender loops
+            onFinished (Callable[[DownloadRequestHandler], None]): called in the loop thread after download finished
+        """
+        self._onFinished = onFinished
+        self._schedulers = [TransferScheduler(self._on_finished) for _ in range(max(threadsAmount, 1))]
+        self._owners: dict[int, TransferScheduler] = {}
+        for scheduler in self._schedulers:
+            scheduler.start()
+
+    def _on_finished(self, handler: DownloadRequestHandler) -> None:
+        self._owners.pop(handler.get_requestID(), None)
+        self._onFinished(handler)
+
+    def add(self, handler: DownloadRequestHandler) -> None:
+        scheduler = min(self._schedulers, key=lambda scheduler: scheduler.transfersAmount)
+        self._owners[handler.get_requestID()] = scheduler
+        scheduler.add(handler)
+
+    def put(self, handler: DownloadRequestHandler, pocket: Pocket) -> None:
+        scheduler = self._owners.get(handler.get_requestID())
+        if scheduler:
+            scheduler.put(handler, pocket)
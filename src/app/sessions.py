@@ -0,0 +1,115 @@
+# table of the active sessions, the abandoned sessions expire by idle and absolute timeouts
+
+import threading
+
+from src.app.config import config
+from src.app.handlers import RequestHandler
+
+
+class Session:
+    def __init__(self, handler: RequestHandler, now: float) -> None:
+        self.handler = handler
+        self.createdAt = now
+        self.lastActivity = now
+        self.memorySize = handler.get_memory_size()
+
+    def get_expiry(self) -> float:
+        return min(self.lastActivity + config.APP_SESSION_IDLE_TIMEOUT, self.createdAt + config.APP_SESSION_MAX_AGE)
+
+
+class SessionTable:
+    """The sessions by request ID, shared by the app loop and the downloading threads"""
+
+    def __init__(self) -> None:
+        self._sessions: dict[int, Session] = {}
+        self._lock = threading.Lock()
+        # memory that the sessions hold [byte]
+        self.memorySize = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, requestID: int) -> bool:
+        return requestID in self._sessions
+
+    def add(self, handler: RequestHandler, now: float) -> bool:
+        """Add session if the server has room for it
+
+        Args:
+            handler (RequestHandler): the handler of the session
+            now (float): the current time
+
+        Returns:
+            bool: false if the sessions limits reached
+        """
+        session = Session(handler, now)
+        with self._lock:
+            if len(self._sessions) >= config.APP_SESSIONS_MAX:
+                return False
+            if self.memorySize + session.memorySize > config.APP_SESSIONS_MAX_MEMORY:
+                return False
+
+            self._sessions[handler.get_requestID()] = session
+            self.memorySize += session.memorySize
+        return True
+
+    def get(self, requestID: int) -> RequestHandler | None:
+        session = self._sessions.get(requestID)
+        return session.handler if session else None
+
+    def get_expiry(self, requestID: int) -> float | None:
+        """Return the time that session expires at, if it stays idle
+
+        Args:
+            requestID (int): the request ID of the session
+
+        Returns:
+            float | None: the expiration time, None if the session not exists
+        """
+        session = self._sessions.get(requestID)
+        return session.get_expiry() if session else None
+
+    def touch(self, requestID: int, now: float) -> None:
+        """Mark activity of session
+
+        Args:
+            requestID (int): the request ID of the session
+            now (float): the current time
+        """
+        session = self._sessions.get(requestID)
+        if session:
+            session.lastActivity = now
+
+    def remove(self, requestID: int) -> RequestHandler | None:
+        """Remove session
+
+        Args:
+            requestID (int): the request ID of the session
+
+        Returns:
+            RequestHandler | None: the handler of the session if it exists
+        """
+        with self._lock:
+            session = self._sessions.pop(requestID, None)
+            if not session:
+                return None
+            self.memorySize -= session.memorySize
+        return session.handler
+
+    def expire(self, requestID: int, now: float) -> RequestHandler | None:
+        """Remove session if it idle or alive for too long, the caller closes it
+
+        Args:
+            requestID (int): the request ID of the session
+            now (float): the current time
+
+        Returns:
+            RequestHandler | None: the handler of the session if it expired
+        """
+        with self._lock:
+            session = self._sessions.get(requestID)
+            if not session or now <= session.get_expiry():
+                return None
+            del self._sessions[requestID]
+            self.memorySize -= session.memorySize
+        return session.handler
@@ -1,7 +1,9 @@
 # storage and database
 
+import logging
 import os
 import os.path
+import time
 
 import jsbeautifier  # type: ignore
 from pydantic import BaseModel
@@ -28,6 +30,10 @@ def init_strorage() -> None:
     if not os.path.isdir(config.APP_STORAGE_PATH + config.STORAGE_PRIVATE):
         os.mkdir(config.APP_STORAGE_PATH + config.STORAGE_PRIVATE)
 
+    if not os.path.isdir(config.APP_STORAGE_PATH + config.STORAGE_STAGING):
+        os.mkdir(config.APP_STORAGE_PATH + config.STORAGE_STAGING)
+    clean_staging()
+
     if not os.path.isfile(config.APP_STORAGE_PATH + config.STORAGE_DATA):
         storageData = StorageData()
         with open(config.APP_STORAGE_PATH + config.STORAGE_DATA, "a") as f:
@@ -40,6 +46,19 @@ def get_path(path: str, storagePath: str) -> str:
     return os.path.abspath(os.path.join(storagePath, path))
 
 
+def get_staging_path(name: str) -> str:
+    return config.APP_STORAGE_PATH + config.STORAGE_STAGING + "/" + name
+
+
+def clean_staging() -> None:
+    # the partial uploads that not resumed for too long
+    for name in os.listdir(config.APP_STORAGE_PATH + config.STORAGE_STAGING):
+        path = get_staging_path(name)
+        if time.time() - os.path.getmtime(path) > config.APP_UPLOAD_RESUME_MAX_AGE:
+            logging.info('The staging file "{}" expired'.format(name))
+            os.remove(path)
+
+
 def in_storage(path: str, storagePath: str) -> bool:
     return os.path.commonpath(
         [os.path.abspath(get_path(path, storagePath)), os.path.abspath(storagePath)]
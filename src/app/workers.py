@@ -0,0 +1,54 @@
+# multi-process app, the workers share the app port and forward the pockets of the requests of each other
+
+import logging
+import multiprocessing
+import signal
+import socket
+import sys
+from typing import Callable
+
+from src.app.rudp import init_worker
+
+
+def run_worker(
+    workerID: int, forwardSockets: list[tuple[socket.socket, socket.socket]], target: Callable[[], None]
+) -> None:
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    init_worker(workerID, forwardSockets)
+    logging.info("The worker {} started".format(workerID))
+
+    try:
+        target()
+    except KeyboardInterrupt:
+        pass
+
+
+def run_workers(workersAmount: int, target: Callable[[], None]) -> None:
+    """Run the target in workers processes until all of them exit
+
+    Args:
+        workersAmount (int): amount of the workers
+        target (Callable[[], None]): the main loop of a worker
+    """
+    # stop the workers when the app terminated
+    signal.signal(signal.SIGTERM, lambda signalNumber, frame: sys.exit(0))
+
+    forwardSockets = [socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM) for _ in range(workersAmount)]
+
+    # the workers inherit the forward sockets
+    context = multiprocessing.get_context("fork")
+    workers = [
+        context.Process(target=run_worker, args=(workerID, forwardSockets, target), name="worker-" + str(workerID))
+        for workerID in range(workersAmount)
+    ]
+
+    for worker in workers:
+        worker.start()
+
+    try:
+        for worker in workers:
+            worker.join()
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
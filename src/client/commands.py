@@ -1,21 +1,30 @@
 # commands
 
+import hashlib
 import logging
+import multiprocessing
 import os
 import os.path
 import shutil
 import struct
 import time
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
 
 from prettytable import PrettyTable
 
 from src.client.options import Options
 from src.client.rudp import download_data, upload_data
+from src.lib.chunks import create_chunk_upload, get_chunk_hashes
+from src.lib.config import config
+from src.lib.delta import create_delta, get_strong_hash
 from src.lib.ftp import (
     BasicLayer,
+    ChunkStatusRequestLayer,
+    ChunkUploadRequestLayer,
     DeleteRequestLayer,
+    DeltaUploadRequestLayer,
     DownloadRequestLayer,
     ListRequestLayer,
     Pocket,
@@ -23,17 +32,24 @@ from src.lib.ftp import (
     PocketType,
     RequestLayer,
     UploadRequestLayer,
+    UploadStatusResponseLayer,
     unpack_block_type,
     unpack_directory_block,
     unpack_file_block,
 )
-from src.lib.network import NetworkConnection
-
-# config
-MAX_SEGMENT_SIZE = 1000  # [byte]
-
-
-def upload_command(networkConnection: NetworkConnection, options: Options, targetName: str, destination: str) -> None:
+from src.lib.network import NetworkConnection, create_network_connection
+from src.lib.segments import BytesSegmentSink, FileRangeSegmentSink, FileSegmentSink
+
+
+def upload_command(
+    networkConnection: NetworkConnection,
+    options: Options,
+    targetName: str,
+    destination: str,
+    resume: bool = False,
+    delta: bool = False,
+    dedup: bool = False,
+) -> None:
     # load the file info
     isFile = True
     if not os.path.isfile(targetName):
@@ -46,6 +62,16 @@ def upload_command(networkConnection: NetworkConnection, options: Options, targe
     if isFile:
         with open(targetName, "rb") as f:
             body = f.read()
+
+        # the changes of the file that exists on the server
+        if delta and delta_upload_command(networkConnection, options, destination, body):
+            print('The file "{}" upload as "{}" to the app.'.format(targetName, destination))
+            return None
+
+        # the chunks that the server already stores
+        if dedup and chunk_upload_command(networkConnection, options, destination, body):
+            print('The file "{}" upload as "{}" to the app.'.format(targetName, destination))
+            return None
     else:
         archive = BytesIO()
         with zipfile.ZipFile(archive, "w") as zip_archive:
@@ -61,12 +87,25 @@ def upload_command(networkConnection: NetworkConnection, options: Options, targe
     body = struct.pack("?", isFile) + body
 
     bodySize = len(body)
+    # the server keeps the partial upload of the same content, so an interrupted upload can be resumed
+    token = hashlib.blake2b(body, digest_size=16).hexdigest()
+
+    uploadStatus: UploadStatusResponseLayer | None = None
+    if resume:
+        uploadStatus = upload_status_command(networkConnection, options, destination, token, bodySize)
+
     # create request pocket
     reqPocket = Pocket(BasicLayer(0, PocketType.Request, PocketSubType.Upload))
     reqPocket.requestLayer = RequestLayer(
-        bodySize, MAX_SEGMENT_SIZE, options.anonymous, options.userName, options.password
+        bodySize,
+        options.maxSegmentSize,
+        options.anonymous,
+        options.userName,
+        options.password,
+        options.congestionControl,
+        options.compression,
     )
-    reqPocket.uploadRequestLayer = UploadRequestLayer(destination)
+    reqPocket.uploadRequestLayer = UploadRequestLayer(destination, token)
 
     # send request
     logging.debug("send req pocket: " + str(reqPocket))
@@ -99,8 +138,15 @@ def upload_command(networkConnection: NetworkConnection, options: Options, targe
         print("Error: " + resPocket.responseLayer.errorMessage)
         return None
 
+    missingRanges: list[tuple[int, int]] | None = None
+    if uploadStatus and uploadStatus.singleSegmentSize == resPocket.responseLayer.singleSegmentSize:
+        missingRanges = uploadStatus.missingRanges
+
     # send the file / directory
-    upload_data(networkConnection, options, resPocket, body)
+    errorMessage = upload_data(networkConnection, options, resPocket, body, missingRanges)
+    if errorMessage is not None:
+        print("Error: " + errorMessage)
+        return None
 
     # print ending
     if isFile:
@@ -109,7 +155,230 @@ def upload_command(networkConnection: NetworkConnection, options: Options, targe
         print('The directory "{}" upload as "{}" to the app.'.format(targetName, destination))
 
 
-def download_command(networkConnection: NetworkConnection, options: Options, targetName: str, destination: str) -> None:
+def delta_upload_command(networkConnection: NetworkConnection, options: Options, destination: str, body: bytes) -> bool:
+    # ask the signature of the file on the server
+    reqPocket = Pocket(BasicLayer(0, PocketType.Request, PocketSubType.Signature))
+    reqPocket.requestLayer = RequestLayer(
+        0,
+        options.maxSegmentSize,
+        options.anonymous,
+        options.userName,
+        options.password,
+        options.congestionControl,
+        options.compression,
+    )
+    reqPocket.uploadRequestLayer = UploadRequestLayer(destination)
+
+    logging.debug("send req pocket: " + str(reqPocket))
+
+    networkConnection.sendto(bytes(reqPocket), options.appAddress)
+
+    # recive signature response
+    try:
+        data = networkConnection.recvfrom()[0]
+    except OSError:
+        return False
+
+    resPocket = Pocket.from_bytes(data)
+
+    logging.debug("get res pocket: " + str(resPocket))
+
+    if not resPocket.responseLayer or not resPocket.responseLayer.ok or not resPocket.signatureResponseLayer:
+        # the file not exists on the server, upload all of it
+        return False
+
+    signatureLayer = resPocket.signatureResponseLayer
+    signature = b""
+    if resPocket.responseLayer.dataSize > 0:
+        sink = BytesSegmentSink(resPocket.responseLayer.dataSize, resPocket.responseLayer.singleSegmentSize)
+        download_data(networkConnection, options, resPocket, sink)
+        signature = bytes(sink.data)
+
+    deltaBody = create_delta(body, signature, signatureLayer.blockSize, signatureLayer.fileSize)
+    if len(deltaBody) >= len(body):
+        return False
+
+    # send the delta
+    reqPocket = Pocket(BasicLayer(0, PocketType.Request, PocketSubType.DeltaUpload))
+    reqPocket.requestLayer = RequestLayer(
+        len(deltaBody),
+        options.maxSegmentSize,
+        options.anonymous,
+        options.userName,
+        options.password,
+        options.congestionControl,
+        options.compression,
+    )
+    reqPocket.uploadRequestLayer = UploadRequestLayer(destination)
+    reqPocket.deltaUploadRequestLayer = DeltaUploadRequestLayer(
+        signatureLayer.blockSize, signatureLayer.version, len(body), get_strong_hash(body)
+    )
+
+    logging.debug("send req pocket: " + str(reqPocket))
+
+    networkConnection.sendto(bytes(reqPocket), options.appAddress)
+
+    # recive response
+    try:
+        data = networkConnection.recvfrom()[0]
+    except OSError:
+        return False
+
+    resPocket = Pocket.from_bytes(data)
+
+    logging.debug("get res pocket: " + str(resPocket))
+
+    if not resPocket.responseLayer or not resPocket.responseLayer.ok:
+        # the file changed meanwhile
+        return False
+
+    print("Uploading {} bytes of delta instead of {} bytes".format(len(deltaBody), len(body)))
+    errorMessage = upload_data(networkConnection, options, resPocket, deltaBody)
+    if errorMessage is not None:
+        print("Error: {}, uploading the whole file".format(errorMessage))
+        return False
+    return True
+
+
+def chunk_upload_command(networkConnection: NetworkConnection, options: Options, destination: str, body: bytes) -> bool:
+    if not body:
+        return False
+
+    # ask which chunks the server stores
+    hashes = get_chunk_hashes(body, config.CHUNK_SIZE)
+    stored: list[bool] = []
+    for start in range(0, len(hashes), config.CHUNK_STATUS_HASHES_MAX):
+        chunksStatus = chunk_status_command(
+            networkConnection, options, hashes[start : start + config.CHUNK_STATUS_HASHES_MAX]
+        )
+        if chunksStatus is None:
+            return False
+        stored += chunksStatus
+
+    if not any(stored):
+        return False
+
+    # send the chunks that not stored
+    chunksBody = create_chunk_upload(body, config.CHUNK_SIZE, hashes, stored)
+    reqPocket = Pocket(BasicLayer(0, PocketType.Request, PocketSubType.ChunkUpload))
+    reqPocket.requestLayer = RequestLayer(
+        len(chunksBody),
+        options.maxSegmentSize,
+        options.anonymous,
+        options.userName,
+        options.password,
+        options.congestionControl,
+        options.compression,
+    )
+    reqPocket.uploadRequestLayer = UploadRequestLayer(destination)
+    reqPocket.chunkUploadRequestLayer = ChunkUploadRequestLayer(config.CHUNK_SIZE, len(body), get_strong_hash(body))
+
+    logging.debug("send req pocket: " + str(reqPocket))
+
+    networkConnection.sendto(bytes(reqPocket), options.appAddress)
+
+    # recive response
+    try:
+        data = networkConnection.recvfrom()[0]
+    except OSError:
+        return False
+
+    resPocket = Pocket.from_bytes(data)
+
+    logging.debug("get res pocket: " + str(resPocket))
+
+    if not resPocket.responseLayer or not resPocket.responseLayer.ok:
+        return False
+
+    print(
+        "Uploading {} of {} chunks, {} bytes instead of {} bytes".format(
+            stored.count(False), len(stored), len(chunksBody), len(body)
+        )
+    )
+    errorMessage = upload_data(networkConnection, options, resPocket, chunksBody)
+    if errorMessage is not None:
+        print("Error: {}, uploading the whole file".format(errorMessage))
+        return False
+    return True
+
+
+def chunk_status_command(
+    networkConnection: NetworkConnection, options: Options, hashes: list[bytes]
+) -> list[bool] | None:
+    reqPocket = Pocket(BasicLayer(0, PocketType.Request, PocketSubType.ChunkStatus))
+    reqPocket.requestLayer = RequestLayer(
+        0,
+        options.maxSegmentSize,
+        options.anonymous,
+        options.userName,
+        options.password,
+        options.congestionControl,
+        options.compression,
+    )
+    reqPocket.chunkStatusRequestLayer = ChunkStatusRequestLayer(hashes)
+
+    logging.debug("send req pocket: " + str(reqPocket))
+
+    networkConnection.sendto(bytes(reqPocket), options.appAddress)
+
+    # recive chunk status response
+    try:
+        data = networkConnection.recvfrom()[0]
+    except OSError:
+        return None
+
+    resPocket = Pocket.from_bytes(data)
+
+    logging.debug("get res pocket: " + str(resPocket))
+
+    if not resPocket.responseLayer or not resPocket.responseLayer.ok or not resPocket.chunkStatusResponseLayer:
+        return None
+    if len(resPocket.chunkStatusResponseLayer.stored) != len(hashes):
+        return None
+    return resPocket.chunkStatusResponseLayer.stored
+
+
+def upload_status_command(
+    networkConnection: NetworkConnection, options: Options, destination: str, token: str, bodySize: int
+) -> UploadStatusResponseLayer | None:
+    # ask the segments that missing in the partial upload
+    reqPocket = Pocket(BasicLayer(0, PocketType.Request, PocketSubType.UploadStatus))
+    reqPocket.requestLayer = RequestLayer(
+        bodySize,
+        options.maxSegmentSize,
+        options.anonymous,
+        options.userName,
+        options.password,
+        options.congestionControl,
+        options.compression,
+    )
+    reqPocket.uploadRequestLayer = UploadRequestLayer(destination, token)
+
+    logging.debug("send req pocket: " + str(reqPocket))
+
+    networkConnection.sendto(bytes(reqPocket), options.appAddress)
+
+    # recive upload status response
+    try:
+        data = networkConnection.recvfrom()[0]
+    except OSError:
+        return None
+
+    resPocket = Pocket.from_bytes(data)
+
+    logging.debug("get res pocket: " + str(resPocket))
+
+    if not resPocket.responseLayer or not resPocket.responseLayer.ok or not resPocket.uploadStatusResponseLayer:
+        # upload all the segments
+        return None
+
+    uploadStatus = resPocket.uploadStatusResponseLayer
+    missingSize = sum(end - start for start, end in uploadStatus.missingRanges) * uploadStatus.singleSegmentSize
+    print("Resuming the upload, {} of {} bytes are missing".format(min(missingSize, bodySize), bodySize))
+    return uploadStatus
+
+
+def prepare_destination(destination: str) -> None:
     # check if the directory of destination exists
     if os.path.isfile(destination):
         os.remove(destination)
@@ -119,10 +388,22 @@ def download_command(networkConnection: NetworkConnection, options: Options, tar
     if not os.path.isdir(os.path.dirname(destination)):
         os.mkdir(os.path.dirname(destination))
 
+
+def send_download_request(
+    networkConnection: NetworkConnection, options: Options, targetName: str, offset: int, length: int
+) -> Pocket | None:
     # send download request
     reqPocket = Pocket(BasicLayer(0, PocketType.Request, PocketSubType.Download))
-    reqPocket.requestLayer = RequestLayer(0, MAX_SEGMENT_SIZE, options.anonymous, options.userName, options.password)
-    reqPocket.downloadRequestLayer = DownloadRequestLayer(targetName)
+    reqPocket.requestLayer = RequestLayer(
+        0,
+        options.maxSegmentSize,
+        options.anonymous,
+        options.userName,
+        options.password,
+        options.congestionControl,
+        options.compression,
+    )
+    reqPocket.downloadRequestLayer = DownloadRequestLayer(targetName, offset, length)
 
     logging.debug("send req pocket: " + str(reqPocket))
 
@@ -143,30 +424,222 @@ def download_command(networkConnection: NetworkConnection, options: Options, tar
         print("Error: " + resPocket.responseLayer.errorMessage)
         return None
 
-    data = download_data(networkConnection, options, resPocket)
+    return resPocket
+
+
+def download_command(
+    networkConnection: NetworkConnection,
+    options: Options,
+    targetName: str,
+    destination: str,
+    offset: int = 0,
+    length: int = 0,
+    resume: bool = False,
+) -> None:
+    prepare_destination(destination)
+
+    # the prefix of interrupted download
+    partialPath = destination + ".partial"
+    partialSize = 0
+    if resume and os.path.isfile(partialPath):
+        partialSize = os.path.getsize(partialPath)
+    elif os.path.isfile(partialPath):
+        os.remove(partialPath)
+
+    if length > 0 and partialSize >= length:
+        # the range already downloaded
+        os.replace(partialPath, destination)
+        print('The file "{}" downloaded to "{}".'.format(targetName, destination))
+        return None
+
+    resPocket = send_download_request(
+        networkConnection, options, targetName, offset + partialSize, length - partialSize if length > 0 else 0
+    )
+    if not resPocket:
+        return None
 
-    isFile = struct.unpack_from("?", data)[0]
-    data = data[struct.calcsize("?") :]
+    # the server sends other range if it not serves ranges of the target
+    if (
+        partialSize > 0
+        and resPocket.downloadResponseLayer
+        and resPocket.downloadResponseLayer.ranged
+        and resPocket.downloadResponseLayer.offset == offset + partialSize
+    ):
+        # continue the partial file
+        os.replace(partialPath, destination + ".part")
+    else:
+        partialSize = 0
+        if os.path.isfile(partialPath):
+            os.remove(partialPath)
+
+    save_download(networkConnection, options, resPocket, targetName, destination, partialSize)
+
+
+def save_download(
+    networkConnection: NetworkConnection,
+    options: Options,
+    resPocket: Pocket,
+    targetName: str,
+    destination: str,
+    partialSize: int = 0,
+) -> None:
+    assert resPocket.responseLayer
+    ranged = resPocket.downloadResponseLayer is not None and resPocket.downloadResponseLayer.ranged
+
+    sink = FileSegmentSink(
+        destination + ".part",
+        resPocket.responseLayer.dataSize,
+        resPocket.responseLayer.singleSegmentSize,
+        struct.calcsize("?"),
+        partialSize,
+    )
+    try:
+        download_data(networkConnection, options, resPocket, sink)
+    except BaseException:
+        if ranged:
+            # keep the received prefix for --resume
+            sink.suspend(destination + ".partial")
+        else:
+            sink.discard()
+        raise
+
+    isFile = struct.unpack_from("?", sink.header)[0]
 
     if isFile:
-        # create the file
-        with open(destination, "ab") as f:
-            f.write(data)
+        # move the file into its place
+        sink.commit(destination)
 
         logging.info('The file "{}" downloaded to "{}".'.format(targetName, destination))
     else:
         # create the directory
-        zipFile = BytesIO(data)
-        with zipfile.ZipFile(zipFile, "r") as zip_archive:
+        sink.close()
+        with zipfile.ZipFile(sink.path, "r") as zip_archive:
             zip_archive.extractall(destination)
+        sink.discard()
 
         logging.info('The directory "{}" downloaded to "{}".'.format(targetName, destination))
 
 
+def download_streams_command(
+    networkConnection: NetworkConnection, options: Options, targetName: str, destination: str, streamsAmount: int
+) -> None:
+    prepare_destination(destination)
+
+    # the first byte tells the size of the file
+    resPocket = send_download_request(networkConnection, options, targetName, 0, 1)
+    if not resPocket:
+        return None
+
+    assert resPocket.responseLayer
+    if not resPocket.downloadResponseLayer or not resPocket.downloadResponseLayer.ranged:
+        # the archive of directory is sended whole by single session
+        save_download(networkConnection, options, resPocket, targetName, destination)
+        return None
+
+    fileSize = resPocket.downloadResponseLayer.fileSize
+    partPath = destination + ".part"
+
+    # the streams write their ranges into the preallocated file
+    with open(partPath, "wb") as f:
+        f.truncate(fileSize)
+
+    try:
+        sink = FileRangeSegmentSink(
+            partPath,
+            0,
+            resPocket.responseLayer.dataSize,
+            resPocket.responseLayer.singleSegmentSize,
+            struct.calcsize("?"),
+        )
+        download_data(networkConnection, options, resPocket, sink)
+        sink.close()
+
+        rangeSize = (fileSize - 1 + streamsAmount - 1) // streamsAmount
+        ranges = [(offset, min(rangeSize, fileSize - offset)) for offset in range(1, fileSize, max(rangeSize, 1))]
+
+        # every stream is a session of its own process and client port, the port is assigned by the OS
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(len(ranges) or 1, mp_context=context) as executor:
+            futures = [
+                executor.submit(
+                    download_stream,
+                    options,
+                    (options.clientAddress[0], 0),
+                    targetName,
+                    partPath,
+                    offset,
+                    length,
+                    fileSize,
+                )
+                for offset, length in ranges
+            ]
+            complited = all(future.result() for future in futures)
+    except BaseException:
+        os.remove(partPath)
+        raise
+
+    if not complited:
+        os.remove(partPath)
+        print("Error: faild to download the file")
+        return None
+
+    # move the file into its place
+    os.replace(partPath, destination)
+    logging.info('The file "{}" downloaded to "{}" by {} streams.'.format(targetName, destination, len(ranges)))
+
+
+def download_stream(
+    options: Options,
+    clientAddress: tuple[str, int],
+    targetName: str,
+    partPath: str,
+    offset: int,
+    length: int,
+    fileSize: int,
+) -> bool:
+    networkConnection = create_network_connection(clientAddress)
+    try:
+        resPocket = send_download_request(networkConnection, options, targetName, offset, length)
+        if not resPocket:
+            return False
+
+        assert resPocket.responseLayer
+        if (
+            not resPocket.downloadResponseLayer
+            or resPocket.downloadResponseLayer.offset != offset
+            or resPocket.downloadResponseLayer.fileSize != fileSize
+        ):
+            # the file changed meanwhile
+            return False
+
+        sink = FileRangeSegmentSink(
+            partPath,
+            offset,
+            resPocket.responseLayer.dataSize,
+            resPocket.responseLayer.singleSegmentSize,
+            struct.calcsize("?"),
+        )
+        try:
+            download_data(networkConnection, options, resPocket, sink)
+        finally:
+            sink.close()
+        return True
+    finally:
+        networkConnection.close()
+
+
 def delete_command(networkConnection: NetworkConnection, options: Options, targetName: str) -> None:
     # send the delete request
     reqPocket = Pocket(BasicLayer(0, PocketType.Request, PocketSubType.Delete))
-    reqPocket.requestLayer = RequestLayer(0, MAX_SEGMENT_SIZE, options.anonymous, options.userName, options.password)
+    reqPocket.requestLayer = RequestLayer(
+        0,
+        options.maxSegmentSize,
+        options.anonymous,
+        options.userName,
+        options.password,
+        options.congestionControl,
+        options.compression,
+    )
     reqPocket.deleteRequestLayer = DeleteRequestLayer(targetName)
 
     logging.debug("send req pocket: " + str(reqPocket))
@@ -201,7 +674,15 @@ def delete_command(networkConnection: NetworkConnection, options: Options, targe
 def list_command(networkConnection: NetworkConnection, options: Options, directoryPath: str, recursive: bool) -> None:
     # send list request
     reqPocket = Pocket(BasicLayer(0, PocketType.Request, PocketSubType.List))
-    reqPocket.requestLayer = RequestLayer(0, MAX_SEGMENT_SIZE, options.anonymous, options.userName, options.password)
+    reqPocket.requestLayer = RequestLayer(
+        0,
+        options.maxSegmentSize,
+        options.anonymous,
+        options.userName,
+        options.password,
+        options.congestionControl,
+        options.compression,
+    )
     reqPocket.listRequestLayer = ListRequestLayer(directoryPath, recursive)
 
     logging.debug("send req pocket: " + str(reqPocket))
@@ -227,10 +708,11 @@ def list_command(networkConnection: NetworkConnection, options: Options, directo
         print_directory_content(b"")
         return None
 
-    data = download_data(networkConnection, options, resPocket)
+    sink = BytesSegmentSink(resPocket.responseLayer.dataSize, resPocket.responseLayer.singleSegmentSize)
+    download_data(networkConnection, options, resPocket, sink)
 
     # print the directory content
-    print_directory_content(data)
+    print_directory_content(bytes(sink.data))
 
 
 def print_directory_content(data: bytes) -> None:
@@ -3,11 +3,14 @@
 import logging
 import os
 import os.path
+import signal
 import sys
 
-from src.client.commands import delete_command, download_command, list_command, upload_command
+from src.client.commands import delete_command, download_command, download_streams_command, list_command, upload_command
 from src.client.options import Options
+from src.lib.compression import parse_compression
 from src.lib.config import config, init_logging
+from src.lib.congestion import parse_congestion_control
 from src.lib.network import create_network_connection
 
 
@@ -23,7 +26,15 @@ def print_help() -> None:
     print('client is CLI client for custom app like "FTP" based on UDP.')
     print("  client --help                                                      - print the help content")
     print("  client [options] upload [--dest <destination>] <file / directory>  - upload file or directory")
+    print("      [--resume]                                                       - continue interrupted upload")
+    print("      [--delta]                                                        - send only the changes of the file")
+    print(
+        "      [--dedup]                                                        - send only the chunks that not stored"
+    )
     print("  client [options] download <remote file / directory> [destination]  - download file or directory")
+    print("      [--offset <byte>] [--length <bytes>]                             - download only range of the file")
+    print("      [--resume]                                                       - continue interrupted download")
+    print("      [--streams <amount>]                                             - download file by parallel sessions")
     print("  client [options] list [remote directory] [--recursive]             - print directory content")
     print("  client [options] delete <remote file / directory>                  - delete file or directory")
     print("Options:")
@@ -33,6 +44,9 @@ def print_help() -> None:
     print("--port <port> - set the server port, defualt: 8000")
     print("--client-host <host> - set the client host address, defualt: localhost")
     print("--client-port <port> - set the client port, defualt: 8001")
+    print("--segment-size <size> - set the max size in bytes of segments in a single pocket, defualt: 60000")
+    print("--congestion-control <cubic / newreno / bbr> - set the congestion control of the senders, defualt: cubic")
+    print("--compression <none / zlib / lzma> - set the compression of the transfers, defualt: zlib")
 
 
 def main() -> None:
@@ -90,6 +104,35 @@ def main() -> None:
             else:
                 options.clientAddress = (options.clientAddress[0], int(sys.argv[i + 1]))
             i += 2
+        elif sys.argv[i] == "--segment-size":
+            if i + 1 == len(sys.argv):
+                print("Segment size is missing")
+                return None
+            else:
+                options.maxSegmentSize = int(sys.argv[i + 1])
+            i += 2
+        elif sys.argv[i] == "--congestion-control":
+            if i + 1 == len(sys.argv):
+                print("Congestion control is missing")
+                return None
+            else:
+                try:
+                    options.congestionControl = parse_congestion_control(sys.argv[i + 1])
+                except ValueError as e:
+                    print(e)
+                    return None
+            i += 2
+        elif sys.argv[i] == "--compression":
+            if i + 1 == len(sys.argv):
+                print("Compression is missing")
+                return None
+            else:
+                try:
+                    options.compression = parse_compression(sys.argv[i + 1])
+                except ValueError as e:
+                    print(e)
+                    return None
+            i += 2
         else:
             print("The option {} dose not exists!".format(sys.argv[i]))
             return None
@@ -105,6 +148,9 @@ def main() -> None:
     if sys.argv[i] == "upload":
         targetPath = None
         destination = None
+        resume = False
+        delta = False
+        dedup = False
 
         i += 1
         while i < len(sys.argv):
@@ -114,6 +160,12 @@ def main() -> None:
                     return None
                 destination = sys.argv[i + 1]
                 i += 1
+            elif sys.argv[i] == "--resume":
+                resume = True
+            elif sys.argv[i] == "--delta":
+                delta = True
+            elif sys.argv[i] == "--dedup":
+                dedup = True
             else:
                 targetPath = sys.argv[i]
             i += 1
@@ -128,23 +180,57 @@ def main() -> None:
         networkConnection = create_network_connection(options.clientAddress)
         print("The client socket initialized on " + options.clientAddress[0] + ":" + str(options.clientAddress[1]))
 
-        upload_command(networkConnection, options, targetPath, destination)
+        upload_command(networkConnection, options, targetPath, destination, resume, delta, dedup)
         networkConnection.close()
     elif sys.argv[i] == "download":
-        if len(sys.argv) == i + 1:
+        paths: list[str] = []
+        offset = 0
+        length = 0
+        resume = False
+        streamsAmount = 1
+
+        i += 1
+        while i < len(sys.argv):
+            if sys.argv[i] in ["--offset", "--length", "--streams"]:
+                if i == len(sys.argv) - 1:
+                    print("The option {} need number as paramter".format(sys.argv[i]))
+                    return None
+                if sys.argv[i] == "--offset":
+                    offset = int(sys.argv[i + 1])
+                elif sys.argv[i] == "--length":
+                    length = int(sys.argv[i + 1])
+                else:
+                    streamsAmount = max(int(sys.argv[i + 1]), 1)
+                i += 1
+            elif sys.argv[i] == "--resume":
+                resume = True
+            else:
+                paths.append(sys.argv[i])
+            i += 1
+
+        if len(paths) == 0:
             print("File / directory path and destination path are Missing!")
             return None
-        if len(sys.argv) == i + 2:
+        if len(paths) == 1:
             print("Destination path are Missing!")
             return None
 
-        targetPath = sys.argv[i + 1]
-        destination = sys.argv[i + 2]
+        if streamsAmount > 1 and (offset > 0 or length > 0 or resume):
+            print("The option --streams can not be used with --offset, --length or --resume")
+            return None
+
+        targetPath = paths[0]
+        destination = paths[1]
 
         networkConnection = create_network_connection(options.clientAddress)
         print("The client socket initialized on " + options.clientAddress[0] + ":" + str(options.clientAddress[1]))
 
-        download_command(networkConnection, options, targetPath, destination)
+        # the terminated download keeps its received prefix
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        if streamsAmount > 1:
+            download_streams_command(networkConnection, options, targetPath, destination, streamsAmount)
+        else:
+            download_command(networkConnection, options, targetPath, destination, offset, length, resume)
         networkConnection.close()
 
     elif sys.argv[i] == "list":
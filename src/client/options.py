@@ -1,5 +1,7 @@
 # options class
 
+from src.lib.ftp import CompressionType, CongestionControlType
+
 
 class Options:
     def __init__(self) -> None:
@@ -8,3 +10,6 @@ class Options:
         self.anonymous = True
         self.userName = ""
         self.password = ""
+        self.maxSegmentSize = 60000  # [byte]
+        self.congestionControl = CongestionControlType.Default
+        self.compression = CompressionType.Default
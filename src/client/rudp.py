@@ -5,93 +5,107 @@ import time
 
 from src.client.options import Options
 from src.lib.config import config
-from src.lib.ftp import AKCLayer, BasicLayer, Pocket, PocketType, SegmentLayer
-from src.lib.network import NetworkConnection
-
-
-def upload_data(networkConnection: NetworkConnection, options: Options, resPocket: Pocket, body: bytes) -> None:
-    bodySize = len(body)
-
+from src.lib.ftp import AKCLayer, BasicLayer, CompressionType, Pocket, PocketType, PocketView, SACKLayer, SegmentEncoder
+from src.lib.network import Datagram, NetworkConnection
+from src.lib.rudp import Sender
+from src.lib.segments import BytesSegmentSource, CompressedSegmentSource, SegmentSink, SegmentSource
+
+
+def upload_data(
+    networkConnection: NetworkConnection,
+    options: Options,
+    resPocket: Pocket,
+    body: bytes,
+    missingRanges: list[tuple[int, int]] | None = None,
+) -> str | None:
     requestID = resPocket.basicLayer.requestID
 
     assert resPocket.responseLayer
     singleSegmentSize = resPocket.responseLayer.singleSegmentSize
-    segmentsAmount = resPocket.responseLayer.segmentsAmount
-
-    windowToSend = list(range(segmentsAmount))
-    windowSending: list[int] = []
-
-    rtt = config.SOCKET_TIMEOUT
-    cwnd = cwndMax = config.CWND_START_VALUE
-    C, B = 0.4, 0.7
-
-    last = time.time()
 
+    # the segments of a poll sended together
+    batch: list[Datagram] = []
+    encoder = SegmentEncoder(requestID)
+    source: SegmentSource = BytesSegmentSource(body)
+    if resPocket.responseLayer.compression != CompressionType.Nothing:
+        # the chunks are compressed on the worker threads, ahead of the sender
+        source = CompressedSegmentSource(source, resPocket.responseLayer.compression, singleSegmentSize)
+
+    def send_segments(segmentID: int, amount: int) -> None:
+        batch.append(encoder.encode(segmentID, source.get_segment(segmentID, singleSegmentSize, amount)))
+
+    sender = Sender(
+        resPocket.responseLayer.segmentsAmount,
+        singleSegmentSize,
+        min(resPocket.responseLayer.maxSegmentSize, options.maxSegmentSize),
+        send_segments,
+        options.congestionControl,
+        source.release,
+    )
+
+    if missingRanges is not None:
+        # the server already has the segments between the missing ranges of the partial upload
+        receivedRanges: list[tuple[int, int]] = []
+        start = 0
+        for end, nextStart in missingRanges + [(resPocket.responseLayer.segmentsAmount, 0)]:
+            if start < end:
+                receivedRanges.append((start, end))
+            start = nextStart
+        sender.window.skip(receivedRanges)
+
+    closeDeadline: float | None = None
     uploading = True
 
     while uploading:
-        now = time.time()
-        if last + rtt > now and len(windowToSend) > 0 and len(windowSending) < cwnd:
-            segmentID = windowToSend.pop(0)
-            if segmentID * singleSegmentSize <= bodySize - singleSegmentSize:
-                # is not the last segment
-                segment = body[segmentID * singleSegmentSize : (segmentID + 1) * singleSegmentSize]
-            else:
-                # is the last segment
-                segment = body[segmentID * singleSegmentSize :]
-
-            segmentPocket = Pocket(BasicLayer(requestID, PocketType.Segment))
-            segmentPocket.segmentLayer = SegmentLayer(segmentID, segment)
-
-            windowSending.append(segmentID)
-
-            networkConnection.sendto(bytes(segmentPocket), options.appAddress)
-        else:
-            # refresh window
-            logging.debug(
-                "refresh window {}/{}".format(segmentsAmount - len(windowToSend) - len(windowSending), segmentsAmount)
-            )
-            timeout = False
-            while not timeout:
-                try:
-                    data = networkConnection.recvfrom()[0]
-                except TimeoutError:
-                    now = time.time()
-                    timeout = last + rtt < now
-
-                if not timeout:
-                    pocket = Pocket.from_bytes(data)
-                    if pocket.basicLayer.pocketType == PocketType.Close:
-                        # complit the upload
-                        timeout = True
-                        uploading = False
-                    elif pocket.akcLayer:
-                        if pocket.akcLayer.segmentID in windowToSend:
-                            windowToSend.remove(pocket.akcLayer.segmentID)
-                        if pocket.akcLayer.segmentID in windowSending:
-                            windowSending.remove(pocket.akcLayer.segmentID)
-
-            if len(windowSending) > 0:
-                windowToSend = windowSending + windowToSend
-                windowSending = []
-                cwndMax = cwnd
-                cwnd = int(max(cwnd / 2, 1))
-            else:
-                cwnd = int(max(C * ((rtt - (cwndMax * (1 - B) / C) ** (1 / 3)) ** 3) + cwndMax, 1))
+        now = time.perf_counter()
+        deadline = sender.poll(now)
 
-            rtt = time.time() - last
-            last = time.time()
+        if sender.is_complited():
+            # the app sends close after the last segment, ask it again if the close lost
+            if closeDeadline is None:
+                closeDeadline = now + sender.rtt.rto
+            elif closeDeadline <= now:
+                send_segments(0, 1)
+                closeDeadline = now + sender.rtt.rto
+            deadline = min(deadline, closeDeadline)
 
+        networkConnection.sendto_many(batch, options.appAddress)
+        batch.clear()
+        encoder.reset()
 
-def download_data(networkConnection: NetworkConnection, options: Options, resPocket: Pocket) -> bytes:
+        if not networkConnection.has_data(max(deadline - time.perf_counter(), 0)):
+            continue
+
+        try:
+            data = networkConnection.recvfrom_view()[0]
+        except OSError:
+            continue
+
+        pocket = PocketView(data)
+        sackLayer = pocket.get_sack_layer()
+        if pocket.pocketType == PocketType.Close:
+            # complit the upload
+            uploading = False
+        elif pocket.pocketType == PocketType.Response:
+            # the app stopped the upload
+            errorPocket = pocket.to_pocket()
+            if errorPocket.responseLayer and not errorPocket.responseLayer.ok:
+                source.close()
+                return errorPocket.responseLayer.errorMessage
+        elif sackLayer:
+            sender.on_sack(sackLayer, time.perf_counter())
+
+    source.close()
+    return None
+
+
+def download_data(networkConnection: NetworkConnection, options: Options, resPocket: Pocket, sink: SegmentSink) -> None:
     # init segments for downloading
     requestID = resPocket.basicLayer.requestID
-
     assert resPocket.responseLayer
-    segmentsAmount = resPocket.responseLayer.segmentsAmount
+    sink.compression = resPocket.responseLayer.compression
 
-    neededSegments = list(range(segmentsAmount))
-    segments = [b""] * segmentsAmount
+    pendingAcks: list[tuple[int, int]] = []
 
     # send ack for start downloading
     readyPocket = Pocket(BasicLayer(requestID, PocketType.ReadyForDownloading))
@@ -106,36 +120,41 @@ def download_data(networkConnection: NetworkConnection, options: Options, resPoc
         networkConnection.sendto(bytes(readyPocket), options.appAddress)
 
         try:
-            data = networkConnection.recvfrom()[0]
-            segmentPocket = Pocket.from_bytes(data)
-            itFirstSegment = segmentPocket.basicLayer.pocketType == PocketType.Segment
+            data = networkConnection.recvfrom_view()[0]
+            segmentPocket = PocketView(data)
+            itFirstSegment = segmentPocket.pocketType == PocketType.Segment
         except OSError:
             pass
 
     # handle segments
-    while len(neededSegments) > 0:
+    while not sink.is_complited():
         try:
             if itFirstSegment:
                 itFirstSegment = False
             else:
-                data = networkConnection.recvfrom()[0]
-                segmentPocket = Pocket.from_bytes(data)
+                data = networkConnection.recvfrom_view()[0]
+                segmentPocket = PocketView(data)
 
-            if (not segmentPocket.segmentLayer) or (not segmentPocket.basicLayer.pocketType == PocketType.Segment):
+            if not segmentPocket.pocketType == PocketType.Segment:
                 logging.error("Get pocket that is not download segment")
             else:
-                segmentID = segmentPocket.segmentLayer.segmentID
-                if segmentID in neededSegments:
-                    # add new segment
-                    neededSegments.remove(segmentID)
-                    segments[segmentID] = segmentPocket.segmentLayer.data
-
-                akcPocket = Pocket(BasicLayer(requestID, PocketType.ACK))
-                akcPocket.akcLayer = AKCLayer(segmentID)
-                networkConnection.sendto(bytes(akcPocket), options.appAddress)
+                segmentID, segment = segmentPocket.get_segment()
+                # write the segments at their offset, duplicates are ignored
+                amount = sink.write(segmentID, segment)
+
+                # the duplicates acked again
+                pendingAcks.append((segmentID, segmentID + amount))
         except OSError:
             pass
 
+        if len(pendingAcks) > 0 and (
+            len(pendingAcks) >= config.SACK_SEGMENTS_AMOUNT or sink.is_complited() or not networkConnection.has_data()
+        ):
+            sackPocket = Pocket(BasicLayer(requestID, PocketType.SACK))
+            sackPocket.sackLayer = SACKLayer.from_ranges(sink.segments.firstMissing, pendingAcks)
+            pendingAcks = []
+            networkConnection.sendto(bytes(sackPocket), options.appAddress)
+
     # send complited download pocket to knowning the app that the file complited
     # until recive close pocket
     complitedPocket = Pocket(BasicLayer(requestID, PocketType.DownloadComplited))
@@ -146,15 +165,8 @@ def download_data(networkConnection: NetworkConnection, options: Options, resPoc
         networkConnection.sendto(bytes(complitedPocket), options.appAddress)
 
         try:
-            data = networkConnection.recvfrom()[0]
+            data = networkConnection.recvfrom_view()[0]
             closePocket = Pocket.from_bytes(data)
             closed = closePocket.basicLayer.pocketType == PocketType.Close
         except OSError:
             pass
-
-    # load body
-    data = b""
-    for segment in segments:
-        data += segment
-
-    return data
@@ -0,0 +1,110 @@
+# content addressed chunks of files, the upload sends only the chunks that the server not stores
+
+from __future__ import annotations
+
+import hashlib
+import struct
+from typing import BinaryIO, Callable
+
+from src.lib.delta import get_strong_hash
+
+# the instructions of the chunk upload, a chunk for every chunk of the file by their order
+CHUNK_STRUCT = struct.Struct("<B16s")
+STORED = 0  # the server has the chunk, only its hash is sended
+DATA = 1  # the hash followed by the chunk
+
+
+def get_chunk_hashes(data: bytes | memoryview, chunkSize: int) -> list[bytes]:
+    """Return the hashes of the chunks of data
+
+    Args:
+        data (bytes | memoryview): the content of file
+        chunkSize (int): size of the chunks, the last chunk can be shorter
+
+    Returns:
+        list[bytes]: hash of every chunk
+    """
+    view = memoryview(data)
+    return [get_strong_hash(view[offset : offset + chunkSize]) for offset in range(0, len(data), chunkSize)]
+
+
+def create_chunk_upload(data: bytes | memoryview, chunkSize: int, hashes: list[bytes], stored: list[bool]) -> bytes:
+    """Return the uploaded data of file, the chunks that stored on the server are sended by their hash
+
+    Args:
+        data (bytes | memoryview): the content of the file
+        chunkSize (int): size of the chunks, the last chunk can be shorter
+        hashes (list[bytes]): hash of every chunk
+        stored (list[bool]): if the server has every chunk
+
+    Returns:
+        bytes: the instructions of the chunks
+    """
+    view = memoryview(data)
+    upload = bytearray()
+    for i, chunkHash in enumerate(hashes):
+        if stored[i]:
+            upload += CHUNK_STRUCT.pack(STORED, chunkHash)
+        else:
+            upload += CHUNK_STRUCT.pack(DATA, chunkHash)
+            upload += view[i * chunkSize : (i + 1) * chunkSize]
+    return bytes(upload)
+
+
+def apply_chunk_upload(
+    upload: BinaryIO,
+    output: BinaryIO,
+    chunkSize: int,
+    fileSize: int,
+    find_chunk: Callable[[bytes, int], bytes | None],
+) -> tuple[bytes, list[bytes]]:
+    """Build file by the chunks of its upload, and the stored chunks
+
+    Args:
+        upload (BinaryIO): the instructions of the chunks
+        output (BinaryIO): the built file
+        chunkSize (int): size of the chunks, the last chunk can be shorter
+        fileSize (int): size of the file
+        find_chunk (Callable[[bytes, int], bytes | None]): return the stored chunk by its hash and size,
+            None if not stored
+
+    Raises:
+        ValueError: if the upload is not valid or a chunk is not stored
+
+    Returns:
+        tuple[bytes, list[bytes]]: the hash of the built file and the hashes of its chunks
+    """
+    if chunkSize <= 0:
+        raise ValueError("Invalid chunk size {}".format(chunkSize))
+
+    fileHash = hashlib.blake2b(digest_size=16)
+    hashes: list[bytes] = []
+    offset = 0
+    while offset < fileSize:
+        header = upload.read(CHUNK_STRUCT.size)
+        if len(header) < CHUNK_STRUCT.size:
+            raise ValueError("The chunks are truncated")
+
+        chunkType, chunkHash = CHUNK_STRUCT.unpack(header)
+        length = min(chunkSize, fileSize - offset)
+        if chunkType == STORED:
+            chunk = find_chunk(chunkHash, length)
+            if chunk is None:
+                raise ValueError("The chunk {} is not stored".format(chunkHash.hex()))
+        elif chunkType == DATA:
+            chunk = upload.read(length)
+            if len(chunk) < length:
+                raise ValueError("The chunks are truncated")
+            if get_strong_hash(chunk) != chunkHash:
+                raise ValueError("The chunk {} is not valid".format(chunkHash.hex()))
+        else:
+            raise ValueError("Unknown chunk type {}".format(chunkType))
+
+        output.write(chunk)
+        fileHash.update(chunk)
+        hashes.append(chunkHash)
+        offset += length
+
+    if upload.read(1):
+        raise ValueError("The chunks are longer than the file")
+    return (fileHash.digest(), hashes)
@@ -0,0 +1,178 @@
+# compression of the segments, every segment is a chunk that compressed apart on the worker threads
+
+from __future__ import annotations
+
+import lzma
+import os
+import os.path
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from src.lib.config import config
+from src.lib.ftp import CompressionType
+
+# extensions of the content that already compressed
+COMPRESSED_EXTENSIONS = {
+    ".7z",
+    ".apk",
+    ".avi",
+    ".br",
+    ".bz2",
+    ".docx",
+    ".flac",
+    ".gif",
+    ".gz",
+    ".jar",
+    ".jpeg",
+    ".jpg",
+    ".lz4",
+    ".lzma",
+    ".m4a",
+    ".mkv",
+    ".mov",
+    ".mp3",
+    ".mp4",
+    ".ogg",
+    ".pdf",
+    ".png",
+    ".pptx",
+    ".rar",
+    ".tgz",
+    ".webm",
+    ".webp",
+    ".whl",
+    ".xlsx",
+    ".xz",
+    ".zip",
+    ".zst",
+}
+
+# the chunks are smaller than the dictionary, so every chunk decoded by the same filters
+LZMA_DICT_SIZE = 1 << 16
+
+_executor: ThreadPoolExecutor | None = None
+_executorLock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the worker threads of the compression, shared by all the transfers of the process
+
+    Returns:
+        ThreadPoolExecutor: the worker threads
+    """
+    global _executor
+    with _executorLock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(config.COMPRESSION_THREADS, thread_name_prefix="compression")
+        return _executor
+
+
+def _reset_executor() -> None:
+    global _executor, _executorLock
+    # the worker threads of the parent not exists in the forked child
+    _executor = None
+    _executorLock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_executor)
+
+
+def _get_lzma_filters() -> list[dict[str, int]]:
+    return [{"id": lzma.FILTER_LZMA2, "preset": config.COMPRESSION_LZMA_PRESET, "dict_size": LZMA_DICT_SIZE}]
+
+
+def compress_chunk(data: bytes | memoryview, compression: CompressionType) -> bytes:
+    """Compress single chunk, the chunk that not compressible is kept as is
+
+    Args:
+        data (bytes | memoryview): the chunk
+        compression (CompressionType): the compression
+
+    Returns:
+        bytes: the compression type of the chunk followed by the compressed chunk
+    """
+    if compression == CompressionType.Zlib:
+        payload = zlib.compress(data, config.COMPRESSION_ZLIB_LEVEL)
+    elif compression == CompressionType.LZMA:
+        payload = lzma.compress(data, format=lzma.FORMAT_RAW, filters=_get_lzma_filters())
+    else:
+        payload = b""
+
+    if compression in [CompressionType.Zlib, CompressionType.LZMA] and len(payload) < len(data):
+        return bytes([compression]) + payload
+    return bytes([CompressionType.Nothing]) + data
+
+
+def decompress_chunk(frame: bytes | memoryview, maxSize: int) -> bytes:
+    """Decompress single chunk
+
+    Args:
+        frame (bytes | memoryview): the compression type of the chunk followed by the compressed chunk
+        maxSize (int): max size of the chunk
+
+    Raises:
+        ValueError: if the chunk is not valid or bigger than max size
+
+    Returns:
+        bytes: the chunk
+    """
+    if len(frame) == 0:
+        raise ValueError("Empty compressed chunk")
+
+    compression = frame[0]
+    payload = frame[1:]
+    eof = True
+    try:
+        # a byte more than the max tells that the chunk is too big, without decompressing all of it
+        if compression == CompressionType.Nothing:
+            data = bytes(payload)
+        elif compression == CompressionType.Zlib:
+            decompressor = zlib.decompressobj()
+            data = decompressor.decompress(payload, maxSize + 1)
+            eof = decompressor.eof
+        elif compression == CompressionType.LZMA:
+            lzmaDecompressor = lzma.LZMADecompressor(lzma.FORMAT_RAW, filters=_get_lzma_filters())
+            data = lzmaDecompressor.decompress(payload, maxSize + 1)
+            eof = lzmaDecompressor.eof
+        else:
+            raise ValueError("Unknown compression {}".format(compression))
+    except (zlib.error, lzma.LZMAError) as e:
+        raise ValueError("Invalid compressed chunk: {}".format(e)) from e
+
+    if len(data) > maxSize:
+        raise ValueError("The chunk is bigger than {} bytes".format(maxSize))
+    if not eof:
+        raise ValueError("The compressed chunk is truncated")
+    return data
+
+
+def is_compressible(path: str) -> bool:
+    """Return if the content of the path worth compressing, by its type
+
+    Args:
+        path (str): path of file / directory
+
+    Returns:
+        bool: false if the content is already compressed
+    """
+    return os.path.splitext(path)[1].lower() not in COMPRESSED_EXTENSIONS
+
+
+def parse_compression(name: str) -> CompressionType:
+    """Return compression type by its name
+
+    Args:
+        name (str): the name of the compression - none, zlib or lzma
+
+    Raises:
+        ValueError: if the name unknown
+
+    Returns:
+        CompressionType: the type of the compression
+    """
+    compressions = {"none": CompressionType.Nothing, "zlib": CompressionType.Zlib, "lzma": CompressionType.LZMA}
+    compression = compressions.get(name.lower())
+    if compression is None:
+        raise ValueError('Unknown compression "{}"'.format(name))
+    return compression
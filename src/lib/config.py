@@ -11,7 +11,30 @@ class Config:
 
     SOCKET_TIMEOUT: float = 0.1
     SOCKET_MAXSIZE: int = 64000
+    SOCKET_BUFFER_SIZE: int = 4 * 1024 * 1024
+    SOCKET_OFFLOAD: bool = True  # use UDP GSO / GRO on Linux
+    SOCKET_RECEIVE_BUFFERS: int = 16  # the received views are valid until so many receives
     CWND_START_VALUE: int = 1500
+    RTO_INITIAL: float = 0.2  # [sec]
+    RTO_MIN: float = 0.02  # [sec]
+    RTO_MAX: float = 5  # [sec]
+    RTO_GRANULARITY: float = 0.001  # [sec]
+    FAST_RETRANSMIT_THRESHOLD: int = 3  # [pockets]
+    PACING_GAIN: float = 1.25
+    PACING_BURST: int = 64  # [segments]
+    SACK_SEGMENTS_AMOUNT: int = 16
+    PROBE_LOSS_TOLERANCE: float = 0.02
+    PROBE_HOLD_ROUNDS: int = 16
+    COMPRESSION_CHUNK_SIZE: int = 16384  # [byte] compressed apart and sended in a single pocket
+    COMPRESSION_THREADS: int = 4
+    COMPRESSION_AHEAD: int = 32  # [chunk] compressed before the sender needs them
+    COMPRESSION_PROBE_CHUNKS: int = 8  # the data is sended as is if so many first chunks not compressible
+    COMPRESSION_ZLIB_LEVEL: int = 6
+    COMPRESSION_LZMA_PRESET: int = 1
+    DELTA_BLOCK_SIZE_MIN: int = 1024  # [byte] of the delta uploads signatures
+    DELTA_BLOCK_SIZE_MAX: int = 128 * 1024  # [byte]
+    CHUNK_SIZE: int = 64 * 1024  # [byte] of the deduplicated uploads
+    CHUNK_STATUS_HASHES_MAX: int = 2048  # the chunks in single chunk status request
 
     LOGGING_LEVEL: int = logging.DEBUG
 
@@ -0,0 +1,261 @@
+# congestion control algorithms of the RUDP senders, the window is in segments and the time in seconds
+
+from __future__ import annotations
+
+import math
+from abc import ABC, abstractmethod
+from collections import deque
+
+from src.lib.config import config
+from src.lib.ftp import CongestionControlType
+
+
+class CongestionControl(ABC):
+    """Interface of congestion control algorithm, the sender sends while the sending segments are less then cwnd"""
+
+    CWND_MIN = 2
+
+    def __init__(self, cwnd: int) -> None:
+        """
+
+        Args:
+            cwnd (int): the initial congestion window
+        """
+        self.cwnd = float(cwnd)
+
+    @abstractmethod
+    def on_ack(self, ackedAmount: int, rttSample: float | None, srtt: float, now: float) -> None:
+        """Update the window after new segments acked
+
+        Args:
+            ackedAmount (int): amount of the new acked segments
+            rttSample (float | None): RTT sample of the ack if exists
+            srtt (float): the smoothed RTT
+            now (float): the current time
+        """
+        ...
+
+    @abstractmethod
+    def on_loss(self, now: float) -> None:
+        """Update the window after new loss event, called once per window of data
+
+        Args:
+            now (float): the current time
+        """
+        ...
+
+    def on_round(self, now: float) -> None:
+        """Called every round trip
+
+        Args:
+            now (float): the current time
+        """
+        ...
+
+    def get_pacing_rate(self, srtt: float) -> float:
+        """Return the rate that the sends spread in, a bit more than window per RTT
+
+        Args:
+            srtt (float): the smoothed RTT
+
+        Returns:
+            float: the rate [segments / sec]
+        """
+        return config.PACING_GAIN * self.cwnd / srtt
+
+
+class NewReno(CongestionControl):
+    """Slow start and AIMD congestion avoidance (RFC 6582)"""
+
+    def __init__(self, cwnd: int) -> None:
+        CongestionControl.__init__(self, cwnd)
+        self.ssthresh = math.inf
+
+    def on_ack(self, ackedAmount: int, rttSample: float | None, srtt: float, now: float) -> None:
+        if self.cwnd < self.ssthresh:
+            self.cwnd += ackedAmount
+        else:
+            self.cwnd += ackedAmount / self.cwnd
+
+    def on_loss(self, now: float) -> None:
+        self.ssthresh = max(self.cwnd / 2, self.CWND_MIN)
+        self.cwnd = self.ssthresh
+
+
+class Cubic(CongestionControl):
+    """CUBIC congestion control (RFC 8312), the window grows by the time since the last loss event"""
+
+    C = 0.4
+    BETA = 0.7
+
+    def __init__(self, cwnd: int) -> None:
+        CongestionControl.__init__(self, cwnd)
+        self.ssthresh = math.inf
+        self.wMax = self.cwnd
+        self._k = 0.0
+        self._epochStart: float | None = None
+        # window of Reno with the same loss rate, the window not grows slower than it
+        self._wEst = self.cwnd
+
+    def on_ack(self, ackedAmount: int, rttSample: float | None, srtt: float, now: float) -> None:
+        if self.cwnd < self.ssthresh:
+            self.cwnd += ackedAmount
+            return None
+
+        if self._epochStart is None:
+            # first ack of congestion avoidance
+            self._epochStart = now
+            self._k = ((self.wMax - self.cwnd) / self.C) ** (1 / 3) if self.cwnd < self.wMax else 0.0
+            self._wEst = self.cwnd
+
+        t = now - self._epochStart + srtt
+        target = self.C * (t - self._k) ** 3 + self.wMax
+
+        self._wEst += 3 * (1 - self.BETA) / (1 + self.BETA) * ackedAmount / self.cwnd
+        if target > self.cwnd:
+            self.cwnd += (target - self.cwnd) / self.cwnd * ackedAmount
+        self.cwnd = max(self.cwnd, self._wEst)
+
+    def on_loss(self, now: float) -> None:
+        self._epochStart = None
+        if self.cwnd < self.wMax:
+            # fast convergence, release bandwidth to new flows
+            self.wMax = self.cwnd * (1 + self.BETA) / 2
+        else:
+            self.wMax = self.cwnd
+        self.ssthresh = max(self.cwnd * self.BETA, self.CWND_MIN)
+        self.cwnd = self.ssthresh
+
+
+class BBR(CongestionControl):
+    """Model based congestion control like BBR, the window follows the max delivery rate times the min RTT"""
+
+    CWND_MIN = 4
+    STARTUP_GAIN = 2.89
+    CWND_GAIN = 2
+    PROBE_GAINS = (1.25, 0.75, 1, 1, 1, 1, 1, 1)
+    # the startup ends when the bandwidth not grows by 25% for 3 rounds
+    FULL_BANDWIDTH_GROWTH = 1.25
+    FULL_BANDWIDTH_ROUNDS = 3
+    BANDWIDTH_ROUNDS = 10
+    MIN_RTT_WINDOW = 10  # [sec]
+
+    def __init__(self, cwnd: int) -> None:
+        CongestionControl.__init__(self, cwnd)
+        self.minRtt: float | None = None
+        self._minRttTime = 0.0
+        # delivery rates [segments / sec] of the last rounds
+        self._bandwidths: deque[float] = deque(maxlen=self.BANDWIDTH_ROUNDS)
+
+        self.startup = True
+        self.pacingGain = self.STARTUP_GAIN
+        self._fullBandwidth = 0.0
+        self._fullBandwidthRounds = 0
+        self._cycleIndex = 0
+
+        self._roundStart: float | None = None
+        self._roundDelivered = 0
+
+    def get_bandwidth(self) -> float:
+        """Return the max delivery rate of the last rounds
+
+        Returns:
+            float: the bandwidth [segments / sec]
+        """
+        return max(self._bandwidths, default=0.0)
+
+    def on_ack(self, ackedAmount: int, rttSample: float | None, srtt: float, now: float) -> None:
+        if rttSample is not None:
+            if self.minRtt is None or rttSample <= self.minRtt or now - self._minRttTime > self.MIN_RTT_WINDOW:
+                self.minRtt = rttSample
+                self._minRttTime = now
+
+        self._roundDelivered += ackedAmount
+
+        if self.startup and len(self._bandwidths) == 0:
+            # no model yet, grow like slow start
+            self.cwnd += ackedAmount
+
+    def on_loss(self, now: float) -> None:
+        # the model ignores random losses, the window follows the measured bandwidth
+        ...
+
+    def on_round(self, now: float) -> None:
+        if self._roundStart is None:
+            # the first round, the delivery rate measured from the next round
+            self._roundStart = now
+            self._roundDelivered = 0
+            return None
+        if now <= self._roundStart:
+            return None
+
+        self._bandwidths.append(self._roundDelivered / (now - self._roundStart))
+        self._roundStart = now
+        self._roundDelivered = 0
+
+        bandwidth = self.get_bandwidth()
+        if self.minRtt is None or bandwidth == 0:
+            return None
+
+        if self.startup:
+            if bandwidth >= self._fullBandwidth * self.FULL_BANDWIDTH_GROWTH:
+                self._fullBandwidth = bandwidth
+                self._fullBandwidthRounds = 0
+            else:
+                self._fullBandwidthRounds += 1
+                self.startup = self._fullBandwidthRounds < self.FULL_BANDWIDTH_ROUNDS
+
+        if self.startup:
+            self.pacingGain = cwndGain = self.STARTUP_GAIN
+        else:
+            # probe for more bandwidth and then drain the queue that it made
+            self.pacingGain = self.PROBE_GAINS[self._cycleIndex]
+            self._cycleIndex = (self._cycleIndex + 1) % len(self.PROBE_GAINS)
+            cwndGain = self.CWND_GAIN
+
+        self.cwnd = max(cwndGain * bandwidth * self.minRtt, self.CWND_MIN)
+
+    def get_pacing_rate(self, srtt: float) -> float:
+        bandwidth = self.get_bandwidth()
+        if bandwidth == 0:
+            return CongestionControl.get_pacing_rate(self, srtt)
+        return self.pacingGain * bandwidth
+
+
+congestionControls: dict[CongestionControlType, type[CongestionControl]] = {
+    CongestionControlType.Default: Cubic,
+    CongestionControlType.Cubic: Cubic,
+    CongestionControlType.NewReno: NewReno,
+    CongestionControlType.BBR: BBR,
+}
+
+
+def create_congestion_control(controlType: CongestionControlType, cwnd: int) -> CongestionControl:
+    """Create congestion control algorithm by its type
+
+    Args:
+        controlType (CongestionControlType): type of the algorithm, the default is CUBIC
+        cwnd (int): the initial congestion window
+
+    Returns:
+        CongestionControl: the algorithm
+    """
+    return congestionControls[controlType](cwnd)
+
+
+def parse_congestion_control(name: str) -> CongestionControlType:
+    """Return congestion control type by its name
+
+    Args:
+        name (str): the name of the algorithm - cubic, newreno or bbr
+
+    Raises:
+        ValueError: if the name unknown
+
+    Returns:
+        CongestionControlType: the type of the algorithm
+    """
+    for controlType in CongestionControlType:
+        if controlType != CongestionControlType.Default and controlType.name.lower() == name.lower():
+            return controlType
+    raise ValueError('Unknown congestion control "{}"'.format(name))
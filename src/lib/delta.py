@@ -0,0 +1,216 @@
+# rsync like delta of file against the blocks of its old copy, only the changed bytes are sended
+
+from __future__ import annotations
+
+import hashlib
+import math
+import struct
+import zlib
+from typing import BinaryIO
+
+from src.lib.config import config
+
+# weak rolling checksum (adler32) and strong hash of every block
+BLOCK_STRUCT = struct.Struct("<I16s")
+# the instructions of the delta, the literal followed by its bytes
+LITERAL_STRUCT = struct.Struct("<BI")
+COPY_STRUCT = struct.Struct("<BQI")
+LITERAL = 0
+COPY = 1
+LITERAL_MAX = 1 << 30  # [byte]
+
+ADLER_MOD = 65521
+COPY_BUFFER_SIZE = 1 << 20  # [byte]
+
+
+def get_block_size(fileSize: int) -> int:
+    """Return the block size of the signature, about the square root of the file size
+
+    Args:
+        fileSize (int): size of the file
+
+    Returns:
+        int: the block size
+    """
+    blockSize = math.isqrt(fileSize) // 1024 * 1024
+    return min(max(blockSize, config.DELTA_BLOCK_SIZE_MIN), config.DELTA_BLOCK_SIZE_MAX)
+
+
+def get_strong_hash(data: bytes | memoryview) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def create_signature(file: BinaryIO, blockSize: int) -> bytes:
+    """Return the checksums of the blocks of file
+
+    Args:
+        file (BinaryIO): the file, read from its current position
+        blockSize (int): size of the blocks
+
+    Returns:
+        bytes: weak and strong checksum of every block, the last block can be shorter
+    """
+    signature = bytearray()
+    while True:
+        block = file.read(blockSize)
+        if not block:
+            break
+        signature += BLOCK_STRUCT.pack(zlib.adler32(block), get_strong_hash(block))
+    return bytes(signature)
+
+
+class DeltaBuilder:
+    """The instructions of delta, consecutive blocks are copied by single instruction"""
+
+    def __init__(self) -> None:
+        self.data = bytearray()
+        self._copyStart = 0
+        self._copyAmount = 0
+
+    def literal(self, data: bytes | memoryview) -> None:
+        if len(data) == 0:
+            return None
+
+        self._flush_copy()
+        for offset in range(0, len(data), LITERAL_MAX):
+            chunk = data[offset : offset + LITERAL_MAX]
+            self.data += LITERAL_STRUCT.pack(LITERAL, len(chunk))
+            self.data += chunk
+
+    def copy(self, blockIndex: int) -> None:
+        if self._copyAmount > 0 and self._copyStart + self._copyAmount == blockIndex:
+            self._copyAmount += 1
+            return None
+
+        self._flush_copy()
+        self._copyStart = blockIndex
+        self._copyAmount = 1
+
+    def close(self) -> bytes:
+        self._flush_copy()
+        return bytes(self.data)
+
+    def _flush_copy(self) -> None:
+        if self._copyAmount > 0:
+            self.data += COPY_STRUCT.pack(COPY, self._copyStart, self._copyAmount)
+            self._copyAmount = 0
+
+
+def create_delta(data: bytes, signature: bytes | memoryview, blockSize: int, basisSize: int) -> bytes:
+    """Return delta that builds the data from the blocks of the basis file, the blocks of the basis are searched at
+    every offset of the data by rolling checksum
+
+    Args:
+        data (bytes): the new content of the file
+        signature (bytes | memoryview): the signature of the basis file
+        blockSize (int): size of the blocks of the signature
+        basisSize (int): size of the basis file
+
+    Returns:
+        bytes: the delta instructions
+    """
+    blocks = list(BLOCK_STRUCT.iter_unpack(signature))
+
+    # the full blocks by their weak checksum
+    weakBlocks: dict[int, list[int]] = {}
+    for blockIndex, (weak, strong) in enumerate(blocks[: basisSize // blockSize]):
+        weakBlocks.setdefault(weak, []).append(blockIndex)
+
+    builder = DeltaBuilder()
+    view = memoryview(data)
+    offset = 0
+    literalStart = 0
+    lastOffset = len(data) - blockSize
+    weak = -1
+
+    while offset <= lastOffset:
+        if weak < 0:
+            weak = zlib.adler32(view[offset : offset + blockSize])
+
+        candidates = weakBlocks.get(weak)
+        if candidates:
+            strong = get_strong_hash(view[offset : offset + blockSize])
+            blockIndex = next((i for i in candidates if blocks[i][1] == strong), -1)
+            if blockIndex >= 0:
+                builder.literal(view[literalStart:offset])
+                builder.copy(blockIndex)
+                offset += blockSize
+                literalStart = offset
+                weak = -1
+                continue
+
+        if offset < lastOffset:
+            # roll the checksum by a byte
+            outByte = data[offset]
+            a = ((weak & 0xFFFF) - outByte + data[offset + blockSize]) % ADLER_MOD
+            b = ((weak >> 16) - blockSize * outByte + a - 1) % ADLER_MOD
+            weak = (b << 16) | a
+        offset += 1
+
+    # the last block of the basis is shorter, it can match only the end of the data
+    tailSize = basisSize % blockSize
+    tailOffset = len(data) - tailSize
+    if blocks and 0 < tailSize and literalStart <= tailOffset:
+        weak, strong = blocks[-1]
+        tail = view[tailOffset:]
+        if zlib.adler32(tail) == weak and get_strong_hash(tail) == strong:
+            builder.literal(view[literalStart:tailOffset])
+            builder.copy(len(blocks) - 1)
+            literalStart = len(data)
+
+    builder.literal(view[literalStart:])
+    return builder.close()
+
+
+def apply_delta(delta: BinaryIO, basis: BinaryIO, output: BinaryIO, blockSize: int, basisSize: int) -> bytes:
+    """Build file by delta from the blocks of its basis
+
+    Args:
+        delta (BinaryIO): the delta instructions
+        basis (BinaryIO): the basis file
+        output (BinaryIO): the built file
+        blockSize (int): size of the blocks of the signature
+        basisSize (int): size of the basis file
+
+    Raises:
+        ValueError: if the delta is not valid
+
+    Returns:
+        bytes: the strong hash of the built file
+    """
+    outputHash = hashlib.blake2b(digest_size=16)
+
+    def copy_bytes(source: BinaryIO, length: int) -> None:
+        while length > 0:
+            data = source.read(min(length, COPY_BUFFER_SIZE))
+            if not data:
+                raise ValueError("The delta is truncated")
+            output.write(data)
+            outputHash.update(data)
+            length -= len(data)
+
+    while True:
+        instructionType = delta.read(1)
+        if not instructionType:
+            break
+
+        if instructionType[0] == LITERAL:
+            header = instructionType + delta.read(LITERAL_STRUCT.size - 1)
+            if len(header) < LITERAL_STRUCT.size:
+                raise ValueError("The delta is truncated")
+            copy_bytes(delta, LITERAL_STRUCT.unpack(header)[1])
+        elif instructionType[0] == COPY:
+            header = instructionType + delta.read(COPY_STRUCT.size - 1)
+            if len(header) < COPY_STRUCT.size:
+                raise ValueError("The delta is truncated")
+            _, blockIndex, amount = COPY_STRUCT.unpack(header)
+
+            offset = blockIndex * blockSize
+            if amount == 0 or offset + (amount - 1) * blockSize >= basisSize:
+                raise ValueError("The blocks {}-{} are not in the basis".format(blockIndex, blockIndex + amount))
+            basis.seek(offset)
+            copy_bytes(basis, min(amount * blockSize, basisSize - offset))
+        else:
+            raise ValueError("Unknown delta instruction {}".format(instructionType[0]))
+
+    return outputHash.digest()
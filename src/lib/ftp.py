@@ -8,6 +8,15 @@ from enum import IntEnum
 
 # struct link: https://docs.python.org/3.7/library/struct.html
 
+# the layers of the transfer hot paths, compiled once
+BASIC_LAYER_STRUCT = struct.Struct("BBQ")
+SEGMENT_LAYER_STRUCT = struct.Struct("QI")
+AKC_LAYER_STRUCT = struct.Struct("Q")
+SACK_LAYER_STRUCT = struct.Struct("QB")
+SACK_RANGE_STRUCT = struct.Struct("QQ")
+# basic layer and segment layer, the basic layer is aligned so the native layout is the same
+SEGMENT_HEADER_STRUCT = struct.Struct("BBQQI")
+
 
 # Enums
 
@@ -23,6 +32,7 @@ class PocketType(IntEnum):
     ACK = 5
     DownloadComplited = 6
     Close = 7
+    SACK = 8
 
 
 class PocketSubType(IntEnum):
@@ -33,12 +43,53 @@ class PocketSubType(IntEnum):
     Download = 2
     List = 3
     Delete = 4
+    UploadStatus = 5
+    Signature = 6
+    DeltaUpload = 7
+    ChunkStatus = 8
+    ChunkUpload = 9
+
+
+class CongestionControlType(IntEnum):
+    """Congestion control algorithm of the sender"""
+
+    Default = 0
+    Cubic = 1
+    NewReno = 2
+    BBR = 3
+
+
+class CompressionType(IntEnum):
+    """Compression of the transfered data, every segment is compressed apart"""
+
+    Default = 0
+    Nothing = 1
+    Zlib = 2
+    LZMA = 3
+
+
+# Paths
+
+
+def pack_path(path: str) -> bytes:
+    """Pack path prefixed by the length of its encoding, the fields after it are found by the encoded length
+
+    Args:
+        path (str): the path
+
+    Returns:
+        bytes: as bytes
+    """
+    encodedPath = path.encode()
+    return struct.pack("I", len(encodedPath)) + encodedPath
 
 
 # Layer Interface
 class LayerInterface(ABC):
     """Interface of all the packet layers"""
 
+    __slots__ = ()
+
     @abstractmethod
     def __len__(self) -> int:
         """Return the length in bytes of the layer
@@ -62,9 +113,11 @@ class LayerInterface(ABC):
 class BasicLayer(LayerInterface):
     """The base layer of all the packets"""
 
+    __slots__ = ("pocketType", "pocketSubType", "requestID")
+
     @staticmethod
-    def from_bytes(data: bytes, offset: int) -> BasicLayer:
-        pocketType, pocketSubType, requestID = struct.unpack_from("BBQ", data, offset)
+    def from_bytes(data: bytes | memoryview, offset: int) -> BasicLayer:
+        pocketType, pocketSubType, requestID = BASIC_LAYER_STRUCT.unpack_from(data, offset)
         return BasicLayer(
             requestID,
             PocketType(pocketType),  # type: ignore
@@ -89,11 +142,10 @@ class BasicLayer(LayerInterface):
         self.requestID = requestID
 
     def __len__(self) -> int:
-        return struct.calcsize("BBQ")
+        return BASIC_LAYER_STRUCT.size
 
     def __bytes__(self) -> bytes:
-        return struct.pack(
-            "BBQ",
+        return BASIC_LAYER_STRUCT.pack(
             self.pocketType,
             self.pocketSubType,
             self.requestID,
@@ -104,24 +156,49 @@ class BasicLayer(LayerInterface):
 
 
 class RequestLayer(LayerInterface):
+    __slots__ = (
+        "pocketFullSize",
+        "maxSingleSegmentSize",
+        "anonymous",
+        "userName",
+        "password",
+        "congestionControl",
+        "compression",
+    )
+
     @staticmethod
-    def from_bytes(data: bytes, offset: int) -> RequestLayer:
-        pocketFullSize, maxSingleSegmentSize, anonymous, userNameLength = struct.unpack_from("QQ?I", data, offset)
-        offset += struct.calcsize("QQ?I")
+    def from_bytes(data: bytes | memoryview, offset: int) -> RequestLayer:
+        (
+            pocketFullSize,
+            maxSingleSegmentSize,
+            congestionControl,
+            compression,
+            anonymous,
+            userNameLength,
+        ) = struct.unpack_from("QQBB?I", data, offset)
+        offset += struct.calcsize("QQBB?I")
         userName = ""
         password = ""
         if not anonymous:
             if userNameLength > 0:
-                userName = data[offset : offset + userNameLength].decode()
+                userName = str(data[offset : offset + userNameLength], "utf-8")
                 offset += userNameLength
 
             passwordLength = struct.unpack_from("I", data, offset)[0]
             offset += struct.calcsize("I")
             if passwordLength > 0:
-                password = data[offset : offset + passwordLength].decode()
+                password = str(data[offset : offset + passwordLength], "utf-8")
                 offset += passwordLength
 
-        return RequestLayer(pocketFullSize, maxSingleSegmentSize, anonymous, userName, password)
+        return RequestLayer(
+            pocketFullSize,
+            maxSingleSegmentSize,
+            anonymous,
+            userName,
+            password,
+            CongestionControlType(congestionControl),
+            CompressionType(compression),
+        )
 
     def __init__(
         self,
@@ -130,6 +207,8 @@ class RequestLayer(LayerInterface):
         anonymous: bool,
         userName: str,
         password: str,
+        congestionControl: CongestionControlType = CongestionControlType.Default,
+        compression: CompressionType = CompressionType.Default,
     ) -> None:
         """
         Args:
@@ -138,21 +217,29 @@ class RequestLayer(LayerInterface):
             anonymous (bool): true if is anonymous request
             userName (str): the user name if it is not anonymous request
             password (str): the password if it is not anonymous request
+            congestionControl (CongestionControlType, optional): congestion control of the server sender.
+                Defaults to CongestionControlType.Default.
+            compression (CompressionType, optional): compression that the client supports, the server chooses it.
+                Defaults to CompressionType.Default.
         """
         self.pocketFullSize = pocketFullSize
         self.maxSingleSegmentSize = maxSingleSegmentSize
         self.anonymous = anonymous
         self.userName = userName
         self.password = password
+        self.congestionControl = congestionControl
+        self.compression = compression
 
     def __len__(self) -> int:
-        return struct.calcsize("QQ?I") + len(self.userName) + struct.calcsize("I") + len(self.password)
+        return struct.calcsize("QQBB?I") + len(self.userName) + struct.calcsize("I") + len(self.password)
 
     def __bytes__(self) -> bytes:
         ret = struct.pack(
-            "QQ?I",
+            "QQBB?I",
             self.pocketFullSize,
             self.maxSingleSegmentSize,
+            self.congestionControl,
+            self.compression,
             self.anonymous,
             len(self.userName),
         )
@@ -168,20 +255,47 @@ class RequestLayer(LayerInterface):
 
 
 class ResponseLayer(LayerInterface):
+    __slots__ = (
+        "ok",
+        "errorMessage",
+        "dataSize",
+        "segmentsAmount",
+        "singleSegmentSize",
+        "maxSegmentSize",
+        "compression",
+    )
+
     @staticmethod
-    def from_bytes(data: bytes, offset: int) -> ResponseLayer:
+    def from_bytes(data: bytes | memoryview, offset: int) -> ResponseLayer:
         ok, errorMessageLength = struct.unpack_from("?B", data, offset)
         offset += struct.calcsize("?B")
         if errorMessageLength == 0:
             errorMessage = ""
         else:
-            errorMessage = data[offset : offset + errorMessageLength].decode()
+            errorMessage = str(data[offset : offset + errorMessageLength], "utf-8")
             offset += errorMessageLength
-        dataSize, segmentsAmount, singleSegmentSize = struct.unpack_from("QQQ", data, offset)
-        return ResponseLayer(ok, errorMessage, dataSize, segmentsAmount, singleSegmentSize)
+        dataSize, segmentsAmount, singleSegmentSize, maxSegmentSize, compression = struct.unpack_from(
+            "QQQQB", data, offset
+        )
+        return ResponseLayer(
+            ok,
+            errorMessage,
+            dataSize,
+            segmentsAmount,
+            singleSegmentSize,
+            maxSegmentSize,
+            CompressionType(compression),
+        )
 
     def __init__(
-        self, ok: bool, errorMessage: str | None, dataSize: int, segmentsAmount: int, singleSegmentSize: int
+        self,
+        ok: bool,
+        errorMessage: str | None,
+        dataSize: int,
+        segmentsAmount: int,
+        singleSegmentSize: int,
+        maxSegmentSize: int = 0,
+        compression: CompressionType = CompressionType.Nothing,
     ) -> None:
         """
 
@@ -191,6 +305,10 @@ class ResponseLayer(LayerInterface):
             dataSize (int): size of the data to upload / download
             segmentsAmount (int): amount of segments
             singleSegmentSize (int): size of each segment
+            maxSegmentSize (int, optional): max size of consecutive segments in a single pocket.
+                Defaults to 0 - same as singleSegmentSize.
+            compression (CompressionType, optional): compression of the segments, every segment is compressed chunk.
+                Defaults to CompressionType.Nothing.
         """
         self.ok = ok
         if not errorMessage:
@@ -200,45 +318,62 @@ class ResponseLayer(LayerInterface):
         self.dataSize = dataSize
         self.segmentsAmount = segmentsAmount
         self.singleSegmentSize = singleSegmentSize
+        self.maxSegmentSize = max(maxSegmentSize, singleSegmentSize)
+        self.compression = compression
 
     def __len__(self) -> int:
-        return struct.calcsize("?B") + len(self.errorMessage) + struct.calcsize("QQQ")
+        return struct.calcsize("?B") + len(self.errorMessage) + struct.calcsize("QQQQB")
 
     def __bytes__(self) -> bytes:
         ret = struct.pack("?B", self.ok, len(self.errorMessage))
         ret += self.errorMessage.encode()
-        ret += struct.pack("QQQ", self.dataSize, self.segmentsAmount, self.singleSegmentSize)
+        ret += struct.pack(
+            "QQQQB",
+            self.dataSize,
+            self.segmentsAmount,
+            self.singleSegmentSize,
+            self.maxSegmentSize,
+            self.compression,
+        )
         return ret
 
     def __str__(self) -> str:
-        return " ok: {}, message: {}, size: {}, segments: {}, size: {} |".format(
-            self.ok, self.errorMessage, self.dataSize, self.segmentsAmount, self.singleSegmentSize
+        return " ok: {}, message: {}, size: {}, segments: {}, size: {}, max size: {}, compression: {} |".format(
+            self.ok,
+            self.errorMessage,
+            self.dataSize,
+            self.segmentsAmount,
+            self.singleSegmentSize,
+            self.maxSegmentSize,
+            self.compression.name,
         )
 
 
 class SegmentLayer(LayerInterface):
+    __slots__ = ("segmentID", "data")
+
     @staticmethod
-    def from_bytes(data: bytes, offset: int) -> SegmentLayer:
-        segmentID, segmentLength = struct.unpack_from("QI", data, offset)
-        offset += struct.calcsize("QI")
+    def from_bytes(data: bytes | memoryview, offset: int) -> SegmentLayer:
+        segmentID, segmentLength = SEGMENT_LAYER_STRUCT.unpack_from(data, offset)
+        offset += SEGMENT_LAYER_STRUCT.size
         segment = data[offset : offset + segmentLength]
         return SegmentLayer(segmentID, segment)
 
-    def __init__(self, segmentID: int, data: bytes) -> None:
+    def __init__(self, segmentID: int, data: bytes | memoryview) -> None:
         """
 
         Args:
             segmentID (int): segment ID
-            data (bytes): segment content (data)
+            data (bytes | memoryview): segment content (data)
         """
         self.segmentID = segmentID
         self.data = data
 
     def __len__(self) -> int:
-        return struct.calcsize("QI") + len(self.data)
+        return SEGMENT_LAYER_STRUCT.size + len(self.data)
 
     def __bytes__(self) -> bytes:
-        return struct.pack("QI", self.segmentID, len(self.data)) + self.data
+        return SEGMENT_LAYER_STRUCT.pack(self.segmentID, len(self.data)) + self.data
 
     def __str__(self) -> str:
         return " segment: {}, length: {} |".format(self.segmentID, len(self.data))
@@ -247,9 +382,11 @@ class SegmentLayer(LayerInterface):
 class AKCLayer(LayerInterface):
     """AKC for a segment"""
 
+    __slots__ = ("segmentID",)
+
     @staticmethod
-    def from_bytes(data: bytes, offset: int) -> AKCLayer:
-        segmentID = struct.unpack_from("Q", data, offset)[0]
+    def from_bytes(data: bytes | memoryview, offset: int) -> AKCLayer:
+        segmentID = AKC_LAYER_STRUCT.unpack_from(data, offset)[0]
         return AKCLayer(segmentID)
 
     def __init__(self, segmentID: int) -> None:
@@ -260,80 +397,416 @@ class AKCLayer(LayerInterface):
         self.segmentID = segmentID
 
     def __len__(self) -> int:
-        return struct.calcsize("Q")
+        return AKC_LAYER_STRUCT.size
 
     def __bytes__(self) -> bytes:
-        return struct.pack("Q", self.segmentID)
+        return AKC_LAYER_STRUCT.pack(self.segmentID)
 
     def __str__(self) -> str:
         return " akc-to-segment: {} |".format(self.segmentID)
 
 
+class SACKLayer(LayerInterface):
+    """Selective AKC for many segments, all the segments before the cumulative segment and the ranges"""
+
+    __slots__ = ("cumulative", "ranges")
+
+    MAX_RANGES = 32
+
+    @staticmethod
+    def from_bytes(data: bytes | memoryview, offset: int) -> SACKLayer:
+        cumulative, rangesAmount = SACK_LAYER_STRUCT.unpack_from(data, offset)
+        offset += SACK_LAYER_STRUCT.size
+        ranges: list[tuple[int, int]] = list(
+            SACK_RANGE_STRUCT.iter_unpack(data[offset : offset + rangesAmount * SACK_RANGE_STRUCT.size])
+        )
+        return SACKLayer(cumulative, ranges)
+
+    @staticmethod
+    def from_ranges(cumulative: int, receivedRanges: list[tuple[int, int]]) -> SACKLayer:
+        """Create SACK of received segments
+
+        Args:
+            cumulative (int): all the segments before it received
+            receivedRanges (list[tuple[int, int]]): ranges of segments that received from the last SACK, [start, end)
+
+        Returns:
+            SACKLayer: the SACK layer
+        """
+        ranges: list[tuple[int, int]] = []
+        for start, end in sorted(receivedRanges):
+            start = max(start, cumulative)
+            if start >= end:
+                continue
+            if ranges and ranges[-1][1] >= start:
+                ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+            else:
+                ranges.append((start, end))
+
+        # keep the newest ranges
+        return SACKLayer(cumulative, ranges[-SACKLayer.MAX_RANGES :])
+
+    def __init__(self, cumulative: int, ranges: list[tuple[int, int]]) -> None:
+        """
+        Args:
+            cumulative (int): all the segments before it received
+            ranges (list[tuple[int, int]]): ranges of received segments, [start, end)
+        """
+        self.cumulative = cumulative
+        self.ranges = ranges
+
+    def __contains__(self, segmentID: int) -> bool:
+        if segmentID < self.cumulative:
+            return True
+        for start, end in self.ranges:
+            if start <= segmentID < end:
+                return True
+        return False
+
+    def __len__(self) -> int:
+        return SACK_LAYER_STRUCT.size + SACK_RANGE_STRUCT.size * len(self.ranges)
+
+    def __bytes__(self) -> bytes:
+        ret = bytearray(len(self))
+        SACK_LAYER_STRUCT.pack_into(ret, 0, self.cumulative, len(self.ranges))
+        offset = SACK_LAYER_STRUCT.size
+        for start, end in self.ranges:
+            SACK_RANGE_STRUCT.pack_into(ret, offset, start, end)
+            offset += SACK_RANGE_STRUCT.size
+        return bytes(ret)
+
+    def __str__(self) -> str:
+        return " sack-cumulative: {}, ranges: {} |".format(self.cumulative, self.ranges)
+
+
 # FTP Level
 class UploadRequestLayer(LayerInterface):
-    """Upload file Request Layer over RequestLayer"""
+    """Upload file Request Layer over RequestLayer, also of the upload status request"""
+
+    __slots__ = ("path", "token")
 
     @staticmethod
-    def from_bytes(data: bytes, offset: int) -> UploadRequestLayer:
+    def from_bytes(data: bytes | memoryview, offset: int) -> UploadRequestLayer:
         filePathLength = struct.unpack_from("I", data, offset)[0]
         offset += struct.calcsize("I")
         filePath = data[offset : offset + filePathLength]
+        offset += filePathLength
+
+        tokenLength = struct.unpack_from("B", data, offset)[0]
+        offset += struct.calcsize("B")
+        token = data[offset : offset + tokenLength]
 
-        return UploadRequestLayer(bytes.decode(filePath))
+        return UploadRequestLayer(str(filePath, "utf-8"), str(token, "utf-8"))
 
-    def __init__(self, filePath: str) -> None:
+    def __init__(self, filePath: str, token: str = "") -> None:
         """
 
         Args:
             filePath (str): file path on the server
+            token (str, optional): token of resumable upload, the server keeps the partial upload by it.
+                Defaults to "" - not resumable.
         """
         self.path = filePath
+        self.token = token
+
+    def __len__(self) -> int:
+        return len(pack_path(self.path)) + struct.calcsize("B") + len(self.token.encode())
+
+    def __bytes__(self) -> bytes:
+        token = self.token.encode()
+        return pack_path(self.path) + struct.pack("B", len(token)) + token
+
+    def __str__(self) -> str:
+        return " file path: {}, token: {} |".format(self.path, self.token)
+
+
+class UploadStatusResponseLayer(LayerInterface):
+    """Upload Status Response layer over ResponseLayer, the segments that missing in the partial upload"""
+
+    __slots__ = ("singleSegmentSize", "missingRanges")
+
+    @staticmethod
+    def from_bytes(data: bytes | memoryview, offset: int) -> UploadStatusResponseLayer:
+        singleSegmentSize, rangesAmount = struct.unpack_from("QI", data, offset)
+        offset += struct.calcsize("QI")
+        missingRanges = list(
+            SACK_RANGE_STRUCT.iter_unpack(data[offset : offset + rangesAmount * SACK_RANGE_STRUCT.size])
+        )
+
+        return UploadStatusResponseLayer(singleSegmentSize, missingRanges)
+
+    def __init__(self, singleSegmentSize: int, missingRanges: list[tuple[int, int]]) -> None:
+        """
+
+        Args:
+            singleSegmentSize (int): size of each segment
+            missingRanges (list[tuple[int, int]]): ranges of the missing segments, start and end (exclusive)
+        """
+        self.singleSegmentSize = singleSegmentSize
+        self.missingRanges = missingRanges
 
     def __len__(self) -> int:
-        return struct.calcsize("I") + len(self.path)
+        return struct.calcsize("QI") + SACK_RANGE_STRUCT.size * len(self.missingRanges)
 
     def __bytes__(self) -> bytes:
-        return struct.pack("I", len(self.path)) + self.path.encode()
+        return struct.pack("QI", self.singleSegmentSize, len(self.missingRanges)) + b"".join(
+            SACK_RANGE_STRUCT.pack(start, end) for start, end in self.missingRanges
+        )
 
     def __str__(self) -> str:
-        return " file path: {} |".format(self.path)
+        return " segment size: {}, missing ranges: {} |".format(self.singleSegmentSize, len(self.missingRanges))
+
+
+class DeltaUploadRequestLayer(LayerInterface):
+    """Delta Upload Request layer after UploadRequestLayer, the uploaded data is delta of the file on the server"""
+
+    __slots__ = ("blockSize", "basisVersion", "fileSize", "fileHash")
+
+    @staticmethod
+    def from_bytes(data: bytes | memoryview, offset: int) -> DeltaUploadRequestLayer:
+        blockSize, basisVersion, fileSize, fileHash = struct.unpack_from("QQQ16s", data, offset)
+        return DeltaUploadRequestLayer(blockSize, basisVersion, fileSize, fileHash)
+
+    def __init__(self, blockSize: int, basisVersion: int, fileSize: int, fileHash: bytes) -> None:
+        """
+
+        Args:
+            blockSize (int): size of the blocks of the signature
+            basisVersion (int): version of the file on the server that the delta is based on
+            fileSize (int): size of the file that the delta builds
+            fileHash (bytes): hash (16 bytes) of the file that the delta builds
+        """
+        self.blockSize = blockSize
+        self.basisVersion = basisVersion
+        self.fileSize = fileSize
+        self.fileHash = fileHash
+
+    def __len__(self) -> int:
+        return struct.calcsize("QQQ16s")
+
+    def __bytes__(self) -> bytes:
+        return struct.pack("QQQ16s", self.blockSize, self.basisVersion, self.fileSize, self.fileHash)
+
+    def __str__(self) -> str:
+        return " block size: {}, basis version: {}, file size: {} |".format(
+            self.blockSize, self.basisVersion, self.fileSize
+        )
+
+
+class SignatureResponseLayer(LayerInterface):
+    """Signature Response layer over ResponseLayer, the blocks of the file on the server"""
+
+    __slots__ = ("blockSize", "fileSize", "version")
+
+    @staticmethod
+    def from_bytes(data: bytes | memoryview, offset: int) -> SignatureResponseLayer:
+        blockSize, fileSize, version = struct.unpack_from("QQQ", data, offset)
+        return SignatureResponseLayer(blockSize, fileSize, version)
+
+    def __init__(self, blockSize: int, fileSize: int, version: int) -> None:
+        """
+
+        Args:
+            blockSize (int): size of the blocks, the last block can be shorter
+            fileSize (int): size of the file
+            version (int): version of the file, the delta upload is rejected if the file changed after it
+        """
+        self.blockSize = blockSize
+        self.fileSize = fileSize
+        self.version = version
+
+    def __len__(self) -> int:
+        return struct.calcsize("QQQ")
+
+    def __bytes__(self) -> bytes:
+        return struct.pack("QQQ", self.blockSize, self.fileSize, self.version)
+
+    def __str__(self) -> str:
+        return " block size: {}, file size: {}, version: {} |".format(self.blockSize, self.fileSize, self.version)
+
+
+class ChunkStatusRequestLayer(LayerInterface):
+    """Chunk Status Request layer over RequestLayer, the hashes of chunks that the client asks if the server has"""
+
+    __slots__ = ("hashes",)
+
+    @staticmethod
+    def from_bytes(data: bytes | memoryview, offset: int) -> ChunkStatusRequestLayer:
+        hashesAmount = struct.unpack_from("I", data, offset)[0]
+        offset += struct.calcsize("I")
+        # the amount is checked before the allocation of the list
+        if hashesAmount > (len(data) - offset) // 16:
+            raise ValueError("The chunk status request has {} hashes, more then its data".format(hashesAmount))
+        hashes = [bytes(data[offset + i * 16 : offset + (i + 1) * 16]) for i in range(hashesAmount)]
+
+        return ChunkStatusRequestLayer(hashes)
+
+    def __init__(self, hashes: list[bytes]) -> None:
+        """
+
+        Args:
+            hashes (list[bytes]): hashes (16 bytes) of the chunks
+        """
+        self.hashes = hashes
+
+    def __len__(self) -> int:
+        return struct.calcsize("I") + 16 * len(self.hashes)
+
+    def __bytes__(self) -> bytes:
+        return struct.pack("I", len(self.hashes)) + b"".join(self.hashes)
+
+    def __str__(self) -> str:
+        return " chunks: {} |".format(len(self.hashes))
+
+
+class ChunkStatusResponseLayer(LayerInterface):
+    """Chunk Status Response layer over ResponseLayer, which chunks of the request the server has"""
+
+    __slots__ = ("stored",)
+
+    @staticmethod
+    def from_bytes(data: bytes | memoryview, offset: int) -> ChunkStatusResponseLayer:
+        chunksAmount = struct.unpack_from("I", data, offset)[0]
+        offset += struct.calcsize("I")
+        bitmap = data[offset : offset + (chunksAmount + 7) // 8]
+
+        return ChunkStatusResponseLayer([bool(bitmap[i // 8] & (1 << (i % 8))) for i in range(chunksAmount)])
+
+    def __init__(self, stored: list[bool]) -> None:
+        """
+
+        Args:
+            stored (list[bool]): for every chunk of the request, if the server has it
+        """
+        self.stored = stored
+
+    def __len__(self) -> int:
+        return struct.calcsize("I") + (len(self.stored) + 7) // 8
+
+    def __bytes__(self) -> bytes:
+        bitmap = bytearray((len(self.stored) + 7) // 8)
+        for i, stored in enumerate(self.stored):
+            if stored:
+                bitmap[i // 8] |= 1 << (i % 8)
+        return struct.pack("I", len(self.stored)) + bytes(bitmap)
+
+    def __str__(self) -> str:
+        return " chunks: {}, stored: {} |".format(len(self.stored), sum(self.stored))
+
+
+class ChunkUploadRequestLayer(LayerInterface):
+    """Chunk Upload Request layer after UploadRequestLayer, the uploaded data is the chunks of the file,
+    the chunks that the server has are sended by their hash only"""
+
+    __slots__ = ("chunkSize", "fileSize", "fileHash")
+
+    @staticmethod
+    def from_bytes(data: bytes | memoryview, offset: int) -> ChunkUploadRequestLayer:
+        chunkSize, fileSize, fileHash = struct.unpack_from("QQ16s", data, offset)
+        return ChunkUploadRequestLayer(chunkSize, fileSize, fileHash)
+
+    def __init__(self, chunkSize: int, fileSize: int, fileHash: bytes) -> None:
+        """
+
+        Args:
+            chunkSize (int): size of the chunks, the last chunk can be shorter
+            fileSize (int): size of the file
+            fileHash (bytes): hash (16 bytes) of the file
+        """
+        self.chunkSize = chunkSize
+        self.fileSize = fileSize
+        self.fileHash = fileHash
+
+    def __len__(self) -> int:
+        return struct.calcsize("QQ16s")
+
+    def __bytes__(self) -> bytes:
+        return struct.pack("QQ16s", self.chunkSize, self.fileSize, self.fileHash)
+
+    def __str__(self) -> str:
+        return " chunk size: {}, file size: {} |".format(self.chunkSize, self.fileSize)
 
 
 class DownloadRequestLayer(LayerInterface):
     """Download file Request layer over RequestLayer"""
 
+    __slots__ = ("path", "offset", "length")
+
     @staticmethod
-    def from_bytes(data: bytes, offset: int) -> DownloadRequestLayer:
+    def from_bytes(data: bytes | memoryview, offset: int) -> DownloadRequestLayer:
         filePathLength = struct.unpack_from("I", data, offset)[0]
         offset += struct.calcsize("I")
         filePath = data[offset : offset + filePathLength]
         offset += filePathLength
 
-        return DownloadRequestLayer(bytes.decode(filePath))
+        rangeOffset, rangeLength = struct.unpack_from("QQ", data, offset)
+        offset += struct.calcsize("QQ")
+
+        return DownloadRequestLayer(str(filePath, "utf-8"), rangeOffset, rangeLength)
 
-    def __init__(self, filePath: str) -> None:
+    def __init__(self, filePath: str, offset: int = 0, length: int = 0) -> None:
         """
 
         Args:
             filePath (str): file path on the server
+            offset (int, optional): offset in the file of the requested range. Defaults to 0.
+            length (int, optional): length of the requested range. Defaults to 0 - until the end of the file.
         """
         self.path = filePath
+        self.offset = offset
+        self.length = length
 
     def __len__(self) -> int:
-        return struct.calcsize("I") + len(self.path)
+        return len(pack_path(self.path)) + struct.calcsize("QQ")
 
     def __bytes__(self) -> bytes:
-        return struct.pack("I", len(self.path)) + self.path.encode()
+        return pack_path(self.path) + struct.pack("QQ", self.offset, self.length)
 
     def __str__(self) -> str:
-        return " file path: {} |".format(self.path)
+        return " file path: {}, offset: {}, length: {} |".format(self.path, self.offset, self.length)
+
+
+class DownloadResponseLayer(LayerInterface):
+    """Download Response layer over ResponseLayer, the range that the server granted"""
+
+    __slots__ = ("ranged", "offset", "fileSize")
+
+    @staticmethod
+    def from_bytes(data: bytes | memoryview, offset: int) -> DownloadResponseLayer:
+        ranged, rangeOffset, fileSize = struct.unpack_from("?QQ", data, offset)
+        offset += struct.calcsize("?QQ")
+
+        return DownloadResponseLayer(ranged, rangeOffset, fileSize)
+
+    def __init__(self, ranged: bool, offset: int, fileSize: int) -> None:
+        """
+
+        Args:
+            ranged (bool): true if the server serves ranges of the target, the archives of directories are whole
+            offset (int): offset in the file of the sended range
+            fileSize (int): full size of the file
+        """
+        self.ranged = ranged
+        self.offset = offset
+        self.fileSize = fileSize
+
+    def __len__(self) -> int:
+        return struct.calcsize("?QQ")
+
+    def __bytes__(self) -> bytes:
+        return struct.pack("?QQ", self.ranged, self.offset, self.fileSize)
+
+    def __str__(self) -> str:
+        return " ranged: {}, offset: {}, file size: {} |".format(self.ranged, self.offset, self.fileSize)
 
 
 class ListRequestLayer(LayerInterface):
     """List Request layer over RequestLayer"""
 
+    __slots__ = ("path", "recursive")
+
     @staticmethod
-    def from_bytes(data: bytes, offset: int) -> ListRequestLayer:
+    def from_bytes(data: bytes | memoryview, offset: int) -> ListRequestLayer:
         directoryPathLength = struct.unpack_from("I", data, offset)[0]
         offset += struct.calcsize("I")
         directoryPath = data[offset : offset + directoryPathLength]
@@ -342,7 +815,7 @@ class ListRequestLayer(LayerInterface):
         recursive = struct.unpack_from("?", data, offset)[0]
         offset += struct.calcsize("?")
 
-        return ListRequestLayer(bytes.decode(directoryPath), recursive)
+        return ListRequestLayer(str(directoryPath, "utf-8"), recursive)
 
     def __init__(self, directoryPath: str, recursive: bool) -> None:
         """
@@ -355,10 +828,10 @@ class ListRequestLayer(LayerInterface):
         self.recursive = recursive
 
     def __len__(self) -> int:
-        return struct.calcsize("I") + len(self.path) + struct.calcsize("?")
+        return len(pack_path(self.path)) + struct.calcsize("?")
 
     def __bytes__(self) -> bytes:
-        return struct.pack("I", len(self.path)) + self.path.encode() + struct.pack("?", self.recursive)
+        return pack_path(self.path) + struct.pack("?", self.recursive)
 
     def __str__(self) -> str:
         return " directory path: {}, recursive: {} |".format(self.path, self.recursive)
@@ -367,14 +840,16 @@ class ListRequestLayer(LayerInterface):
 class DeleteRequestLayer(LayerInterface):
     """Delete Request layer over RequestLayer"""
 
+    __slots__ = ("path",)
+
     @staticmethod
-    def from_bytes(data: bytes, offset: int) -> DeleteRequestLayer:
+    def from_bytes(data: bytes | memoryview, offset: int) -> DeleteRequestLayer:
         targetPathLength = struct.unpack_from("I", data, offset)[0]
         offset += struct.calcsize("I")
         targetPath = data[offset : offset + targetPathLength]
         offset += targetPathLength
 
-        return DeleteRequestLayer(bytes.decode(targetPath))
+        return DeleteRequestLayer(str(targetPath, "utf-8"))
 
     def __init__(self, targetPath: str) -> None:
         """
@@ -385,10 +860,10 @@ class DeleteRequestLayer(LayerInterface):
         self.path = targetPath
 
     def __len__(self) -> int:
-        return struct.calcsize("I") + len(self.path)
+        return len(pack_path(self.path))
 
     def __bytes__(self) -> bytes:
-        return struct.pack("I", len(self.path)) + self.path.encode()
+        return pack_path(self.path)
 
     def __str__(self) -> str:
         return " target path: {} |".format(self.path)
@@ -397,8 +872,10 @@ class DeleteRequestLayer(LayerInterface):
 class DeleteResponseLayer(LayerInterface):
     """Delete Response layer over ResponseLayer"""
 
+    __slots__ = ("isFile",)
+
     @staticmethod
-    def from_bytes(data: bytes, offset: int) -> DeleteResponseLayer:
+    def from_bytes(data: bytes | memoryview, offset: int) -> DeleteResponseLayer:
         isFile = struct.unpack_from("?", data, offset)[0]
         offset += struct.calcsize("?")
 
@@ -447,12 +924,7 @@ def pack_directory_block(directoryName: str, updatedAt: float) -> bytes:
     Returns:
         bytes: as bytes
     """
-    return (
-        struct.pack("?", True)
-        + struct.pack("I", len(directoryName))
-        + directoryName.encode()
-        + struct.pack("d", updatedAt)
-    )
+    return struct.pack("?", True) + pack_path(directoryName) + struct.pack("d", updatedAt)
 
 
 def unpack_directory_block(data: bytes, offset: int) -> tuple[tuple[str, float], int]:
@@ -489,12 +961,7 @@ def pack_file_block(fileName: str, updatedAt: float, fileSize: int) -> bytes:
     Returns:
         bytes: as bytes
     """
-    return (
-        struct.pack("?", False)
-        + struct.pack("I", len(fileName))
-        + fileName.encode()
-        + struct.pack("dQ", updatedAt, fileSize)
-    )
+    return struct.pack("?", False) + pack_path(fileName) + struct.pack("dQ", updatedAt, fileSize)
 
 
 def unpack_file_block(data: bytes, offset: int) -> tuple[tuple[str, float, int], int]:
@@ -525,12 +992,33 @@ def unpack_file_block(data: bytes, offset: int) -> tuple[tuple[str, float, int],
 class Pocket:
     """Represent a single pocket"""
 
+    __slots__ = (
+        "basicLayer",
+        "requestLayer",
+        "responseLayer",
+        "segmentLayer",
+        "akcLayer",
+        "sackLayer",
+        "uploadRequestLayer",
+        "downloadRequestLayer",
+        "listRequestLayer",
+        "deleteRequestLayer",
+        "deleteResponseLayer",
+        "downloadResponseLayer",
+        "uploadStatusResponseLayer",
+        "deltaUploadRequestLayer",
+        "signatureResponseLayer",
+        "chunkStatusRequestLayer",
+        "chunkStatusResponseLayer",
+        "chunkUploadRequestLayer",
+    )
+
     @staticmethod
-    def from_bytes(data: bytes) -> Pocket:
-        """Load pocket from bytes
+    def from_bytes(data: bytes | memoryview) -> Pocket:
+        """Load pocket from bytes, the segment data of memoryview pocket is a view into it
 
         Args:
-            data (bytes): pocket as bytes
+            data (bytes | memoryview): pocket as bytes
 
         Returns:
             Pocket: the pocket
@@ -544,25 +1032,48 @@ class Pocket:
         if basicLayer.pocketType == PocketType.Request:
             pocket.requestLayer = RequestLayer.from_bytes(data, offset)
             offset += len(pocket.requestLayer)
-            if basicLayer.pocketSubType == PocketSubType.Upload:
+            if basicLayer.pocketSubType in [
+                PocketSubType.Upload,
+                PocketSubType.UploadStatus,
+                PocketSubType.Signature,
+                PocketSubType.DeltaUpload,
+                PocketSubType.ChunkUpload,
+            ]:
                 pocket.uploadRequestLayer = UploadRequestLayer.from_bytes(data, offset)
+                offset += len(pocket.uploadRequestLayer)
+                if basicLayer.pocketSubType == PocketSubType.DeltaUpload:
+                    pocket.deltaUploadRequestLayer = DeltaUploadRequestLayer.from_bytes(data, offset)
+                elif basicLayer.pocketSubType == PocketSubType.ChunkUpload:
+                    pocket.chunkUploadRequestLayer = ChunkUploadRequestLayer.from_bytes(data, offset)
             elif basicLayer.pocketSubType == PocketSubType.Download:
                 pocket.downloadRequestLayer = DownloadRequestLayer.from_bytes(data, offset)
             elif basicLayer.pocketSubType == PocketSubType.List:
                 pocket.listRequestLayer = ListRequestLayer.from_bytes(data, offset)
             elif basicLayer.pocketSubType == PocketSubType.Delete:
                 pocket.deleteRequestLayer = DeleteRequestLayer.from_bytes(data, offset)
+            elif basicLayer.pocketSubType == PocketSubType.ChunkStatus:
+                pocket.chunkStatusRequestLayer = ChunkStatusRequestLayer.from_bytes(data, offset)
 
         elif basicLayer.pocketType == PocketType.Response:
             pocket.responseLayer = ResponseLayer.from_bytes(data, offset)
             offset += len(pocket.responseLayer)
             if basicLayer.pocketSubType == PocketSubType.Delete:
                 pocket.deleteResponseLayer = DeleteResponseLayer.from_bytes(data, offset)
+            elif basicLayer.pocketSubType == PocketSubType.Download:
+                pocket.downloadResponseLayer = DownloadResponseLayer.from_bytes(data, offset)
+            elif basicLayer.pocketSubType == PocketSubType.UploadStatus:
+                pocket.uploadStatusResponseLayer = UploadStatusResponseLayer.from_bytes(data, offset)
+            elif basicLayer.pocketSubType == PocketSubType.Signature:
+                pocket.signatureResponseLayer = SignatureResponseLayer.from_bytes(data, offset)
+            elif basicLayer.pocketSubType == PocketSubType.ChunkStatus:
+                pocket.chunkStatusResponseLayer = ChunkStatusResponseLayer.from_bytes(data, offset)
 
         elif basicLayer.pocketType == PocketType.Segment:
             pocket.segmentLayer = SegmentLayer.from_bytes(data, offset)
         elif basicLayer.pocketType == PocketType.ACK:
             pocket.akcLayer = AKCLayer.from_bytes(data, offset)
+        elif basicLayer.pocketType == PocketType.SACK:
+            pocket.sackLayer = SACKLayer.from_bytes(data, offset)
 
         return pocket
 
@@ -577,6 +1088,7 @@ class Pocket:
         self.responseLayer: ResponseLayer | None = None
         self.segmentLayer: SegmentLayer | None = None
         self.akcLayer: AKCLayer | None = None
+        self.sackLayer: SACKLayer | None = None
 
         self.uploadRequestLayer: UploadRequestLayer | None = None
         self.downloadRequestLayer: DownloadRequestLayer | None = None
@@ -584,6 +1096,13 @@ class Pocket:
         self.deleteRequestLayer: DeleteRequestLayer | None = None
 
         self.deleteResponseLayer: DeleteResponseLayer | None = None
+        self.downloadResponseLayer: DownloadResponseLayer | None = None
+        self.uploadStatusResponseLayer: UploadStatusResponseLayer | None = None
+        self.deltaUploadRequestLayer: DeltaUploadRequestLayer | None = None
+        self.signatureResponseLayer: SignatureResponseLayer | None = None
+        self.chunkStatusRequestLayer: ChunkStatusRequestLayer | None = None
+        self.chunkStatusResponseLayer: ChunkStatusResponseLayer | None = None
+        self.chunkUploadRequestLayer: ChunkUploadRequestLayer | None = None
 
     def __bytes__(self) -> bytes:
         data = bytes(self.basicLayer)
@@ -592,20 +1111,38 @@ class Pocket:
             data += bytes(self.requestLayer)
             if self.uploadRequestLayer:
                 data += bytes(self.uploadRequestLayer)
+                if self.deltaUploadRequestLayer:
+                    data += bytes(self.deltaUploadRequestLayer)
+                elif self.chunkUploadRequestLayer:
+                    data += bytes(self.chunkUploadRequestLayer)
             elif self.downloadRequestLayer:
                 data += bytes(self.downloadRequestLayer)
             elif self.listRequestLayer:
                 data += bytes(self.listRequestLayer)
             elif self.deleteRequestLayer:
                 data += bytes(self.deleteRequestLayer)
+            elif self.chunkStatusRequestLayer:
+                data += bytes(self.chunkStatusRequestLayer)
         elif self.responseLayer:
             data += bytes(self.responseLayer)
             if self.deleteResponseLayer:
                 data += bytes(self.deleteResponseLayer)
+            elif self.downloadResponseLayer:
+                data += bytes(self.downloadResponseLayer)
+            elif self.uploadStatusResponseLayer:
+                data += bytes(self.uploadStatusResponseLayer)
+            elif self.signatureResponseLayer:
+                data += bytes(self.signatureResponseLayer)
+            elif self.chunkStatusResponseLayer:
+                data += bytes(self.chunkStatusResponseLayer)
         elif self.segmentLayer:
-            data += bytes(self.segmentLayer)
+            # single copy of the segment content
+            segmentHeader = SEGMENT_LAYER_STRUCT.pack(self.segmentLayer.segmentID, len(self.segmentLayer.data))
+            return b"".join((data, segmentHeader, self.segmentLayer.data))
         elif self.akcLayer:
             data += bytes(self.akcLayer)
+        elif self.sackLayer:
+            data += bytes(self.sackLayer)
 
         return data
 
@@ -616,19 +1153,144 @@ class Pocket:
             ret += str(self.requestLayer)
             if self.uploadRequestLayer:
                 ret += str(self.uploadRequestLayer)
+                if self.deltaUploadRequestLayer:
+                    ret += str(self.deltaUploadRequestLayer)
+                elif self.chunkUploadRequestLayer:
+                    ret += str(self.chunkUploadRequestLayer)
             elif self.downloadRequestLayer:
                 ret += str(self.downloadRequestLayer)
             elif self.listRequestLayer:
                 ret += str(self.listRequestLayer)
             elif self.deleteRequestLayer:
                 ret += str(self.deleteRequestLayer)
+            elif self.chunkStatusRequestLayer:
+                ret += str(self.chunkStatusRequestLayer)
         elif self.responseLayer:
             ret += str(self.responseLayer)
             if self.deleteResponseLayer:
                 ret += str(self.deleteResponseLayer)
+            elif self.downloadResponseLayer:
+                ret += str(self.downloadResponseLayer)
+            elif self.uploadStatusResponseLayer:
+                ret += str(self.uploadStatusResponseLayer)
+            elif self.signatureResponseLayer:
+                ret += str(self.signatureResponseLayer)
+            elif self.chunkStatusResponseLayer:
+                ret += str(self.chunkStatusResponseLayer)
         elif self.segmentLayer:
             ret += str(self.segmentLayer)
         elif self.akcLayer:
             ret += str(self.akcLayer)
+        elif self.sackLayer:
+            ret += str(self.sackLayer)
 
         return ret
+
+
+class PocketView:
+    """Lazy view of received pocket for the transfer hot paths, the fields decoded on demand without layer objects.
+    The segment content is a view of the pocket data, so the view valid only while the data not reused."""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes | memoryview) -> None:
+        """
+
+        Args:
+            data (bytes | memoryview): the pocket as bytes
+        """
+        self.data = memoryview(data)
+
+    # the enums by value, faster than the enum lookup
+    POCKET_TYPES = tuple(PocketType)
+    POCKET_SUB_TYPES = tuple(PocketSubType)
+
+    @property
+    def pocketType(self) -> PocketType:
+        return self.POCKET_TYPES[self.data[0]]
+
+    @property
+    def pocketSubType(self) -> PocketSubType:
+        return self.POCKET_SUB_TYPES[self.data[1]]
+
+    @property
+    def requestID(self) -> int:
+        return int(BASIC_LAYER_STRUCT.unpack_from(self.data)[2])
+
+    def get_segment(self) -> tuple[int, memoryview]:
+        """Decode segment pocket
+
+        Returns:
+            tuple[int, memoryview]: the first segment ID and view of the segments content
+        """
+        segmentID, segmentLength = SEGMENT_LAYER_STRUCT.unpack_from(self.data, BASIC_LAYER_STRUCT.size)
+        offset = BASIC_LAYER_STRUCT.size + SEGMENT_LAYER_STRUCT.size
+        return (segmentID, self.data[offset : offset + segmentLength])
+
+    def get_sack_layer(self) -> SACKLayer | None:
+        """Decode the SACK layer
+
+        Returns:
+            SACKLayer | None: the layer if it is SACK pocket
+        """
+        if self.data[0] != PocketType.SACK:
+            return None
+        return SACKLayer.from_bytes(self.data, BASIC_LAYER_STRUCT.size)
+
+    def to_pocket(self) -> Pocket:
+        """Decode all the layers, for the pockets that not in the hot paths
+
+        Returns:
+            Pocket: the pocket
+        """
+        return Pocket.from_bytes(self.data)
+
+
+class SegmentEncoder:
+    """Encoder of the segment pockets of request for the senders, the headers packed into reusable buffer
+    and the segments content sent after them by scatter / gather, so the content never copied"""
+
+    __slots__ = ("requestID", "_buffer", "_offset")
+
+    def __init__(self, requestID: int, capacity: int = 64) -> None:
+        """
+
+        Args:
+            requestID (int): the request ID
+            capacity (int, optional): amount of headers in the buffer. Defaults to 64.
+        """
+        self.requestID = requestID
+        self._buffer = memoryview(bytearray(SEGMENT_HEADER_STRUCT.size * capacity))
+        self._offset = 0
+
+    def encode(self, segmentID: int, segment: bytes | memoryview) -> tuple[memoryview, bytes | memoryview]:
+        """Encode segment pocket, the header valid until the encoder reset
+
+        Args:
+            segmentID (int): the first segment ID
+            segment (bytes | memoryview): the segments content
+
+        Returns:
+            tuple[memoryview, bytes | memoryview]: the parts of the pocket - the header and the content
+        """
+        if self._offset + SEGMENT_HEADER_STRUCT.size > len(self._buffer):
+            # the headers in the buffer are not sent yet
+            self._buffer = memoryview(bytearray(len(self._buffer) * 2))
+            self._offset = 0
+
+        SEGMENT_HEADER_STRUCT.pack_into(
+            self._buffer,
+            self._offset,
+            PocketType.Segment,
+            PocketSubType.Unknown,
+            self.requestID,
+            segmentID,
+            len(segment),
+        )
+        header = self._buffer[self._offset : self._offset + SEGMENT_HEADER_STRUCT.size]
+        self._offset += SEGMENT_HEADER_STRUCT.size
+        return (header, segment)
+
+    def reset(self) -> None:
+        """Reuse the buffer, must be called only after the encoded pockets sent"""
+        self._offset = 0
@@ -1,24 +1,93 @@
 # network interface from app and client
 
+import asyncio
+import errno
+import select
 import socket
+import struct
+import sys
+import threading
 from abc import ABC, abstractmethod
+from collections import deque
 
 from src.lib.config import config
 
+# Linux UDP offload options, not exported by the socket module
+UDP_SEGMENT = 103
+UDP_GRO = 104
+UDP_MAX_SEGMENTS = 64
+UDP_GSO_MAX_SIZE = 65000  # [byte] max size of the datagrams of a single send
+UDP_GRO_BUFFER_SIZE = 65535  # [byte]
+
+# the parts of a datagram, sent together by scatter / gather
+Datagram = tuple[bytes | memoryview, ...]
+
+
+class ReceiveRing:
+    """Preallocated receive buffers that reused in turn, so receiving allocates no data buffers"""
+
+    def __init__(self, buffersAmount: int, bufferSize: int) -> None:
+        """
+
+        Args:
+            buffersAmount (int): amount of buffers, a view of buffer is valid until the ring wraps
+            bufferSize (int): size of each buffer
+        """
+        self._buffers = [memoryview(bytearray(bufferSize)) for _ in range(buffersAmount)]
+        self._index = 0
+
+    def next(self) -> memoryview:
+        """Return the next buffer of the ring
+
+        Returns:
+            memoryview: the buffer
+        """
+        buffer = self._buffers[self._index]
+        self._index = (self._index + 1) % len(self._buffers)
+        return buffer
+
 
 class NetworkConnection(ABC):
     @abstractmethod
-    def init(self, hostAddress: tuple[str, int]) -> None:
+    def init(self, hostAddress: tuple[str, int], reusePort: bool = False) -> None:
         ...
 
     @abstractmethod
     def sendto(self, data: bytes, clientAddress: tuple[str, int]) -> None:
         ...
 
+    def sendto_many(self, datagrams: list[Datagram], address: tuple[str, int]) -> None:
+        """Send datagrams to the same address
+
+        Args:
+            datagrams (list[Datagram]): the datagrams, every datagram is the list of its parts
+            address (tuple[str, int]): the address
+        """
+        for datagram in datagrams:
+            self.sendto(b"".join(datagram), address)
+
     @abstractmethod
     def recvfrom(self) -> tuple[bytes, tuple[str, int]]:
         ...
 
+    def recvfrom_view(self) -> tuple[memoryview, tuple[str, int]]:
+        """Receive datagram into buffer of the connection
+
+        Returns:
+            tuple[memoryview, tuple[str, int]]: view of the datagram, valid until
+                config.SOCKET_RECEIVE_BUFFERS more receives, and the address
+        """
+        data, address = self.recvfrom()
+        return (memoryview(data), address)
+
+    @abstractmethod
+    def has_data(self, timeout: float = 0) -> bool:
+        ...
+
+    @abstractmethod
+    def fileno(self) -> int:
+        ...
+
     @abstractmethod
     def close(self) -> None:
         ...
@@ -27,19 +96,121 @@ class NetworkConnection(ABC):
 class UDPConnection(NetworkConnection):
     interfceSocket: socket.socket = ...  # type: ignore[assignment]
 
-    def init(self, hostAddress: tuple[str, int]) -> None:
+    def init(self, hostAddress: tuple[str, int], reusePort: bool = False, offload: bool = True) -> None:
+        """
+
+        Args:
+            hostAddress (tuple[str, int]): the address to bind
+            reusePort (bool, optional): share the port with other sockets. Defaults to False.
+            offload (bool, optional): use GSO and GRO if the kernel supports them,
+                the socket must be read only by recvfrom. Defaults to True.
+        """
         self.interfceSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # datagrams of coalesced buffer that not returned yet
+        self._received: deque[tuple[memoryview, tuple[str, int]]] = deque()
+        self._gso = offload and config.SOCKET_OFFLOAD and sys.platform == "linux"
+        self._gro = False
 
         self.interfceSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reusePort:
+            # the kernel balances the datagrams between the sockets of the port by the client address
+            self.interfceSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.interfceSocket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, config.SOCKET_BUFFER_SIZE)
+        self.interfceSocket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, config.SOCKET_BUFFER_SIZE)
+        if self._gso:
+            try:
+                self.interfceSocket.setsockopt(socket.IPPROTO_UDP, UDP_GRO, 1)
+                self._gro = True
+            except OSError:
+                # old kernel, every datagram received alone
+                pass
         self.interfceSocket.bind(hostAddress)
         self.interfceSocket.setblocking(True)
         self.interfceSocket.settimeout(config.SOCKET_TIMEOUT)
 
+        self._ring = ReceiveRing(
+            config.SOCKET_RECEIVE_BUFFERS, UDP_GRO_BUFFER_SIZE if self._gro else config.SOCKET_MAXSIZE
+        )
+
     def sendto(self, data: bytes, address: tuple[str, int]) -> None:
         self.interfceSocket.sendto(data, address)
 
+    def sendto_many(self, datagrams: list[Datagram], address: tuple[str, int]) -> None:
+        sizes = [sum(len(part) for part in datagram) for datagram in datagrams]
+        i = 0
+        while i < len(datagrams):
+            # the kernel splits the buffer into datagrams of the size of the first, only the last can be smaller
+            size = sizes[i]
+            total = size
+            j = i + 1
+            while (
+                self._gso
+                and j < len(datagrams)
+                and j - i < UDP_MAX_SEGMENTS
+                and sizes[j] <= size
+                and total + sizes[j] <= UDP_GSO_MAX_SIZE
+            ):
+                total += sizes[j]
+                j += 1
+                if sizes[j - 1] < size:
+                    break
+
+            if j - i == 1:
+                # the parts gathered by the kernel
+                self.interfceSocket.sendmsg(datagrams[i], [], 0, address)
+                i += 1
+                continue
+
+            try:
+                self.interfceSocket.sendmsg(
+                    [part for datagram in datagrams[i:j] for part in datagram],
+                    [(socket.IPPROTO_UDP, UDP_SEGMENT, struct.pack("H", size))],
+                    0,
+                    address,
+                )
+                i = j
+            except OSError as e:
+                if e.errno not in [errno.EINVAL, errno.EIO, errno.ENOPROTOOPT, errno.EOPNOTSUPP, errno.EMSGSIZE]:
+                    raise
+                # the kernel or the device not supports GSO, fall back to datagram per send
+                self._gso = False
+
     def recvfrom(self) -> tuple[bytes, tuple[str, int]]:
-        return self.interfceSocket.recvfrom(config.SOCKET_MAXSIZE)
+        data, address = self.recvfrom_view()
+        return (bytes(data), address)
+
+    def recvfrom_view(self) -> tuple[memoryview, tuple[str, int]]:
+        if len(self._received) > 0:
+            return self._received.popleft()
+
+        buffer = self._ring.next()
+        if not self._gro:
+            size, address = self.interfceSocket.recvfrom_into(buffer)
+            return (buffer[:size], address)
+
+        size, ancillary, _, address = self.interfceSocket.recvmsg_into(
+            [buffer], socket.CMSG_SPACE(struct.calcsize("i"))
+        )
+        segmentSize = 0
+        for level, type, value in ancillary:
+            if level == socket.IPPROTO_UDP and type == UDP_GRO:
+                segmentSize = struct.unpack("i", value[: struct.calcsize("i")])[0]
+
+        if segmentSize <= 0 or size <= segmentSize:
+            return (buffer[:size], address)
+
+        # split the coalesced datagrams, all of them are views of the same buffer
+        for offset in range(segmentSize, size, segmentSize):
+            self._received.append((buffer[offset : min(offset + segmentSize, size)], address))
+        return (buffer[:segmentSize], address)
+
+    def has_data(self, timeout: float = 0) -> bool:
+        if len(self._received) > 0:
+            return True
+        return len(select.select([self.interfceSocket], [], [], timeout)[0]) > 0
+
+    def fileno(self) -> int:
+        return self.interfceSocket.fileno()
 
     def close(self) -> None:
         self.interfceSocket.close()
@@ -49,18 +220,23 @@ class TCPConnection(NetworkConnection):
     recvSocket: socket.socket = ...  # type: ignore[assignment]
     hostAddress: tuple[str, int] = ...  # type: ignore[assignment]
 
-    def init(self, hostAddress: tuple[str, int]) -> None:
+    def init(self, hostAddress: tuple[str, int], reusePort: bool = False) -> None:
         self.hostAddress = hostAddress
 
         self.recvSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
         self.recvSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reusePort:
+            self.recvSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
         self.recvSocket.bind(hostAddress)
         self.recvSocket.setblocking(True)
         self.recvSocket.settimeout(config.SOCKET_TIMEOUT)
 
         self.recvSocket.listen(1)
 
+        # the port of the sender and the pocket
+        self._ring = ReceiveRing(config.SOCKET_RECEIVE_BUFFERS, config.SOCKET_MAXSIZE + 2)
+
     def sendto(self, data: bytes, address: tuple[str, int]) -> None:
         sendSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
@@ -81,11 +257,22 @@ class TCPConnection(NetworkConnection):
             sendSocket.close()
 
     def recvfrom(self) -> tuple[bytes, tuple[str, int]]:
+        data, address = self.recvfrom_view()
+        return (bytes(data), address)
+
+    def recvfrom_view(self) -> tuple[memoryview, tuple[str, int]]:
         error: OSError | None = None
         conn: socket.socket | None = None
+        buffer = self._ring.next()
+        size = 0
         try:
             conn, originAddress = self.recvSocket.accept()
-            data = conn.recv(config.SOCKET_MAXSIZE + 2)
+            chunkSize = conn.recv_into(buffer)
+            while chunkSize and size + chunkSize < len(buffer):
+                # the sender closes the connection after the pocket
+                size += chunkSize
+                chunkSize = conn.recv_into(buffer[size:])
+            size += chunkSize
         except socket.error as ex:
             error = ex
         finally:
@@ -96,22 +283,64 @@ class TCPConnection(NetworkConnection):
             raise error
 
         # exclude the port from the packet
-        port = int.from_bytes(data[0:2], byteorder="big")
-        data = data[2:]
+        port = int.from_bytes(buffer[0:2], byteorder="big")
         address = (originAddress[0], port)
 
-        return (data, address)
+        return (buffer[2:size], address)
+
+    def has_data(self, timeout: float = 0) -> bool:
+        return len(select.select([self.recvSocket], [], [], timeout)[0]) > 0
+
+    def fileno(self) -> int:
+        return self.recvSocket.fileno()
 
     def close(self) -> None:
         self.recvSocket.close()
 
 
-def create_network_connection(hostAddress: tuple[str, int]) -> NetworkConnection:
+class DatagramTransportConnection(NetworkConnection):
+    """Sending side of asyncio datagram transport, the datagrams are received by its protocol"""
+
+    def __init__(self, transport: asyncio.DatagramTransport, loop: asyncio.AbstractEventLoop) -> None:
+        """Must be created in the thread of the event loop
+
+        Args:
+            transport (asyncio.DatagramTransport): the transport
+            loop (asyncio.AbstractEventLoop): the event loop of the transport
+        """
+        self.transport = transport
+        self._loop = loop
+        self._loopThreadID = threading.get_ident()
+
+    def init(self, hostAddress: tuple[str, int], reusePort: bool = False) -> None:
+        ...
+
+    def sendto(self, data: bytes, address: tuple[str, int]) -> None:
+        if threading.get_ident() == self._loopThreadID:
+            self.transport.sendto(data, address)
+        else:
+            # the transport is not thread safe
+            self._loop.call_soon_threadsafe(self.transport.sendto, data, address)
+
+    def recvfrom(self) -> tuple[bytes, tuple[str, int]]:
+        raise OSError("The datagrams are received by the protocol")
+
+    def has_data(self, timeout: float = 0) -> bool:
+        return False
+
+    def fileno(self) -> int:
+        return self.transport.get_extra_info("socket").fileno()
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+def create_network_connection(hostAddress: tuple[str, int], reusePort: bool = False) -> NetworkConnection:
     if config.TCP_MODE:
         tcpConnection = TCPConnection()
-        tcpConnection.init(hostAddress)
+        tcpConnection.init(hostAddress, reusePort)
         return tcpConnection
 
     udpConnection = UDPConnection()
-    udpConnection.init(hostAddress)
+    udpConnection.init(hostAddress, reusePort)
     return udpConnection
@@ -0,0 +1,465 @@
+# RUDP shared parts of the senders and the receivers
+
+from __future__ import annotations
+
+import logging
+import math
+import time
+from collections import deque
+from typing import Callable
+
+from src.lib.config import config
+from src.lib.congestion import create_congestion_control
+from src.lib.ftp import CongestionControlType, SACKLayer
+from src.lib.segments import SegmentsBitmap
+
+NS_PER_SEC = 1_000_000_000
+
+
+class SendWindow:
+    """Bookkeeping of the segments of a sender, every operation is O(1) or amortized O(1)"""
+
+    def __init__(self, segmentsAmount: int, onAcked: Callable[[int], None] | None = None) -> None:
+        """
+
+        Args:
+            segmentsAmount (int): amount of segments to send
+            onAcked (Callable[[int], None] | None, optional): called with the segment ID of every new acked
+                segment. Defaults to None.
+        """
+        self.segmentsAmount = segmentsAmount
+        self._onAcked = onAcked
+        # segments that sended and not acked yet, segment ID -> send time, pocket sequence
+        self.sending: dict[int, tuple[float, int]] = {}
+        self.acked = SegmentsBitmap(segmentsAmount)
+        self.retransmitted = SegmentsBitmap(segmentsAmount)
+
+        # segments that needs to send again, can contains acked segments
+        self._toResend: deque[int] = deque()
+        # the first segment that never sended
+        self._nextSegmentID = 0
+        self._cumulative = 0
+        # sequence of the sended pockets, for detecting gaps in the acks
+        self._sequence = 0
+        self._lastAckedSequence = -1
+
+    def has_segments_to_send(self) -> bool:
+        """Check if exists segment that needs to send
+
+        Returns:
+            bool: true if exists
+        """
+        while len(self._toResend) > 0 and (self._toResend[0] in self.acked or self._toResend[0] in self.sending):
+            self._toResend.popleft()
+        # the segments that the receiver already has are never sended
+        self._nextSegmentID = self.acked.find(self._nextSegmentID, False)
+
+        return len(self._toResend) > 0 or self._nextSegmentID < self.segmentsAmount
+
+    def next_segments(self, now: float, maxAmount: int = 1) -> tuple[int, int]:
+        """Pop the next consecutive segments to send and mark them as sending, require has_segments_to_send
+
+        Args:
+            now (float): the send time
+            maxAmount (int, optional): max amount of segments. Defaults to 1.
+
+        Returns:
+            tuple[int, int]: first segment ID, amount of segments
+        """
+        self._sequence += 1
+        if len(self._toResend) > 0:
+            segmentID = self._toResend.popleft()
+            self.sending[segmentID] = (now, self._sequence)
+            amount = 1
+            while (
+                amount < maxAmount
+                and len(self._toResend) > 0
+                and self._toResend[0] == segmentID + amount
+                and self._toResend[0] not in self.acked
+                and self._toResend[0] not in self.sending
+            ):
+                self.sending[self._toResend.popleft()] = (now, self._sequence)
+                amount += 1
+            return (segmentID, amount)
+
+        segmentID = self._nextSegmentID
+        amount = 1
+        while amount < maxAmount and segmentID + amount < self.segmentsAmount and segmentID + amount not in self.acked:
+            amount += 1
+        for i in range(segmentID, segmentID + amount):
+            self.sending[i] = (now, self._sequence)
+        self._nextSegmentID += amount
+        return (segmentID, amount)
+
+    def skip(self, receivedRanges: list[tuple[int, int]]) -> None:
+        """Mark the segments that the receiver already has as acked, before the sending
+
+        Args:
+            receivedRanges (list[tuple[int, int]]): ranges of the received segments, start and end (exclusive)
+        """
+        for start, end in receivedRanges:
+            for segmentID in range(start, min(end, self.segmentsAmount)):
+                self.acked.add(segmentID)
+
+    def ack(self, segmentID: int) -> float | None:
+        """Mark segment as acked
+
+        Args:
+            segmentID (int): segment ID
+
+        Returns:
+            float | None: the send time if the segment was sending
+        """
+        if segmentID >= self.segmentsAmount or not self.acked.add(segmentID):
+            return None
+
+        if self._onAcked:
+            self._onAcked(segmentID)
+        sending = self.sending.pop(segmentID, None)
+        if sending is None:
+            return None
+
+        self._lastAckedSequence = max(self._lastAckedSequence, sending[1])
+        return sending[0]
+
+    def ack_sack(self, sackLayer: SACKLayer) -> tuple[int, float | None]:
+        """Mark all the segments of SACK as acked
+
+        Args:
+            sackLayer (SACKLayer): the SACK
+
+        Returns:
+            tuple[int, float | None]: amount of new acked segments,
+                the send time of the last segment that acked and never retransmitted (by Karn's rule)
+        """
+        amount = 0
+        lastSendTime: float | None = None
+
+        def ack_segment(segmentID: int) -> None:
+            nonlocal amount, lastSendTime
+            if segmentID in self.acked:
+                return None
+
+            sendTime = self.ack(segmentID)
+            amount += 1
+            if sendTime is not None and segmentID not in self.retransmitted:
+                if lastSendTime is None or lastSendTime < sendTime:
+                    lastSendTime = sendTime
+
+        cumulative = min(sackLayer.cumulative, self.segmentsAmount)
+        while self._cumulative < cumulative:
+            ack_segment(self._cumulative)
+            self._cumulative += 1
+
+        for start, end in sackLayer.ranges:
+            for segmentID in range(max(start, self._cumulative), min(end, self.segmentsAmount)):
+                ack_segment(segmentID)
+
+        return (amount, lastSendTime)
+
+    def oldest_send_time(self) -> float | None:
+        """Return the send time of the oldest sending segment
+
+        Returns:
+            float | None: the send time or None if there are no sending segments
+        """
+        for sendTime, _ in self.sending.values():
+            return sendTime
+        return None
+
+    def expire(self, sendedBefore: float) -> tuple[int, float]:
+        """Mark the sending segments that their timer expired as lost, they will be sended first
+
+        Args:
+            sendedBefore (float): segments that sended before it are expired
+
+        Returns:
+            tuple[int, float]: amount of the expired segments, the send time of the last expired segment
+        """
+        return self._lose(lambda sendTime, sequence: sendTime <= sendedBefore)
+
+    def detect_gaps(self, threshold: int) -> tuple[int, float]:
+        """Mark the sending segments as lost if pockets that sended at least threshold pockets after them acked
+
+        Args:
+            threshold (int): amount of acked pockets after a missing segment for being lost
+
+        Returns:
+            tuple[int, float]: amount of the lost segments, the send time of the last lost segment
+        """
+        return self._lose(lambda sendTime, sequence: sequence + threshold <= self._lastAckedSequence)
+
+    def _lose(self, isLost: Callable[[float, int], bool]) -> tuple[int, float]:
+        lost: list[int] = []
+        lastSendTime = 0.0
+        # the sending segments ordered by the send time
+        for segmentID, (sendTime, sequence) in self.sending.items():
+            if not isLost(sendTime, sequence):
+                break
+            lost.append(segmentID)
+            lastSendTime = sendTime
+
+        for segmentID in lost:
+            del self.sending[segmentID]
+            self.retransmitted.add(segmentID)
+        self._toResend.extendleft(reversed(lost))
+
+        return (len(lost), lastSendTime)
+
+    def is_complited(self) -> bool:
+        return self.acked.is_full()
+
+
+class RTTEstimator:
+    """Smoothed RTT and retransmission timeout estimation (RFC 6298)"""
+
+    def __init__(self) -> None:
+        self.srtt: float | None = None
+        self.rttvar = 0.0
+        self.rto = config.RTO_INITIAL
+
+    def sample(self, rtt: float) -> None:
+        """Update the estimation by RTT sample
+
+        Args:
+            rtt (float): RTT of a segment that never retransmitted
+        """
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+
+        self.rto = self.srtt + max(config.RTO_GRANULARITY, 4 * self.rttvar)
+        self.rto = min(max(self.rto, config.RTO_MIN), config.RTO_MAX)
+
+    def backoff(self) -> None:
+        """Double the retransmission timeout after timeout"""
+        self.rto = min(self.rto * 2, config.RTO_MAX)
+
+    def get_rtt(self) -> float:
+        if self.srtt is None:
+            return self.rto
+        return self.srtt
+
+
+class SegmentSizeProber:
+    """Probe the amount of segments in a single pocket, grow it while the loss is stable and back off when it goes up"""
+
+    def __init__(self, singleSegmentSize: int, maxSegmentSize: int) -> None:
+        """
+
+        Args:
+            singleSegmentSize (int): size of each segment
+            maxSegmentSize (int): max size of segments in a single pocket
+        """
+        self.maxAmount = max(maxSegmentSize // singleSegmentSize, 1)
+        self.amount = 1
+        self._lossRate: float | None = None
+        self._holdRounds = 0
+
+    def on_round(self, sendedAmount: int, lostAmount: int) -> None:
+        """Update the amount of segments in a pocket after window refresh
+
+        Args:
+            sendedAmount (int): amount of segments that sended in the round
+            lostAmount (int): amount of segments that lost in the round
+        """
+        if sendedAmount == 0:
+            return None
+
+        lossRate = lostAmount / sendedAmount
+        if self._lossRate is None:
+            self._lossRate = lossRate
+
+        if lossRate > self._lossRate + config.PROBE_LOSS_TOLERANCE:
+            # the loss goes up, back off
+            self.amount = max(self.amount // 2, 1)
+            self._holdRounds = config.PROBE_HOLD_ROUNDS
+        else:
+            self._lossRate = 0.875 * self._lossRate + 0.125 * lossRate
+            if self._holdRounds > 0:
+                self._holdRounds -= 1
+            else:
+                self.amount = min(self.amount * 2, self.maxAmount)
+
+
+class Pacer:
+    """Token bucket that spreads the sends of a window evenly over the RTT, the time is in nanoseconds
+    and the tokens in billionths of segment, so the time adds the tokens exactly in integers"""
+
+    def __init__(self, burst: int) -> None:
+        """
+
+        Args:
+            burst (int): max amount of segments that can be sended at once
+        """
+        self.rate = 0  # [segments / sec], not paced if 0
+        self.burst = burst
+        self._tokens = burst * NS_PER_SEC
+        self._lastTime: int | None = None
+
+    def _refill(self, now: int) -> None:
+        if self._lastTime is not None:
+            self._tokens = min(self._tokens + (now - self._lastTime) * self.rate, self.burst * NS_PER_SEC)
+        self._lastTime = now
+
+    def delay(self, amount: int, now: int) -> int:
+        """Return the time until the segments can be sended
+
+        Args:
+            amount (int): amount of segments to send
+            now (int): the current time of time.perf_counter_ns [ns]
+
+        Returns:
+            int: the delay [ns], 0 if the segments can be sended now
+        """
+        self._refill(now)
+        amount = min(amount, self.burst)
+        if self.rate <= 0 or self._tokens >= amount * NS_PER_SEC:
+            return 0
+        # rounded up, so the tokens are enough after the delay
+        return -((self._tokens - amount * NS_PER_SEC) // self.rate)
+
+    def consume(self, amount: int) -> None:
+        """Take tokens of sended segments
+
+        Args:
+            amount (int): amount of the sended segments
+        """
+        if self.rate > 0:
+            self._tokens -= amount * NS_PER_SEC
+
+
+class Sender:
+    """State machine of RUDP sender, the driver passes the SACKs and calls poll for sending the segments"""
+
+    def __init__(
+        self,
+        segmentsAmount: int,
+        singleSegmentSize: int,
+        maxSegmentSize: int,
+        sendSegments: Callable[[int, int], None],
+        congestionControl: CongestionControlType = CongestionControlType.Default,
+        onAcked: Callable[[int], None] | None = None,
+    ) -> None:
+        """
+
+        Args:
+            segmentsAmount (int): amount of segments to send
+            singleSegmentSize (int): size of each segment
+            maxSegmentSize (int): max size of consecutive segments in a single pocket
+            sendSegments (Callable[[int, int], None]): send consecutive segments - first segment ID, amount
+            congestionControl (CongestionControlType, optional): the congestion control algorithm.
+                Defaults to CongestionControlType.Default.
+            onAcked (Callable[[int], None] | None, optional): called with the segment ID of every new acked
+                segment, its content is not sended again. Defaults to None.
+        """
+        self.window = SendWindow(segmentsAmount, onAcked)
+        self.rtt = RTTEstimator()
+        self.prober = SegmentSizeProber(singleSegmentSize, maxSegmentSize)
+        self.congestion = create_congestion_control(congestionControl, config.CWND_START_VALUE)
+        self.pacer = Pacer(max(config.PACING_BURST, self.prober.maxAmount))
+        self._sendSegments = sendSegments
+        # all the sended segments, with the retransmissions
+        self.sendedAmount = 0
+
+        # losses of segments that sended before it are part of the last loss event
+        self._recoveryTime = 0.0
+
+        self._roundStart: float | None = None
+        self._roundSended = 0
+        self._roundLost = 0
+
+    def on_sack(self, sackLayer: SACKLayer, now: float) -> None:
+        """Handle SACK pocket
+
+        Args:
+            sackLayer (SACKLayer): the SACK
+            now (float): the current time
+        """
+        ackedAmount, sendTime = self.window.ack_sack(sackLayer)
+        rttSample: float | None = None
+        if sendTime is not None:
+            rttSample = now - sendTime
+            self.rtt.sample(rttSample)
+        if ackedAmount > 0:
+            self.congestion.on_ack(ackedAmount, rttSample, self.rtt.get_rtt(), now)
+
+        # fast retransmit the segments that later pockets acked after them
+        lostAmount, sendTime = self.window.detect_gaps(config.FAST_RETRANSMIT_THRESHOLD)
+        if lostAmount > 0:
+            self._on_loss(lostAmount, sendTime, now)
+
+    def poll(self, now: float, budget: float = math.inf) -> float:
+        """Retransmit the expired segments and send new segments while the window allows
+
+        Args:
+            now (float): the current time of time.perf_counter
+            budget (float, optional): max amount of segments to send, for schedulers of many senders.
+                Defaults to math.inf.
+
+        Returns:
+            float: time of the next timer, the current time if the budget limited the sending
+        """
+        if self._roundStart is None:
+            self._roundStart = now
+
+        # retransmit only the segments that their timer expired
+        expiredAmount, sendTime = self.window.expire(now - self.rtt.rto)
+        if expiredAmount > 0:
+            if sendTime > self._recoveryTime:
+                self.rtt.backoff()
+            self._on_loss(expiredAmount, sendTime, now)
+
+        if self._roundStart + self.rtt.get_rtt() <= now:
+            self._end_round(now)
+
+        # the first window paced over the initial RTO until the first RTT sample
+        self.pacer.rate = math.ceil(self.congestion.get_pacing_rate(self.rtt.get_rtt()))
+
+        deadline = self._roundStart + self.rtt.get_rtt()
+        sendedAmount = 0
+        while len(self.window.sending) < self.congestion.cwnd and self.window.has_segments_to_send():
+            if sendedAmount + self.prober.amount > budget:
+                deadline = now
+                break
+
+            delay = self.pacer.delay(self.prober.amount, time.perf_counter_ns())
+            if delay > 0:
+                deadline = min(deadline, now + delay / NS_PER_SEC)
+                break
+
+            segmentID, amount = self.window.next_segments(now, self.prober.amount)
+            self.pacer.consume(amount)
+            self._roundSended += amount
+            sendedAmount += amount
+            self._sendSegments(segmentID, amount)
+
+        self.sendedAmount += sendedAmount
+
+        oldestSendTime = self.window.oldest_send_time()
+        if oldestSendTime is not None:
+            deadline = min(deadline, oldestSendTime + self.rtt.rto)
+        return deadline
+
+    def _on_loss(self, lostAmount: int, sendTime: float, now: float) -> None:
+        self._roundLost += lostAmount
+        if sendTime > self._recoveryTime:
+            # new loss event, the segments that sended before now are part of it
+            self._recoveryTime = now
+            self.congestion.on_loss(now)
+
+    def _end_round(self, now: float) -> None:
+        logging.debug("refresh window {}/{}".format(self.window.acked.count, self.window.segmentsAmount))
+
+        self.prober.on_round(self._roundSended, self._roundLost)
+        self.congestion.on_round(now)
+
+        self._roundStart = now
+        self._roundSended = 0
+        self._roundLost = 0
+
+    def is_complited(self) -> bool:
+        return self.window.is_complited()
@@ -0,0 +1,645 @@
+# segments sources for the senders and sinks for the receivers
+
+from __future__ import annotations
+
+import fcntl
+import mmap
+import os
+import re
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from typing import BinaryIO
+
+from src.lib.compression import compress_chunk, decompress_chunk, get_executor
+from src.lib.config import config
+from src.lib.ftp import CompressionType
+
+# bytes of the bitmap with a missing / an existing segment
+NOT_FULL_BYTE = re.compile(rb"[^\xff]")
+NOT_EMPTY_BYTE = re.compile(rb"[^\x00]")
+
+
+class SegmentSource(ABC):
+    """Interface of the data that sended as segments"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Return the size in bytes of the data
+
+        Returns:
+            int: Size in bytes of the data
+        """
+        ...
+
+    @abstractmethod
+    def read(self, offset: int, length: int) -> bytes | memoryview:
+        """Return part of the data
+
+        Args:
+            offset (int): offset of the part
+            length (int): max length of the part
+
+        Returns:
+            bytes | memoryview: the part of the data
+        """
+        ...
+
+    def get_segment(self, segmentID: int, singleSegmentSize: int, amount: int = 1) -> bytes | memoryview:
+        """Return the content of consecutive segments
+
+        Args:
+            segmentID (int): the first segment ID
+            singleSegmentSize (int): size of each segment
+            amount (int, optional): amount of segments. Defaults to 1.
+
+        Returns:
+            bytes | memoryview: the segments content
+        """
+        return self.read(segmentID * singleSegmentSize, singleSegmentSize * amount)
+
+    def release(self, segmentID: int) -> None:
+        """Release the resources of segment that acked, it will not be requested again
+
+        Args:
+            segmentID (int): segment ID
+        """
+        ...
+
+    def close(self) -> None:
+        """Release the resources of the source"""
+        ...
+
+
+class BytesSegmentSource(SegmentSource):
+    """Segments source of data in the memory"""
+
+    def __init__(self, data: bytes) -> None:
+        """
+
+        Args:
+            data (bytes): the data
+        """
+        self._data = data
+        self._view = memoryview(data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def read(self, offset: int, length: int) -> bytes | memoryview:
+        return self._view[offset : offset + length]
+
+
+class FileSegmentSource(SegmentSource):
+    """Segments source of file on the disk, the file is mapped and never loaded into the memory"""
+
+    def __init__(self, file: BinaryIO, header: bytes = b"", offset: int = 0, length: int | None = None) -> None:
+        """
+
+        Args:
+            file (BinaryIO): file that opened for reading, the source will close it
+            header (bytes, optional): data that sended before the file content. Defaults to b"".
+            offset (int, optional): offset of the sended range in the file. Defaults to 0.
+            length (int | None, optional): length of the sended range. Defaults to None - until the end of the file.
+        """
+        self._file = file
+        self._header = header
+
+        self._file.seek(0, 2)
+        fileSize = self._file.tell()
+        offset = min(offset, fileSize)
+        self._fileSize = fileSize - offset if length is None else min(length, fileSize - offset)
+
+        self._mmap: mmap.mmap | None = None
+        if self._fileSize > 0:
+            # only the sended range is mapped, from the page that it starts in
+            mapOffset = offset - offset % mmap.ALLOCATIONGRANULARITY
+            self._mmap = mmap.mmap(
+                self._file.fileno(),
+                offset - mapOffset + self._fileSize,
+                access=mmap.ACCESS_READ,
+                offset=mapOffset,
+            )
+            self._mmap.madvise(mmap.MADV_SEQUENTIAL)
+            self._view = memoryview(self._mmap)[offset - mapOffset :]
+        else:
+            self._view = memoryview(b"")
+
+    def __len__(self) -> int:
+        return len(self._header) + self._fileSize
+
+    def read(self, offset: int, length: int) -> bytes | memoryview:
+        headerSize = len(self._header)
+        if offset >= headerSize:
+            return self._view[offset - headerSize : offset - headerSize + length]
+
+        # the part starts in the header
+        return self._header[offset : offset + length] + self._view[: max(offset + length - headerSize, 0)]
+
+    def close(self) -> None:
+        self._view.release()
+        if self._mmap:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # a segment still in use, the map will be closed by the garbage collector
+                pass
+        self._file.close()
+
+
+class CompressedSegmentSource(SegmentSource):
+    """Segments source that sends every segment as compressed chunk,
+    the next chunks are compressed on the worker threads before the sender needs them,
+    and the sended chunks are kept until they acked for the retransmissions"""
+
+    def __init__(self, source: SegmentSource, compression: CompressionType, singleSegmentSize: int) -> None:
+        """
+
+        Args:
+            source (SegmentSource): the source of the data, the source will close it
+            compression (CompressionType): the compression of the chunks
+            singleSegmentSize (int): size of each chunk before the compression
+        """
+        self.source = source
+        self._compression = compression
+        self._singleSegmentSize = singleSegmentSize
+        self._segmentsAmount = (len(source) + singleSegmentSize - 1) // singleSegmentSize
+        # the chunks that compressed ahead
+        self._chunks: dict[int, Future[bytes]] = {}
+        # the compressed chunks that sended and not acked yet
+        self._frames: dict[int, bytes] = {}
+        self._nextSegmentID = 0
+        # the first chunks tell if the data is compressible
+        self._probedAmount = 0
+
+    def __len__(self) -> int:
+        return len(self.source)
+
+    def read(self, offset: int, length: int) -> bytes | memoryview:
+        return self.source.read(offset, length)
+
+    def get_segment(self, segmentID: int, singleSegmentSize: int, amount: int = 1) -> bytes | memoryview:
+        frame = self._frames.get(segmentID)
+        if frame is not None:
+            return frame
+
+        if self._compression == CompressionType.Nothing:
+            return compress_chunk(self.source.get_segment(segmentID, self._singleSegmentSize), self._compression)
+
+        executor = get_executor()
+        self._nextSegmentID = max(self._nextSegmentID, segmentID)
+        while self._nextSegmentID < min(segmentID + config.COMPRESSION_AHEAD, self._segmentsAmount):
+            self._chunks[self._nextSegmentID] = executor.submit(
+                compress_chunk,
+                self.source.get_segment(self._nextSegmentID, self._singleSegmentSize),
+                self._compression,
+            )
+            self._nextSegmentID += 1
+
+        chunk = self._chunks.pop(segmentID, None)
+        if chunk is None:
+            # the chunk acked before, it is requested again only if the receiver lost it
+            return compress_chunk(self.source.get_segment(segmentID, self._singleSegmentSize), self._compression)
+
+        frame = chunk.result()
+        self._frames[segmentID] = frame
+        if self._probedAmount < config.COMPRESSION_PROBE_CHUNKS:
+            if frame[0] != CompressionType.Nothing:
+                self._probedAmount = config.COMPRESSION_PROBE_CHUNKS
+            else:
+                self._probedAmount += 1
+                if self._probedAmount == config.COMPRESSION_PROBE_CHUNKS:
+                    # the data is already compressed, the next chunks are sended as is
+                    self._compression = CompressionType.Nothing
+                    self._cancel_chunks()
+        return frame
+
+    def release(self, segmentID: int) -> None:
+        self._frames.pop(segmentID, None)
+
+    def close(self) -> None:
+        self._cancel_chunks()
+        self._frames.clear()
+        self.source.close()
+
+    def _cancel_chunks(self) -> None:
+        for chunk in self._chunks.values():
+            chunk.cancel()
+        self._chunks.clear()
+
+
+class SegmentsBitmap:
+    """Compact set of segment IDs, one bit per segment"""
+
+    @staticmethod
+    def from_bytes(segmentsAmount: int, data: bytes) -> SegmentsBitmap:
+        """Load bitmap that saved as bytes
+
+        Args:
+            segmentsAmount (int): amount of segments
+            data (bytes): the bits of the bitmap
+
+        Returns:
+            SegmentsBitmap: the bitmap
+        """
+        bitmap = SegmentsBitmap(segmentsAmount)
+        bitmap._bits[:] = data[: len(bitmap._bits)]
+        bitmap.count = int.from_bytes(bitmap._bits, "little").bit_count()
+        bitmap.firstMissing = bitmap.find(0, False)
+        return bitmap
+
+    def __init__(self, segmentsAmount: int) -> None:
+        """
+
+        Args:
+            segmentsAmount (int): amount of segments
+        """
+        self.segmentsAmount = segmentsAmount
+        self.count = 0
+        self.firstMissing = 0
+        self._bits = bytearray((segmentsAmount + 7) // 8)
+
+    def __bytes__(self) -> bytes:
+        return bytes(self._bits)
+
+    def __len__(self) -> int:
+        return self.segmentsAmount
+
+    def __contains__(self, segmentID: int) -> bool:
+        return bool(self._bits[segmentID >> 3] & (1 << (segmentID & 7)))
+
+    def add(self, segmentID: int) -> bool:
+        """Add segment ID to the set
+
+        Args:
+            segmentID (int): segment ID
+
+        Returns:
+            bool: false if the segment ID already exists
+        """
+        mask = 1 << (segmentID & 7)
+        if self._bits[segmentID >> 3] & mask:
+            return False
+
+        self._bits[segmentID >> 3] |= mask
+        self.count += 1
+
+        # all the segments before first missing are exists
+        while self.firstMissing < self.segmentsAmount and self.firstMissing in self:
+            self.firstMissing += 1
+        return True
+
+    def is_full(self) -> bool:
+        return self.count == self.segmentsAmount
+
+    def find(self, segmentID: int, exists: bool) -> int:
+        """Return the first segment ID from segment ID that exists / missing, the full bytes are skipped at once
+
+        Args:
+            segmentID (int): the first segment ID to check
+            exists (bool): true for existing segment, false for missing segment
+
+        Returns:
+            int: the segment ID or the amount of segments if not found
+        """
+        while segmentID < self.segmentsAmount:
+            if segmentID & 7 == 0:
+                match = (NOT_EMPTY_BYTE if exists else NOT_FULL_BYTE).search(self._bits, segmentID >> 3)
+                if not match:
+                    return self.segmentsAmount
+                segmentID = max(segmentID, match.start() << 3)
+
+            if (segmentID in self) == exists:
+                return min(segmentID, self.segmentsAmount)
+            segmentID += 1
+        return self.segmentsAmount
+
+    def get_missing_ranges(self, maxRanges: int) -> list[tuple[int, int]]:
+        """Return the ranges of the missing segments
+
+        Args:
+            maxRanges (int): max amount of ranges, the last range covers all the segments after it
+
+        Returns:
+            list[tuple[int, int]]: the ranges, start and end (exclusive) segment IDs
+        """
+        ranges: list[tuple[int, int]] = []
+        start = self.find(self.firstMissing, False)
+        while start < self.segmentsAmount:
+            if len(ranges) >= maxRanges - 1:
+                ranges.append((start, self.segmentsAmount))
+                break
+
+            end = self.find(start, True)
+            ranges.append((start, end))
+            start = self.find(end, False)
+        return ranges
+
+
+class SegmentSink(ABC):
+    """Interface of the receivers destination of the segments"""
+
+    def __init__(self, dataSize: int, singleSegmentSize: int, headerSize: int = 0) -> None:
+        """
+
+        Args:
+            dataSize (int): size in bytes of the data
+            singleSegmentSize (int): size of each segment
+            headerSize (int, optional): size of the header that saved apart of the data. Defaults to 0.
+        """
+        self.dataSize = dataSize
+        self.singleSegmentSize = singleSegmentSize
+        self.header = bytearray(min(headerSize, dataSize))
+
+        segmentsAmount = dataSize // singleSegmentSize
+        if segmentsAmount * singleSegmentSize < dataSize:
+            segmentsAmount += 1
+        self.segments = SegmentsBitmap(segmentsAmount)
+
+        # every segment is compressed chunk, it decompressed before it counted as received
+        self.compression = CompressionType.Nothing
+
+    @abstractmethod
+    def _write(self, offset: int, data: bytes | memoryview) -> None:
+        """Write data after the header
+
+        Args:
+            offset (int): offset of the data after the header
+            data (bytes | memoryview): the data
+        """
+        ...
+
+    def write(self, segmentID: int, data: bytes | memoryview) -> int:
+        """Write consecutive segments into the sink
+
+        Args:
+            segmentID (int): the first segment ID
+            data (bytes | memoryview): the segments content
+
+        Returns:
+            int: amount of the segments in the data
+
+        Raises:
+            ValueError: if the compressed chunk is not valid, the segment is not received
+        """
+        if self.compression != CompressionType.Nothing:
+            return self._write_chunk(segmentID, data)
+
+        amount = max((len(data) + self.singleSegmentSize - 1) // self.singleSegmentSize, 1)
+        amount = min(amount, len(self.segments) - segmentID)
+        if amount <= 0 or all(i in self.segments for i in range(segmentID, segmentID + amount)):
+            return max(amount, 0)
+
+        self._write_segments(segmentID * self.singleSegmentSize, data)
+
+        for i in range(segmentID, segmentID + amount):
+            self.segments.add(i)
+        return amount
+
+    def _write_chunk(self, segmentID: int, frame: bytes | memoryview) -> int:
+        if segmentID >= len(self.segments):
+            return 0
+
+        if segmentID not in self.segments:
+            # the invalid chunk raises before the segment is received
+            self._decompress_chunk(segmentID, frame)
+            self.segments.add(segmentID)
+        return 1
+
+    def _decompress_chunk(self, segmentID: int, frame: bytes | memoryview) -> None:
+        offset = segmentID * self.singleSegmentSize
+        data = decompress_chunk(frame, self.singleSegmentSize)
+        if len(data) != min(self.singleSegmentSize, self.dataSize - offset):
+            raise ValueError("The chunk {} has wrong size {}".format(segmentID, len(data)))
+        self._write_segments(offset, data)
+
+    def _write_segments(self, offset: int, data: bytes | memoryview) -> None:
+        headerSize = len(self.header)
+        if offset < headerSize:
+            # the segment starts in the header
+            headerPart = min(headerSize - offset, len(data))
+            self.header[offset : offset + headerPart] = data[:headerPart]
+            data = data[headerPart:]
+            offset += headerPart
+
+        if len(data) > 0:
+            self._write(offset - headerSize, data)
+
+    def is_complited(self) -> bool:
+        return self.segments.is_full()
+
+    def close(self) -> None:
+        """Release the resources of the sink"""
+        ...
+
+
+class BytesSegmentSink(SegmentSink):
+    """Segments sink into preallocated buffer in the memory"""
+
+    def __init__(self, dataSize: int, singleSegmentSize: int, headerSize: int = 0) -> None:
+        """
+
+        Args:
+            dataSize (int): size in bytes of the data
+            singleSegmentSize (int): size of each segment
+            headerSize (int, optional): size of the header that saved apart of the data. Defaults to 0.
+        """
+        SegmentSink.__init__(self, dataSize, singleSegmentSize, headerSize)
+        self.data = bytearray(dataSize - len(self.header))
+
+    def _write(self, offset: int, data: bytes | memoryview) -> None:
+        self.data[offset : offset + len(data)] = data
+
+
+class FileSegmentSink(SegmentSink):
+    """Segments sink into staging file, every segment written at its offset when it arrives"""
+
+    def __init__(
+        self, path: str, dataSize: int, singleSegmentSize: int, headerSize: int = 0, fileOffset: int = 0
+    ) -> None:
+        """
+
+        Args:
+            path (str): path of the staging file
+            dataSize (int): size in bytes of the data
+            singleSegmentSize (int): size of each segment
+            headerSize (int, optional): size of the header that saved apart of the data. Defaults to 0.
+            fileOffset (int, optional): offset of the data in the staging file, the content before it is kept.
+                Defaults to 0 - new staging file.
+        """
+        SegmentSink.__init__(self, dataSize, singleSegmentSize, headerSize)
+        self.path = path
+        self._fileOffset = fileOffset
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | (os.O_TRUNC if fileOffset == 0 else 0), 0o644)
+        self._allocate()
+
+    def _allocate(self) -> None:
+        os.ftruncate(self._fd, self._fileOffset)
+        fileSize = self.dataSize - len(self.header)
+        if fileSize > 0:
+            try:
+                os.posix_fallocate(self._fd, self._fileOffset, fileSize)
+            except OSError:
+                # the file system dos not support allocation
+                os.ftruncate(self._fd, self._fileOffset + fileSize)
+
+    def _write(self, offset: int, data: bytes | memoryview) -> None:
+        os.pwrite(self._fd, data, self._fileOffset + offset)
+
+    def commit(self, targetPath: str) -> None:
+        """Move the staging file to the target path
+
+        Args:
+            targetPath (str): the final path of the file
+        """
+        self.close()
+        os.replace(self.path, targetPath)
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def suspend(self, targetPath: str) -> int:
+        """Cut the staging file after the received prefix and move it to the target path, for resuming it later.
+        The preallocated staging file of killed receiver is never mistaken for a prefix.
+
+        Args:
+            targetPath (str): path of the partial file
+
+        Returns:
+            int: size of the partial file
+        """
+        prefixSize = min(self.segments.firstMissing * self.singleSegmentSize, self.dataSize) - len(self.header)
+        prefixSize = self._fileOffset + max(prefixSize, 0)
+        os.ftruncate(self._fd, prefixSize)
+        self.commit(targetPath)
+        return prefixSize
+
+    def discard(self) -> None:
+        """Close and delete the staging file"""
+        try:
+            self.close()
+        finally:
+            if os.path.isfile(self.path):
+                os.remove(self.path)
+
+
+class FileRangeSegmentSink(SegmentSink):
+    """Segments sink into range of existing file, many sinks can write their ranges into the same file"""
+
+    def __init__(self, path: str, fileOffset: int, dataSize: int, singleSegmentSize: int, headerSize: int = 0) -> None:
+        """
+
+        Args:
+            path (str): path of the file, it allocated before
+            fileOffset (int): offset of the range in the file
+            dataSize (int): size in bytes of the data
+            singleSegmentSize (int): size of each segment
+            headerSize (int, optional): size of the header that saved apart of the data. Defaults to 0.
+        """
+        SegmentSink.__init__(self, dataSize, singleSegmentSize, headerSize)
+        self.path = path
+        self._fileOffset = fileOffset
+        self._fd = os.open(path, os.O_WRONLY)
+
+    def _write(self, offset: int, data: bytes | memoryview) -> None:
+        os.pwrite(self._fd, data, self._fileOffset + offset)
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def load_segments_state(statePath: str, segmentsAmount: int, headerSize: int) -> tuple[bytes, SegmentsBitmap] | None:
+    """Load the saved state of resumable sink
+
+    Args:
+        statePath (str): path of the state file
+        segmentsAmount (int): amount of segments
+        headerSize (int): size of the header
+
+    Returns:
+        tuple[bytes, SegmentsBitmap] | None: the header and the received segments, None if not exists or not valid
+    """
+    try:
+        with open(statePath, "rb") as f:
+            state = f.read()
+    except FileNotFoundError:
+        return None
+
+    if len(state) != headerSize + (segmentsAmount + 7) // 8:
+        return None
+    return (state[:headerSize], SegmentsBitmap.from_bytes(segmentsAmount, state[headerSize:]))
+
+
+class ResumableFileSegmentSink(FileSegmentSink):
+    """Segments sink into staging file that saves its received segments beside it,
+    so interrupted receiving continues by later sink of the same path"""
+
+    def __init__(
+        self, path: str, dataSize: int, singleSegmentSize: int, headerSize: int = 0, checkpointInterval: float = 5
+    ) -> None:
+        """
+
+        Args:
+            path (str): path of the staging file
+            dataSize (int): size in bytes of the data
+            singleSegmentSize (int): size of each segment
+            headerSize (int, optional): size of the header that saved apart of the data. Defaults to 0.
+            checkpointInterval (float, optional): min time between the saves of the state while writing [sec].
+                Defaults to 5.
+
+        Raises:
+            BlockingIOError: other sink uses the staging file
+        """
+        SegmentSink.__init__(self, dataSize, singleSegmentSize, headerSize)
+        self.path = path
+        self.statePath = path + ".state"
+        self._fileOffset = 0
+        self._checkpointInterval = checkpointInterval
+        self._lastCheckpoint = time.monotonic()
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            # single sink of the staging file, also across processes
+            fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self.close()
+            raise
+
+        state = load_segments_state(self.statePath, len(self.segments), len(self.header))
+        if state and os.fstat(self._fd).st_size == dataSize - len(self.header):
+            self.header[:] = state[0]
+            self.segments = state[1]
+        else:
+            self._allocate()
+
+    def write(self, segmentID: int, data: bytes | memoryview) -> int:
+        amount = FileSegmentSink.write(self, segmentID, data)
+        if time.monotonic() - self._lastCheckpoint >= self._checkpointInterval:
+            self.checkpoint()
+        return amount
+
+    def checkpoint(self) -> None:
+        """Save the received segments, the data synced before so the state never claims unwritten segments"""
+        if self._fd < 0:
+            return None
+
+        os.fdatasync(self._fd)
+        with open(self.statePath + ".tmp", "wb") as f:
+            f.write(bytes(self.header) + bytes(self.segments))
+        os.replace(self.statePath + ".tmp", self.statePath)
+        self._lastCheckpoint = time.monotonic()
+
+    def commit(self, targetPath: str) -> None:
+        FileSegmentSink.commit(self, targetPath)
+        if os.path.isfile(self.statePath):
+            os.remove(self.statePath)
+
+    def discard(self) -> None:
+        FileSegmentSink.discard(self)
+        if os.path.isfile(self.statePath):
+            os.remove(self.statePath)
@@ -0,0 +1,121 @@
+# timers of the event loops, the work is by the expiring timers and not by the received pockets
+
+from __future__ import annotations
+
+import math
+from typing import Callable
+
+
+class Timer:
+    """Single timer of the timer wheel"""
+
+    __slots__ = ("deadline", "callback", "cancelled", "_tick")
+
+    def __init__(self, deadline: float, callback: Callable[[float], None], tick: int) -> None:
+        """
+
+        Args:
+            deadline (float): the expiration time
+            callback (Callable[[float], None]): called with the current time when the timer expires
+            tick (int): the tick of the wheel that the timer expires in
+        """
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+        self._tick = tick
+
+
+class TimerWheel:
+    """Hashed timer wheel, every slot holds the timers that expire in its ticks.
+    Advancing the wheel visits only the passed slots, so its cost is by the passed time and the expiring timers."""
+
+    def __init__(self, tickSize: float, slotsAmount: int, now: float) -> None:
+        """
+
+        Args:
+            tickSize (float): the resolution of the timers [sec]
+            slotsAmount (int): amount of slots, the timers of longer delays wait in their slot for more revolutions
+            now (float): the current time
+        """
+        self.tickSize = tickSize
+        self._slots: list[list[Timer]] = [[] for _ in range(slotsAmount)]
+        self._startTime = now
+        self._currentTick = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _get_tick(self, time: float) -> int:
+        return math.ceil((time - self._startTime) / self.tickSize)
+
+    def schedule(self, deadline: float, callback: Callable[[float], None]) -> Timer:
+        """Schedule timer
+
+        Args:
+            deadline (float): the expiration time, the timer expires not before it and at most one tick after it
+            callback (Callable[[float], None]): called with the current time when the timer expires
+
+        Returns:
+            Timer: the timer, for cancel
+        """
+        # the timers of the past expire in the next advance
+        tick = max(self._get_tick(deadline), self._currentTick + 1)
+        timer = Timer(deadline, callback, tick)
+        self._slots[tick % len(self._slots)].append(timer)
+        self._count += 1
+        return timer
+
+    def cancel(self, timer: Timer) -> None:
+        """Cancel timer, it removed from its slot when the slot visited
+
+        Args:
+            timer (Timer): the timer
+        """
+        if not timer.cancelled:
+            timer.cancelled = True
+            self._count -= 1
+
+    def advance(self, now: float) -> int:
+        """Expire the timers until the current time
+
+        Args:
+            now (float): the current time
+
+        Returns:
+            int: amount of the expired timers
+        """
+        # only the ticks that fully passed
+        targetTick = math.floor((now - self._startTime) / self.tickSize)
+        if self._currentTick + 1 > targetTick:
+            return 0
+
+        expired: list[Timer] = []
+        # a revolution visits all the slots
+        firstTick = max(self._currentTick + 1, targetTick - len(self._slots) + 1)
+        for tick in range(firstTick, targetTick + 1):
+            index = tick % len(self._slots)
+            slot = self._slots[index]
+            if len(slot) == 0:
+                continue
+
+            waiting: list[Timer] = []
+            for timer in slot:
+                if timer.cancelled:
+                    continue
+                if timer._tick <= targetTick:
+                    expired.append(timer)
+                else:
+                    waiting.append(timer)
+            self._slots[index] = waiting
+        self._currentTick = targetTick
+
+        # the callbacks can schedule new timers
+        expired.sort(key=lambda timer: timer.deadline)
+        for timer in expired:
+            if not timer.cancelled:
+                # expired timer can not be cancelled
+                timer.cancelled = True
+                self._count -= 1
+                timer.callback(now)
+        return len(expired)
@@ -0,0 +1,70 @@
+# testing the content addressed storage
+
+import os
+from pathlib import Path
+
+from src.app.chunk_store import add_file, find_chunk, get_owner, has_chunk, init_chunk_store
+from src.app.config import config
+from src.lib.chunks import get_chunk_hashes
+
+
+def test_app_chunk_store(tmp_path: Path) -> None:
+    storagePath = config.APP_STORAGE_PATH
+    config.APP_STORAGE_PATH = str(tmp_path)
+    try:
+        os.mkdir(config.APP_STORAGE_PATH + config.STORAGE_STAGING)
+        init_chunk_store()
+
+        data = os.urandom(3000)
+        hashes = get_chunk_hashes(data, 1024)
+        for name in ["a.bin", "b.bin"]:
+            (tmp_path / name).write_bytes(data)
+            add_file(str(tmp_path / name), 1024, "public")
+
+        # the same content stored once
+        assert os.path.samefile(tmp_path / "a.bin", tmp_path / "b.bin")
+        assert all(has_chunk(chunkHash, "public") for chunkHash in hashes)
+        assert find_chunk(hashes[2], 3000 - 2048, "public") == data[2048:]
+        assert find_chunk(hashes[2], 1024, "public") is None
+
+        # the content is deleted after all its files
+        os.remove(tmp_path / "a.bin")
+        init_chunk_store()
+        assert has_chunk(hashes[0], "public")
+        os.remove(tmp_path / "b.bin")
+        init_chunk_store()
+        assert not has_chunk(hashes[0], "public")
+    finally:
+        config.APP_STORAGE_PATH = storagePath
+
+
+def test_app_chunk_store_owners(tmp_path: Path) -> None:
+    storagePath = config.APP_STORAGE_PATH
+    config.APP_STORAGE_PATH = str(tmp_path)
+    try:
+        os.mkdir(config.APP_STORAGE_PATH + config.STORAGE_STAGING)
+        init_chunk_store()
+        owner = get_owner(config.APP_STORAGE_PATH + config.STORAGE_PRIVATE + "/user/")
+        assert owner == "private-user"
+
+        data = os.urandom(3000)
+        hashes = get_chunk_hashes(data, 1024)
+        (tmp_path / "a.bin").write_bytes(data)
+        add_file(str(tmp_path / "a.bin"), 1024, owner)
+
+        # the chunks of private file are not found by other owners
+        assert has_chunk(hashes[0], owner)
+        assert not has_chunk(hashes[0], "public")
+        assert find_chunk(hashes[0], 1024, "public") is None
+
+        # the same content of another owner is stored once, and indexed for it too
+        (tmp_path / "b.bin").write_bytes(data)
+        add_file(str(tmp_path / "b.bin"), 1024, "public")
+        assert os.path.samefile(tmp_path / "a.bin", tmp_path / "b.bin")
+        assert has_chunk(hashes[0], "public")
+
+        os.remove(tmp_path / "a.bin")
+        init_chunk_store()
+        assert has_chunk(hashes[0], "public")
+    finally:
+        config.APP_STORAGE_PATH = storagePath
@@ -0,0 +1,28 @@
+# testing the pockets forwarding between the workers
+
+import socket
+
+from src.app.rudp import create_new_requestID, dispatch, get_owner, init_worker, recv_forwarded
+from src.lib.ftp import BasicLayer, Pocket, PocketType
+
+
+def test_app_rudp_forward_to_owner() -> None:
+    forwardSockets = [socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM) for _ in range(3)]
+
+    init_worker(1, forwardSockets)
+    requestID = create_new_requestID()
+    assert get_owner(requestID) == 1
+
+    # worker 2 gets pocket of request of worker 1
+    init_worker(2, forwardSockets)
+    data = bytes(Pocket(BasicLayer(requestID, PocketType.SACK)))
+    assert dispatch(bytes(Pocket(BasicLayer(0, PocketType.Request))), ("127.0.0.1", 4000))
+    assert not dispatch(data, ("127.0.0.1", 4000))
+
+    init_worker(1, forwardSockets)
+    assert recv_forwarded() == (data, ("127.0.0.1", 4000))
+
+    init_worker(0, [forwardSockets[0]])
+    for pair in forwardSockets:
+        pair[0].close()
+        pair[1].close()
@@ -0,0 +1,49 @@
+# testing the transfer scheduler
+
+import pytest
+
+from src.app.config import config
+from src.app.handlers import ListRequestHandler
+from src.app.scheduler import Transfer
+from src.lib.config import config as libConfig
+from src.lib.ftp import BasicLayer, Pocket, PocketSubType, PocketType, RequestLayer, ResponseLayer, SACKLayer
+from src.lib.network import Datagram
+from src.lib.segments import BytesSegmentSource
+
+
+def create_transfer(requestID: int, pocketSubType: PocketSubType) -> Transfer:
+    request = Pocket(BasicLayer(0, PocketType.Request, pocketSubType))
+    request.requestLayer = RequestLayer(0, 1000, True, "", "")
+    handler = ListRequestHandler(request, ("127.0.0.1", 4000), "")
+    handler.requestID = requestID
+    handler.source = BytesSegmentSource(bytes(1000 * 1000))
+    handler.response = Pocket(BasicLayer(requestID, PocketType.Response, pocketSubType))
+    handler.response.responseLayer = ResponseLayer(True, "", 1000 * 1000, 1000, 1000, 1000)
+    return Transfer(handler)
+
+
+def test_app_scheduler_weights(monkeypatch: pytest.MonkeyPatch) -> None:
+    def sendto_many(datagrams: list[Datagram], clientAddress: tuple[str, int]) -> None:
+        ...
+
+    monkeypatch.setattr("src.app.scheduler.sendto_many", sendto_many)
+    # the quantum limits the transfers, not their windows or pacers
+    monkeypatch.setattr(config, "APP_TRANSFER_QUANTUM", 4)
+    monkeypatch.setattr(libConfig, "PACING_BURST", 1000)
+
+    transfers = [create_transfer(1, PocketSubType.Download), create_transfer(2, PocketSubType.List)]
+    assert [transfer.weight for transfer in transfers] == [1, 2]
+
+    sended = [0, 0]
+    now = 1.0
+    for _ in range(50):
+        for i, transfer in enumerate(transfers):
+            sended[i] += transfer.poll(now)
+        now += 0.001
+
+        # all the segments acked, so the windows stay open
+        for transfer in transfers:
+            transfer.sender.on_sack(SACKLayer.from_ranges(transfer.sender.sendedAmount, []), now)
+
+    # every round each transfer sends its quantum times its weight
+    assert sended == [50 * 4, 50 * 4 * 2]
@@ -0,0 +1,65 @@
+# testing the sessions table
+
+from src.app.config import config
+from src.app.handlers import ListRequestHandler
+from src.app.sessions import SessionTable
+from src.lib.ftp import BasicLayer, Pocket, PocketSubType, PocketType
+from src.lib.segments import BytesSegmentSource
+
+
+def create_list_handler(requestID: int, dataSize: int) -> ListRequestHandler:
+    handler = ListRequestHandler(Pocket(BasicLayer(0, PocketType.Request, PocketSubType.List)), ("127.0.0.1", 4000), "")
+    handler.requestID = requestID
+    handler.source = BytesSegmentSource(bytes(dataSize))
+    return handler
+
+
+def test_app_sessions_expire() -> None:
+    sessions = SessionTable()
+    assert sessions.add(create_list_handler(1, 10), 0)
+    assert sessions.add(create_list_handler(2, 20), 0)
+    assert sessions.memorySize == 30
+
+    # the second session is active
+    sessions.touch(2, config.APP_SESSION_IDLE_TIMEOUT)
+    handler = sessions.expire(1, config.APP_SESSION_IDLE_TIMEOUT + 1)
+    assert handler and handler.get_requestID() == 1
+    assert sessions.expire(2, config.APP_SESSION_IDLE_TIMEOUT + 1) is None
+    assert 1 not in sessions
+    assert 2 in sessions
+    assert sessions.memorySize == 20
+
+    # alive for too long
+    sessions.touch(2, config.APP_SESSION_MAX_AGE + 1)
+    assert sessions.expire(2, config.APP_SESSION_MAX_AGE + 1)
+    assert sessions.expire(2, config.APP_SESSION_MAX_AGE + 1) is None
+    assert len(sessions) == 0
+    assert sessions.memorySize == 0
+
+
+def test_app_sessions_expiry() -> None:
+    sessions = SessionTable()
+    assert sessions.add(create_list_handler(1, 10), 0)
+    assert sessions.get_expiry(1) == config.APP_SESSION_IDLE_TIMEOUT
+
+    # the activity moves the idle expiry, until the max age
+    sessions.touch(1, config.APP_SESSION_MAX_AGE)
+    assert sessions.get_expiry(1) == config.APP_SESSION_MAX_AGE
+
+    assert sessions.remove(1)
+    assert sessions.get_expiry(1) is None
+
+
+def test_app_sessions_memory_limit() -> None:
+    maxMemory = config.APP_SESSIONS_MAX_MEMORY
+    config.APP_SESSIONS_MAX_MEMORY = 100
+    try:
+        sessions = SessionTable()
+        assert sessions.add(create_list_handler(1, 100), 0)
+        assert not sessions.add(create_list_handler(2, 1), 0)
+
+        assert sessions.remove(1)
+        assert sessions.remove(1) is None
+        assert sessions.add(create_list_handler(2, 1), 0)
+    finally:
+        config.APP_SESSIONS_MAX_MEMORY = maxMemory
@@ -0,0 +1,51 @@
+# testing the chunk uploads
+
+import io
+import os
+
+import pytest
+
+from src.lib.chunks import CHUNK_STRUCT, DATA, STORED, apply_chunk_upload, create_chunk_upload, get_chunk_hashes
+from src.lib.delta import get_strong_hash
+
+
+def test_lib_chunks_upload() -> None:
+    data = os.urandom(10 * 1024 + 100)
+    hashes = get_chunk_hashes(data, 1024)
+    assert len(hashes) == 11
+
+    # the server stores the even chunks
+    chunks = {hashes[i]: data[i * 1024 : (i + 1) * 1024] for i in range(0, len(hashes), 2)}
+    stored = [i % 2 == 0 for i in range(len(hashes))]
+    upload = create_chunk_upload(data, 1024, hashes, stored)
+    assert len(upload) == 11 * CHUNK_STRUCT.size + 5 * 1024
+
+    output = io.BytesIO()
+    fileHash, uploadHashes = apply_chunk_upload(
+        io.BytesIO(upload), output, 1024, len(data), lambda chunkHash, length: chunks.get(chunkHash)
+    )
+    assert output.getvalue() == data
+    assert fileHash == get_strong_hash(data)
+    assert uploadHashes == hashes
+
+
+def test_lib_chunks_invalid() -> None:
+    data = os.urandom(2048)
+    hashes = get_chunk_hashes(data, 1024)
+
+    def find_chunk(chunkHash: bytes, length: int) -> bytes | None:
+        return None
+
+    for upload in [
+        # not stored
+        CHUNK_STRUCT.pack(STORED, hashes[0]) + CHUNK_STRUCT.pack(STORED, hashes[1]),
+        # not valid
+        CHUNK_STRUCT.pack(DATA, hashes[1]) + data[:1024] + CHUNK_STRUCT.pack(DATA, hashes[1]) + data[1024:],
+        # truncated
+        CHUNK_STRUCT.pack(DATA, hashes[0]) + data[:1000],
+        # too long
+        create_chunk_upload(data, 1024, hashes, [False, False]) + b"\0",
+        bytes([9]) * CHUNK_STRUCT.size,
+    ]:
+        with pytest.raises(ValueError):
+            apply_chunk_upload(io.BytesIO(upload), io.BytesIO(), 1024, len(data), find_chunk)
@@ -0,0 +1,41 @@
+# testing the compression of the chunks
+
+import os
+
+import pytest
+
+from src.lib.compression import compress_chunk, decompress_chunk, is_compressible, parse_compression
+from src.lib.ftp import CompressionType
+
+
+def test_lib_compression_chunks() -> None:
+    data = b"2026-10-18 INFO request served\n" * 500
+    for compression in [CompressionType.Zlib, CompressionType.LZMA]:
+        frame = compress_chunk(data, compression)
+        assert frame[0] == compression
+        assert len(frame) < len(data)
+        assert decompress_chunk(frame, len(data)) == data
+
+        # the chunk is bigger than the segment
+        with pytest.raises(ValueError):
+            decompress_chunk(frame, len(data) - 1)
+        with pytest.raises(ValueError):
+            decompress_chunk(frame[:-4], len(data))
+
+    # the chunk that not compressible is sended as is
+    data = os.urandom(1000)
+    frame = compress_chunk(data, CompressionType.Zlib)
+    assert frame == bytes([CompressionType.Nothing]) + data
+    assert decompress_chunk(frame, 1000) == data
+
+
+def test_lib_compression_types() -> None:
+    assert is_compressible("logs/app.log")
+    assert is_compressible("dir")
+    assert not is_compressible("photos/IMG.JPG")
+    assert not is_compressible("backup.tar.gz")
+
+    assert parse_compression("LZMA") == CompressionType.LZMA
+    assert parse_compression("none") == CompressionType.Nothing
+    with pytest.raises(ValueError):
+        parse_compression("brotli")
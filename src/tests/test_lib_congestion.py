@@ -0,0 +1,62 @@
+# testing the congestion control algorithms
+
+import pytest
+
+from src.lib.congestion import BBR, Cubic, NewReno, create_congestion_control, parse_congestion_control
+from src.lib.ftp import CongestionControlType
+
+
+def test_lib_congestion_new_reno() -> None:
+    control = NewReno(10)
+
+    control.on_ack(10, 0.1, 0.1, 0)
+    assert control.cwnd == 20
+
+    control.on_loss(0)
+    assert control.cwnd == 10
+
+    control.on_ack(10, 0.1, 0.1, 0)
+    assert control.cwnd == 11
+
+
+def test_lib_congestion_cubic() -> None:
+    control = Cubic(100)
+
+    control.on_loss(0)
+    assert control.cwnd == 70
+
+    # concave growth back to the window before the loss
+    control.on_ack(1, 0.1, 0.1, 0)
+    K = (30 / Cubic.C) ** (1 / 3)
+    for i in range(1, 100):
+        control.on_ack(10, 0.1, 0.1, i * K / 100)
+    assert 90 < control.cwnd <= 100
+
+    for i in range(100):
+        control.on_ack(10, 0.1, 0.1, K + i * 0.01)
+    assert control.cwnd > 100
+
+
+def test_lib_congestion_bbr() -> None:
+    control = BBR(10)
+
+    # 100 segments per 0.1 sec
+    control.on_round(0)
+    for i in range(1, 5):
+        control.on_ack(100, 0.05, 0.1, i * 0.1 - 0.05)
+        control.on_round(i * 0.1)
+
+    assert not control.startup
+    assert control.get_bandwidth() == pytest.approx(1000)
+    assert control.minRtt == 0.05
+
+    control.on_loss(0.5)
+    assert control.cwnd > BBR.CWND_MIN
+
+
+def test_lib_congestion_select() -> None:
+    assert parse_congestion_control("NewReno") == CongestionControlType.NewReno
+    assert isinstance(create_congestion_control(CongestionControlType.Default, 10), Cubic)
+
+    with pytest.raises(ValueError):
+        parse_congestion_control("vegas")
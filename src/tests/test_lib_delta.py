@@ -0,0 +1,84 @@
+# testing the delta of files
+
+import io
+import random
+
+import pytest
+
+from src.lib.delta import (
+    COPY,
+    COPY_STRUCT,
+    LITERAL,
+    LITERAL_STRUCT,
+    apply_delta,
+    create_delta,
+    create_signature,
+    get_block_size,
+    get_strong_hash,
+)
+
+
+def build(basis: bytes, data: bytes, blockSize: int) -> tuple[bytes, bytes]:
+    signature = create_signature(io.BytesIO(basis), blockSize)
+    delta = create_delta(data, signature, blockSize, len(basis))
+
+    output = io.BytesIO()
+    fileHash = apply_delta(io.BytesIO(delta), io.BytesIO(basis), output, blockSize, len(basis))
+    assert fileHash == get_strong_hash(output.getvalue())
+    return delta, output.getvalue()
+
+
+def test_lib_delta_block_size() -> None:
+    assert get_block_size(0) == 1024
+    assert get_block_size(100 * 1024 * 1024) == 10240
+    assert get_block_size(1 << 50) == 128 * 1024
+
+
+def test_lib_delta_changes() -> None:
+    rand = random.Random(7)
+    basis = rand.randbytes(100000 + 300)
+
+    # insert, delete and replace in the middle of blocks
+    data = bytearray(basis)
+    data[5000:5000] = b"inserted"
+    del data[40000:40100]
+    data[70000:70010] = bytes(10)
+
+    delta, output = build(basis, bytes(data), 1024)
+    assert output == data
+    assert len(delta) < 4 * 1024
+
+    # the same file is copied by a single instruction, with its shorter last block
+    delta, output = build(basis, basis, 1024)
+    assert output == basis
+    assert delta == COPY_STRUCT.pack(COPY, 0, len(basis) // 1024 + 1)
+
+
+def test_lib_delta_edges() -> None:
+    basis = bytes(range(256)) * 20
+
+    # empty basis / data
+    delta, output = build(b"", basis, 1024)
+    assert output == basis
+    assert delta == LITERAL_STRUCT.pack(LITERAL, len(basis)) + basis
+    delta, output = build(basis, b"", 1024)
+    assert output == b""
+    assert delta == b""
+
+    # data shorter than a block
+    delta, output = build(basis, basis[:100], 1024)
+    assert output == basis[:100]
+
+
+def test_lib_delta_invalid() -> None:
+    basis = bytes(4096)
+
+    for delta in [
+        COPY_STRUCT.pack(COPY, 4, 1),
+        COPY_STRUCT.pack(COPY, 0, 0),
+        COPY_STRUCT.pack(COPY, 0, 1)[:5],
+        LITERAL_STRUCT.pack(LITERAL, 10) + b"short",
+        bytes([9]),
+    ]:
+        with pytest.raises(ValueError):
+            apply_delta(io.BytesIO(delta), io.BytesIO(basis), io.BytesIO(), 1024, len(basis))
@@ -0,0 +1,279 @@
+# testing the pockets layers
+
+import pytest
+
+from src.lib.ftp import (
+    BasicLayer,
+    ChunkStatusRequestLayer,
+    ChunkStatusResponseLayer,
+    ChunkUploadRequestLayer,
+    CompressionType,
+    CongestionControlType,
+    DeleteRequestLayer,
+    DeltaUploadRequestLayer,
+    DownloadRequestLayer,
+    DownloadResponseLayer,
+    ListRequestLayer,
+    Pocket,
+    PocketSubType,
+    PocketType,
+    PocketView,
+    RequestLayer,
+    ResponseLayer,
+    SACKLayer,
+    SegmentEncoder,
+    SegmentLayer,
+    SignatureResponseLayer,
+    UploadRequestLayer,
+    UploadStatusResponseLayer,
+    pack_directory_block,
+    pack_file_block,
+    unpack_directory_block,
+    unpack_file_block,
+)
+
+
+def test_lib_ftp_sack_from_ranges() -> None:
+    sackLayer = SACKLayer.from_ranges(3, [(9, 10), (1, 2), (5, 7), (7, 8), (12, 13), (2, 3), (4, 5)])
+
+    assert sackLayer.cumulative == 3
+    assert sackLayer.ranges == [(4, 8), (9, 10), (12, 13)]
+    assert 0 in sackLayer
+    assert 6 in sackLayer
+    assert 8 not in sackLayer
+    assert 13 not in sackLayer
+
+
+def test_lib_ftp_sack_pocket() -> None:
+    pocket = Pocket(BasicLayer(7, PocketType.SACK))
+    pocket.sackLayer = SACKLayer(10, [(12, 20), (30, 31)])
+
+    pocket = Pocket.from_bytes(bytes(pocket))
+
+    assert pocket.basicLayer.requestID == 7
+    assert pocket.sackLayer
+    assert pocket.sackLayer.cumulative == 10
+    assert pocket.sackLayer.ranges == [(12, 20), (30, 31)]
+
+
+def test_lib_ftp_download_range_pockets() -> None:
+    request = Pocket(BasicLayer(0, PocketType.Request, PocketSubType.Download))
+    request.requestLayer = RequestLayer(0, 60000, True, "", "")
+    request.downloadRequestLayer = DownloadRequestLayer("dir/file.bin", 3000, 500)
+
+    request = Pocket.from_bytes(bytes(request))
+
+    assert request.downloadRequestLayer
+    assert request.downloadRequestLayer.path == "dir/file.bin"
+    assert request.downloadRequestLayer.offset == 3000
+    assert request.downloadRequestLayer.length == 500
+
+    response = Pocket(BasicLayer(7, PocketType.Response, PocketSubType.Download))
+    response.responseLayer = ResponseLayer(True, "", 501, 1, 1500)
+    response.downloadResponseLayer = DownloadResponseLayer(True, 3000, 10000)
+
+    response = Pocket.from_bytes(bytes(response))
+
+    assert response.downloadResponseLayer
+    assert response.downloadResponseLayer.ranged
+    assert response.downloadResponseLayer.offset == 3000
+    assert response.downloadResponseLayer.fileSize == 10000
+
+    # the range follows the encoded path
+    request = Pocket(BasicLayer(0, PocketType.Request, PocketSubType.Download))
+    request.requestLayer = RequestLayer(0, 60000, True, "", "")
+    request.downloadRequestLayer = DownloadRequestLayer("תמונה/é.tif", 5, 10)
+
+    request = Pocket.from_bytes(bytes(request))
+
+    assert request.downloadRequestLayer
+    assert request.downloadRequestLayer.path == "תמונה/é.tif"
+    assert request.downloadRequestLayer.offset == 5
+    assert request.downloadRequestLayer.length == 10
+
+
+def test_lib_ftp_path_pockets() -> None:
+    # the fields after the paths are found by their encoded length
+    request = Pocket(BasicLayer(0, PocketType.Request, PocketSubType.List))
+    request.requestLayer = RequestLayer(0, 60000, True, "", "")
+    request.listRequestLayer = ListRequestLayer("תיקייה/é", True)
+
+    request = Pocket.from_bytes(bytes(request))
+
+    assert request.listRequestLayer
+    assert request.listRequestLayer.path == "תיקייה/é"
+    assert request.listRequestLayer.recursive
+
+    request = Pocket(BasicLayer(0, PocketType.Request, PocketSubType.Delete))
+    request.requestLayer = RequestLayer(0, 60000, True, "", "")
+    request.deleteRequestLayer = DeleteRequestLayer("dir/é.txt")
+
+    request = Pocket.from_bytes(bytes(request))
+
+    assert request.deleteRequestLayer
+    assert request.deleteRequestLayer.path == "dir/é.txt"
+
+    data = pack_directory_block("תיקייה", 1.5) + pack_file_block("é.txt", 2.5, 300)
+    assert unpack_directory_block(data, 1) == (("תיקייה", 1.5), len(pack_directory_block("תיקייה", 1.5)))
+    assert unpack_file_block(data, len(pack_directory_block("תיקייה", 1.5)) + 1) == (("é.txt", 2.5, 300), len(data))
+
+
+def test_lib_ftp_compression_pockets() -> None:
+    request = Pocket(BasicLayer(0, PocketType.Request, PocketSubType.List))
+    request.requestLayer = RequestLayer(0, 60000, True, "", "", CongestionControlType.BBR, CompressionType.LZMA)
+    request.listRequestLayer = ListRequestLayer("dir", False)
+
+    request = Pocket.from_bytes(bytes(request))
+
+    assert request.requestLayer
+    assert request.requestLayer.congestionControl == CongestionControlType.BBR
+    assert request.requestLayer.compression == CompressionType.LZMA
+
+    response = Pocket(BasicLayer(7, PocketType.Response, PocketSubType.List))
+    response.responseLayer = ResponseLayer(True, "", 100000, 7, 16384, 16385, CompressionType.Zlib)
+
+    response = Pocket.from_bytes(bytes(response))
+
+    assert response.responseLayer
+    assert response.responseLayer.maxSegmentSize == 16385
+    assert response.responseLayer.compression == CompressionType.Zlib
+
+
+def test_lib_ftp_upload_status_pockets() -> None:
+    request = Pocket(BasicLayer(0, PocketType.Request, PocketSubType.UploadStatus))
+    request.requestLayer = RequestLayer(10000, 60000, True, "", "")
+    request.uploadRequestLayer = UploadRequestLayer("dir/file.bin", "abc123")
+
+    request = Pocket.from_bytes(bytes(request))
+
+    assert request.uploadRequestLayer
+    assert request.uploadRequestLayer.path == "dir/file.bin"
+    assert request.uploadRequestLayer.token == "abc123"
+
+    response = Pocket(BasicLayer(7, PocketType.Response, PocketSubType.UploadStatus))
+    response.responseLayer = ResponseLayer(True, "", 0, 0, 0)
+    response.uploadStatusResponseLayer = UploadStatusResponseLayer(1500, [(2, 3), (5, 7)])
+
+    response = Pocket.from_bytes(bytes(response))
+
+    assert response.uploadStatusResponseLayer
+    assert response.uploadStatusResponseLayer.singleSegmentSize == 1500
+    assert response.uploadStatusResponseLayer.missingRanges == [(2, 3), (5, 7)]
+
+
+def test_lib_ftp_delta_pockets() -> None:
+    request = Pocket(BasicLayer(0, PocketType.Request, PocketSubType.DeltaUpload))
+    request.requestLayer = RequestLayer(10000, 60000, True, "", "")
+    request.uploadRequestLayer = UploadRequestLayer("dir/fïle.bin", "abc123")
+    request.deltaUploadRequestLayer = DeltaUploadRequestLayer(2048, 1234567890123, 5000000, bytes(range(16)))
+
+    request = Pocket.from_bytes(bytes(request))
+
+    assert request.uploadRequestLayer
+    assert request.uploadRequestLayer.path == "dir/fïle.bin"
+    assert request.deltaUploadRequestLayer
+    assert request.deltaUploadRequestLayer.blockSize == 2048
+    assert request.deltaUploadRequestLayer.basisVersion == 1234567890123
+    assert request.deltaUploadRequestLayer.fileSize == 5000000
+    assert request.deltaUploadRequestLayer.fileHash == bytes(range(16))
+
+    response = Pocket(BasicLayer(7, PocketType.Response, PocketSubType.Signature))
+    response.responseLayer = ResponseLayer(True, "", 200, 1, 60000)
+    response.signatureResponseLayer = SignatureResponseLayer(2048, 20000, 1234567890123)
+
+    response = Pocket.from_bytes(bytes(response))
+
+    assert response.responseLayer
+    assert response.responseLayer.dataSize == 200
+    assert response.signatureResponseLayer
+    assert response.signatureResponseLayer.blockSize == 2048
+    assert response.signatureResponseLayer.fileSize == 20000
+    assert response.signatureResponseLayer.version == 1234567890123
+
+
+def test_lib_ftp_chunk_pockets() -> None:
+    hashes = [bytes([i]) * 16 for i in range(10)]
+    request = Pocket(BasicLayer(0, PocketType.Request, PocketSubType.ChunkStatus))
+    request.requestLayer = RequestLayer(0, 60000, True, "", "")
+    request.chunkStatusRequestLayer = ChunkStatusRequestLayer(hashes)
+
+    data = bytes(request)
+    request = Pocket.from_bytes(data)
+
+    assert request.chunkStatusRequestLayer
+    assert request.chunkStatusRequestLayer.hashes == hashes
+
+    # the amount of hashes is more then the pocket has
+    with pytest.raises(ValueError):
+        Pocket.from_bytes(data[:-16])
+
+    stored = [i % 3 == 0 for i in range(10)]
+    response = Pocket(BasicLayer(7, PocketType.Response, PocketSubType.ChunkStatus))
+    response.responseLayer = ResponseLayer(True, "", 0, 0, 0)
+    response.chunkStatusResponseLayer = ChunkStatusResponseLayer(stored)
+
+    response = Pocket.from_bytes(bytes(response))
+
+    assert response.chunkStatusResponseLayer
+    assert response.chunkStatusResponseLayer.stored == stored
+
+    request = Pocket(BasicLayer(0, PocketType.Request, PocketSubType.ChunkUpload))
+    request.requestLayer = RequestLayer(10000, 60000, True, "", "")
+    request.uploadRequestLayer = UploadRequestLayer("dir/file.bin")
+    request.chunkUploadRequestLayer = ChunkUploadRequestLayer(65536, 5000000, bytes(range(16)))
+
+    request = Pocket.from_bytes(bytes(request))
+
+    assert request.uploadRequestLayer
+    assert request.uploadRequestLayer.path == "dir/file.bin"
+    assert request.chunkUploadRequestLayer
+    assert request.chunkUploadRequestLayer.chunkSize == 65536
+    assert request.chunkUploadRequestLayer.fileSize == 5000000
+    assert request.chunkUploadRequestLayer.fileHash == bytes(range(16))
+
+
+def test_lib_ftp_pocket_view() -> None:
+    pocket = Pocket(BasicLayer(7, PocketType.Segment, PocketSubType.Upload))
+    pocket.segmentLayer = SegmentLayer(3, b"0123456789")
+    data = bytearray(bytes(pocket))
+
+    view = PocketView(memoryview(data))
+
+    assert view.pocketType == PocketType.Segment
+    assert view.pocketSubType == PocketSubType.Upload
+    assert view.requestID == 7
+    assert view.get_sack_layer() is None
+
+    segmentID, segment = view.get_segment()
+    assert segmentID == 3
+    assert segment == b"0123456789"
+    # the content is not copied
+    data[-1] = ord("X")
+    assert segment == b"012345678X"
+
+
+def test_lib_ftp_sack_pocket_view() -> None:
+    pocket = Pocket(BasicLayer(7, PocketType.SACK))
+    pocket.sackLayer = SACKLayer(10, [(12, 20), (30, 31)])
+
+    view = PocketView(bytes(pocket))
+    sackLayer = view.get_sack_layer()
+
+    assert view.requestID == 7
+    assert sackLayer
+    assert sackLayer.cumulative == 10
+    assert sackLayer.ranges == [(12, 20), (30, 31)]
+    assert view.to_pocket().basicLayer.pocketType == PocketType.SACK
+
+
+def test_lib_ftp_segment_encoder() -> None:
+    encoder = SegmentEncoder(7, 1)
+
+    first = encoder.encode(3, b"0123")
+    second = encoder.encode(4, memoryview(b"4567"))
+
+    # same as the pockets of the layers
+    for segmentID, parts in [(3, first), (4, second)]:
+        pocket = Pocket(BasicLayer(7, PocketType.Segment))
+        pocket.segmentLayer = SegmentLayer(segmentID, parts[1])
+        assert b"".join(parts) == bytes(pocket)
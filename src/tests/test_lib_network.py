@@ -0,0 +1,59 @@
+# testing the network connections
+
+from src.lib.ftp import BasicLayer, Pocket, PocketType, SegmentLayer
+from src.lib.network import ReceiveRing, UDPConnection
+
+
+def test_lib_network_udp_send_many() -> None:
+    receiver = UDPConnection()
+    receiver.init(("127.0.0.1", 0))
+    sender = UDPConnection()
+    sender.init(("127.0.0.1", 0))
+
+    # consecutive segments and a shorter last one, sended together if the kernel supports GSO
+    # the datagrams are gathered from their parts
+    datagrams = [(b"a" * 1000,), (b"b" * 10, memoryview(b"b" * 990)), (b"c" * 400,), (b"d" * 1000,)]
+    sender.sendto_many(datagrams, receiver.interfceSocket.getsockname())
+
+    received: list[bytes] = []
+    while receiver.has_data(1) and len(received) < len(datagrams):
+        received.append(receiver.recvfrom()[0])
+    assert received == [b"".join(datagram) for datagram in datagrams]
+
+    sender.close()
+    receiver.close()
+
+
+def test_lib_network_receive_ring() -> None:
+    ring = ReceiveRing(2, 8)
+
+    first = ring.next()
+    assert len(first) == 8
+    assert ring.next() is not first
+    assert ring.next() is first
+
+
+def test_lib_network_udp_receive_view() -> None:
+    receiver = UDPConnection()
+    receiver.init(("127.0.0.1", 0))
+    sender = UDPConnection()
+    sender.init(("127.0.0.1", 0))
+
+    pocket = Pocket(BasicLayer(7, PocketType.Segment))
+    pocket.segmentLayer = SegmentLayer(3, b"0123456789")
+    sender.sendto(bytes(pocket), receiver.interfceSocket.getsockname())
+
+    assert receiver.has_data(1)
+    data, address = receiver.recvfrom_view()
+    assert address == sender.interfceSocket.getsockname()
+
+    # the segment content is decoded without copy
+    received = Pocket.from_bytes(data)
+    assert received.segmentLayer
+    assert received.segmentLayer.segmentID == 3
+    assert isinstance(received.segmentLayer.data, memoryview)
+    assert received.segmentLayer.data.obj is data.obj
+    assert bytes(received.segmentLayer.data) == b"0123456789"
+
+    sender.close()
+    receiver.close()
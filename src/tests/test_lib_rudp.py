@@ -0,0 +1,136 @@
+# testing the RUDP senders parts
+
+from src.lib.ftp import CongestionControlType, SACKLayer
+from src.lib.rudp import Pacer, RTTEstimator, SegmentSizeProber, Sender, SendWindow
+
+
+def test_lib_rudp_send_window() -> None:
+    window = SendWindow(5)
+
+    sended = []
+    while window.has_segments_to_send():
+        sended.append(window.next_segments(0, 2))
+    assert sended == [(0, 2), (2, 2), (4, 1)]
+
+    assert window.ack_sack(SACKLayer(2, [(3, 4)])) == (3, 0)
+    assert list(window.sending) == [2, 4]
+
+    assert window.expire(0) == (2, 0)
+    assert window.has_segments_to_send()
+    assert window.next_segments(1, 2) == (2, 1)
+
+    assert window.ack(4) is None
+    assert not window.has_segments_to_send()
+
+    assert window.ack(2) == 1
+    assert window.is_complited()
+
+
+def test_lib_rudp_send_window_skip() -> None:
+    window = SendWindow(6)
+    # the receiver already has the segments
+    window.skip([(0, 2), (3, 4)])
+
+    sended = []
+    while window.has_segments_to_send():
+        sended.append(window.next_segments(0, 4))
+    assert sended == [(2, 1), (4, 2)]
+
+    window.ack_sack(SACKLayer(6, []))
+    assert window.is_complited()
+
+
+def test_lib_rudp_karn_rule() -> None:
+    window = SendWindow(2)
+    window.next_segments(1)
+    window.next_segments(2)
+    assert window.expire(1) == (1, 1)
+    assert window.next_segments(3) == (0, 1)
+
+    # segment 0 retransmitted, so only segment 1 is RTT sample
+    assert window.ack_sack(SACKLayer(2, [])) == (2, 2)
+
+
+def test_lib_rudp_fast_retransmit() -> None:
+    window = SendWindow(6)
+    while window.has_segments_to_send():
+        window.next_segments(0)
+
+    # segment 1 missing, but only two pockets after it acked
+    window.ack_sack(SACKLayer(1, [(2, 4)]))
+    assert window.detect_gaps(3) == (0, 0)
+
+    window.ack_sack(SACKLayer(1, [(2, 5)]))
+    assert window.detect_gaps(3) == (1, 0)
+    assert list(window.sending) == [5]
+    assert window.next_segments(1) == (1, 1)
+
+
+def test_lib_rudp_rtt_estimator() -> None:
+    estimator = RTTEstimator()
+
+    estimator.sample(0.1)
+    assert estimator.srtt == 0.1
+    assert abs(estimator.rto - 0.3) < 1e-9
+
+    estimator.sample(0.1)
+    assert estimator.srtt == 0.1
+    assert abs(estimator.rto - 0.25) < 1e-9
+
+    estimator.backoff()
+    assert abs(estimator.rto - 0.5) < 1e-9
+
+
+def test_lib_rudp_pacer() -> None:
+    pacer = Pacer(4)
+    assert pacer.delay(100, 0) == 0
+
+    # 1000 segments per second after the burst
+    pacer.rate = 1000
+    pacer.consume(4)
+    assert pacer.delay(2, 0) == 2_000_000
+    assert pacer.delay(2, 1_000_000) == 1_000_000
+    assert pacer.delay(2, 2_000_000) == 0
+    pacer.consume(2)
+
+    # the tokens not accumulate more than the burst
+    assert pacer.delay(4, 10_000_000_000) == 0
+    pacer.consume(4)
+    assert pacer.delay(1, 10_000_000_000) == 1_000_000
+
+    # the delay rounded up, and after it the tokens are exactly enough
+    pacer = Pacer(1)
+    pacer.rate = 3
+    pacer.consume(1)
+    assert pacer.delay(1, 0) == 333_333_334
+    assert pacer.delay(1, 333_333_333) == 1
+    assert pacer.delay(1, 333_333_334) == 0
+
+
+def test_lib_rudp_segment_size_prober() -> None:
+    prober = SegmentSizeProber(1000, 8000)
+
+    prober.on_round(100, 0)
+    prober.on_round(100, 0)
+    assert prober.amount == 4
+
+    prober.on_round(100, 30)
+    assert prober.amount == 2
+
+    for _ in range(100):
+        prober.on_round(100, 0)
+    assert prober.amount == 8
+
+
+def test_lib_rudp_sender_budget() -> None:
+    sended: list[int] = []
+    sender = Sender(100, 1000, 1000, lambda segmentID, amount: sended.append(segmentID), CongestionControlType.NewReno)
+
+    # the budget limits the sending, so the sender is ready at once
+    assert sender.poll(1, 10) == 1
+    assert sended == list(range(10))
+    assert sender.sendedAmount == 10
+
+    assert sender.poll(1, 5) == 1
+    assert sended == list(range(15))
+    assert sender.sendedAmount == 15
@@ -0,0 +1,250 @@
+# testing segments sources and sinks
+
+import mmap
+import os
+import tempfile
+
+import pytest
+
+from src.lib.config import config
+from src.lib.ftp import CompressionType
+from src.lib.segments import (
+    BytesSegmentSink,
+    BytesSegmentSource,
+    CompressedSegmentSource,
+    FileRangeSegmentSink,
+    FileSegmentSink,
+    FileSegmentSource,
+    ResumableFileSegmentSink,
+    SegmentsBitmap,
+    load_segments_state,
+)
+
+
+def test_lib_segments_bytes_source() -> None:
+    source = BytesSegmentSource(b"0123456789")
+
+    assert len(source) == 10
+    assert bytes(source.get_segment(0, 4)) == b"0123"
+    assert bytes(source.get_segment(2, 4)) == b"89"
+
+
+def test_lib_segments_file_source() -> None:
+    file = tempfile.TemporaryFile()
+    file.write(b"0123456789")
+    file.flush()
+
+    source = FileSegmentSource(file, b"H")
+
+    assert len(source) == 11
+    assert bytes(source.get_segment(0, 4)) == b"H012"
+    assert bytes(source.get_segment(1, 4)) == b"3456"
+    assert bytes(source.get_segment(2, 4)) == b"789"
+
+    source.close()
+
+
+def test_lib_segments_file_source_range() -> None:
+    file = tempfile.TemporaryFile()
+    file.write(b"0123456789")
+    file.flush()
+
+    source = FileSegmentSource(file, b"H", 3, 5)
+
+    assert len(source) == 6
+    assert bytes(source.get_segment(0, 4)) == b"H345"
+    assert bytes(source.get_segment(1, 4)) == b"67"
+
+    source.close()
+
+    # range after the first page, only its pages are mapped
+    file = tempfile.TemporaryFile()
+    data = os.urandom(3 * mmap.ALLOCATIONGRANULARITY)
+    file.write(data)
+    file.flush()
+
+    offset = mmap.ALLOCATIONGRANULARITY + 100
+    source = FileSegmentSource(file, b"", offset, 1000)
+
+    assert len(source) == 1000
+    assert bytes(source.read(0, 2000)) == data[offset : offset + 1000]
+    assert source._mmap is not None and len(source._mmap) == 1100
+
+    source.close()
+
+
+def test_lib_segments_empty_file_source() -> None:
+    source = FileSegmentSource(tempfile.TemporaryFile(), b"H")
+
+    assert len(source) == 1
+    assert bytes(source.get_segment(0, 4)) == b"H"
+
+    source.close()
+
+
+def test_lib_segments_file_sink() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        sink = FileSegmentSink(directory + "/data.part", 11, 4, 1)
+
+        assert sink.write(2, b"789") == 1
+        assert sink.write(0, b"H012") == 1
+        assert sink.write(0, b"H012") == 1
+        assert sink.segments.count == 2
+        assert not sink.is_complited()
+        assert sink.write(1, b"3456") == 1
+        assert sink.is_complited()
+        assert sink.header == b"H"
+
+        sink.commit(directory + "/data")
+        with open(directory + "/data", "rb") as f:
+            assert f.read() == b"0123456789"
+
+
+def test_lib_segments_file_sink_resume() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        sink = FileSegmentSink(directory + "/data.part", 11, 4, 1)
+
+        assert sink.write(0, b"H012") == 1
+        assert sink.write(2, b"789") == 1
+        # only the prefix before the first missing segment is kept
+        assert sink.suspend(directory + "/data.partial") == 3
+
+        sink = FileSegmentSink(directory + "/data.partial", 8, 4, 1, 3)
+        assert sink.write(0, b"H345") == 1
+        assert sink.write(1, b"6789") == 1
+        assert sink.is_complited()
+
+        sink.commit(directory + "/data")
+        with open(directory + "/data", "rb") as f:
+            assert f.read() == b"0123456789"
+
+
+def test_lib_segments_file_range_sinks() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        with open(directory + "/data", "wb") as f:
+            f.truncate(10)
+
+        # two ranges of the same file, each with its header
+        first = FileRangeSegmentSink(directory + "/data", 0, 5, 4, 1)
+        second = FileRangeSegmentSink(directory + "/data", 4, 7, 4, 1)
+        assert second.write(1, b"789") == 1
+        assert first.write(0, b"H012") == 1
+        assert second.write(0, b"H456") == 1
+        assert first.write(1, b"3") == 1
+        assert first.is_complited() and second.is_complited()
+        first.close()
+        second.close()
+
+        with open(directory + "/data", "rb") as f:
+            assert f.read() == b"0123456789"
+
+
+def test_lib_segments_bitmap() -> None:
+    bitmap = SegmentsBitmap(10)
+
+    assert bitmap.add(9)
+    assert not bitmap.add(9)
+    assert 9 in bitmap
+    assert 8 not in bitmap
+    assert bitmap.count == 1
+    assert not bitmap.is_full()
+
+
+def test_lib_segments_sink_consecutive_segments() -> None:
+    sink = BytesSegmentSink(11, 4, 1)
+
+    assert sink.write(1, b"3456789") == 2
+    assert sink.write(0, b"H012") == 1
+    assert sink.is_complited()
+    assert sink.data == b"0123456789"
+
+
+def test_lib_segments_bitmap_missing_ranges() -> None:
+    bitmap = SegmentsBitmap(40)
+    for segmentID in list(range(0, 3)) + list(range(5, 30)) + [33]:
+        bitmap.add(segmentID)
+
+    assert bitmap.get_missing_ranges(10) == [(3, 5), (30, 33), (34, 40)]
+    # the last range covers the rest
+    assert bitmap.get_missing_ranges(2) == [(3, 5), (30, 40)]
+
+    bitmap = SegmentsBitmap.from_bytes(40, bytes(bitmap))
+    assert bitmap.count == 29
+    assert bitmap.firstMissing == 3
+    assert bitmap.get_missing_ranges(10) == [(3, 5), (30, 33), (34, 40)]
+
+
+def test_lib_segments_resumable_file_sink() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        sink = ResumableFileSegmentSink(directory + "/data.part", 11, 4, 1)
+        assert sink.write(0, b"H012") == 1
+        assert sink.write(2, b"789") == 1
+
+        # single sink of the staging file
+        with pytest.raises(BlockingIOError):
+            ResumableFileSegmentSink(directory + "/data.part", 11, 4, 1)
+
+        sink.checkpoint()
+        sink.close()
+
+        state = load_segments_state(directory + "/data.part.state", 3, 1)
+        assert state
+        assert state[1].get_missing_ranges(10) == [(1, 2)]
+
+        sink = ResumableFileSegmentSink(directory + "/data.part", 11, 4, 1)
+        assert sink.header == b"H"
+        assert sink.write(1, b"3456") == 1
+        assert sink.is_complited()
+
+        sink.commit(directory + "/data")
+        with open(directory + "/data", "rb") as f:
+            assert f.read() == b"0123456789"
+        assert load_segments_state(directory + "/data.part.state", 3, 1) is None
+
+
+def test_lib_segments_compressed_chunks() -> None:
+    data = b"\x01" + b"0123456789" * 1000
+    source = CompressedSegmentSource(BytesSegmentSource(data), CompressionType.Zlib, 4096)
+    sink = BytesSegmentSink(len(data), 4096, 1)
+    sink.compression = CompressionType.Zlib
+
+    frames = [source.get_segment(segmentID, 4096) for segmentID in range(3)]
+    assert all(len(frame) < 4096 for frame in frames)
+
+    # the chunks are decoded in any order, the duplicates are ignored
+    for segmentID in [2, 0, 2, 1]:
+        assert sink.write(segmentID, frames[segmentID]) == 1
+    assert sink.is_complited()
+    assert sink.header == b"\x01"
+    assert bytes(sink.data) == data[1:]
+
+    # the retransmitted chunk is kept until it acked, then it is compressed again
+    assert source.get_segment(1, 4096) is frames[1]
+    source.release(1)
+    assert source.get_segment(1, 4096) == frames[1]
+    source.close()
+
+
+def test_lib_segments_compressed_chunks_probe() -> None:
+    data = os.urandom(4096 * (config.COMPRESSION_PROBE_CHUNKS + 2))
+    source = CompressedSegmentSource(BytesSegmentSource(data), CompressionType.LZMA, 4096)
+    sink = BytesSegmentSink(len(data), 4096)
+    sink.compression = CompressionType.LZMA
+
+    for segmentID in range(len(sink.segments)):
+        frame = source.get_segment(segmentID, 4096)
+        # the data is not compressible
+        assert frame[0] == CompressionType.Nothing
+        sink.write(segmentID, frame)
+    # the chunks that compressed ahead are dropped after the probe
+    assert not source._chunks
+
+    assert bytes(sink.data) == data
+    source.close()
+
+    # invalid chunk, it is not received
+    sink = BytesSegmentSink(4096, 4096)
+    sink.compression = CompressionType.Zlib
+    with pytest.raises(ValueError):
+        sink.write(0, bytes([CompressionType.Zlib]) + b"not zlib")
+    assert 0 not in sink.segments
@@ -0,0 +1,44 @@
+# testing the timer wheel
+
+from src.lib.timers import TimerWheel
+
+
+def test_lib_timers_expire_in_order() -> None:
+    timers = TimerWheel(0.01, 8, 0)
+    expired: list[str] = []
+
+    timers.schedule(0.05, lambda now: expired.append("b"))
+    timers.schedule(0.02, lambda now: expired.append("a"))
+    # longer than a revolution of the wheel
+    timers.schedule(0.5, lambda now: expired.append("c"))
+    assert len(timers) == 3
+
+    assert timers.advance(0.019) == 0
+    assert timers.advance(0.06) == 2
+    assert expired == ["a", "b"]
+
+    assert timers.advance(0.3) == 0
+    assert timers.advance(1) == 1
+    assert expired == ["a", "b", "c"]
+    assert len(timers) == 0
+
+
+def test_lib_timers_cancel_and_reschedule() -> None:
+    timers = TimerWheel(0.01, 8, 0)
+    expired: list[float] = []
+
+    def on_timeout(now: float) -> None:
+        expired.append(now)
+        if len(expired) < 3:
+            timers.schedule(now + 0.1, on_timeout)
+
+    timer = timers.schedule(0.1, lambda now: expired.append(-1))
+    timers.cancel(timer)
+    timers.schedule(0.1, on_timeout)
+    assert len(timers) == 1
+
+    for i in range(1, 100):
+        timers.advance(i / 100)
+    # at most a tick late
+    assert [round(now, 1) for now in expired] == [0.1, 0.2, 0.3]
+    assert len(timers) == 0